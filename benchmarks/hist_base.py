@@ -0,0 +1,165 @@
+"""
+Benchmark of the NGBoost base learners on synthetic data. The models of the same columns are fitted with the decision
+tree and with the histogram-based tree, and the fit times and the validation scores are compared:
+
+    python -m benchmarks.hist_base --regions 10 --years 2013 --columns 4 --estimators 200
+"""
+
+from benchmarks.run import use_benchmark_paths, git_commit
+from benchmarks.synthetic_data import write_shapes, write_era5, write_capfacts
+from src.era5_mapper import Era5Mapper
+from src.forecast import Forecast
+from src.hist_tree import create_base_learner, bin_features
+from src.metrics import crps_normal
+from src.validation import split_train_validation
+import config
+
+import argparse
+import json
+import tempfile
+import time
+import numpy as np
+import xarray as xr
+import geopandas as gpd
+from datetime import datetime
+from pathlib import Path
+from ngboost import NGBRegressor
+from ngboost.distns import Normal
+from ngboost.scores import LogScore
+
+"""
+Compared base learners
+"""
+base_learners = ["tree", "hist"]
+
+
+def create_training_data(directory: Path, n_x=48, n_y=36, n_regions=10, years=(2013,), seed=42) -> dict:
+    """
+    Generates the synthetic data and extracts the training data of all columns.
+
+    :param directory: directory of the generated data
+    :param n_x: Number of grid cells in longitude
+    :param n_y: Number of grid cells in latitude
+    :param n_regions: Number of onshore regions of the shipped shapefiles
+    :param years: years of hourly time steps
+    :param seed: seed of the random numbers
+    :return: Dictionary of the column names and tuples of the capacity factors and features
+    """
+    print("Generate synthetic data in ", directory)
+    onshore_shape, offshore_shape = write_shapes(directory, n_regions)
+    use_benchmark_paths(directory, onshore_shape, offshore_shape)
+    write_era5(config.paths["era5_eu_2013"], gpd.read_file(onshore_shape).total_bounds, n_x, n_y, years, seed)
+    Era5Mapper().create_era5_region()
+    with xr.open_dataset(config.paths["era5_regions"]) as era5_regions:
+        write_capfacts(config.paths["capfacs"], era5_regions, seed)
+
+    forecaster = Forecast()
+    return {col_name: forecaster.data.get_feature_matrix(col_name)
+            for col_name, region_name, energy_type in forecaster._training_columns()}
+
+
+def fit_base_learner(base_learner: str, X: np.ndarray, Y: np.ndarray, n_estimators=200, test_size=0.25,
+                     seed=42) -> dict:
+    """
+    Fits the NGBoost model of a column with a base learner and scores it on the validation data.
+
+    :param base_learner: "tree" or "hist"
+    :param X: features of the column
+    :param Y: capacity factors of the column
+    :param n_estimators: Number of boosting iterations
+    :param test_size: Ratio between training and validation data
+    :param seed: seed of the split and the model
+    :return: Dictionary with the fit time, including the binning of the features, and the validation NLL and CRPS of
+        the raw validation features
+    """
+    X_train, X_test, Y_train, Y_test = split_train_validation(X, Y, test_size, random_state=seed)
+    start = time.perf_counter()
+    base = create_base_learner(base_learner, X, max_bins=config.hist_max_bins)
+    X_binned, = bin_features(base, X_train)
+    model = NGBRegressor(Dist=Normal, Score=LogScore, Base=base, n_estimators=n_estimators, random_state=seed,
+                         verbose=False).fit(X_binned, Y_train)
+    fit_time = time.perf_counter() - start
+
+    dist = model.pred_dist(X_test)
+    return dict(fit_seconds=fit_time, nll=float(-dist.logpdf(Y_test).mean()),
+                crps=float(crps_normal(Y_test, dist.params["loc"], dist.params["scale"]).mean()))
+
+
+def run_benchmark(training_data: dict, n_columns=4, n_estimators=200, seed=42) -> dict:
+    """
+    Fits the first columns with every base learner.
+
+    :param training_data: Dictionary of the column names and tuples of the capacity factors and features
+    :param n_columns: Number of columns that are fitted
+    :param n_estimators: Number of boosting iterations
+    :param seed: seed of the random numbers
+    :return: Dictionary of the columns and the results of every base learner
+    """
+    results = {}
+    for col_name in list(training_data)[:n_columns]:
+        Y, X = training_data[col_name]
+        results[col_name] = {base_learner: fit_base_learner(base_learner, X, Y, n_estimators, seed=seed)
+                             for base_learner in base_learners}
+        tree, hist = results[col_name]["tree"], results[col_name]["hist"]
+        print(col_name.ljust(22), "fit [s] %.3f / %.3f" % (tree["fit_seconds"], hist["fit_seconds"]),
+              "speedup %.2f" % (tree["fit_seconds"] / hist["fit_seconds"]),
+              "NLL %.4f / %.4f" % (tree["nll"], hist["nll"]), "CRPS %.4f / %.4f" % (tree["crps"], hist["crps"]))
+    return results
+
+
+def summarize(results: dict) -> dict:
+    """
+    Summarizes the results of all columns.
+
+    :param results: Dictionary of the columns and the results of every base learner
+    :return: Dictionary with the total fit time and the mean scores of every base learner and the speedup
+    """
+    summary = {base_learner: {name: float(np.mean([result[base_learner][name] for result in results.values()]))
+                              for name in ["nll", "crps"]} for base_learner in base_learners}
+    for base_learner in base_learners:
+        summary[base_learner]["fit_seconds"] = sum(result[base_learner]["fit_seconds"] for result in results.values())
+    summary["speedup"] = summary["tree"]["fit_seconds"] / summary["hist"]["fit_seconds"]
+    summary["crps_ratio"] = summary["hist"]["crps"] / summary["tree"]["crps"]
+    print("Total fit time tree: %.3f s, hist: %.3f s, speedup: %.2f, CRPS ratio hist / tree: %.4f"
+          % (summary["tree"]["fit_seconds"], summary["hist"]["fit_seconds"], summary["speedup"],
+             summary["crps_ratio"]))
+    return summary
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark of the NGBoost base learners on synthetic data")
+    parser.add_argument("--nx", type=int, default=48, help="Number of grid cells in longitude")
+    parser.add_argument("--ny", type=int, default=36, help="Number of grid cells in latitude")
+    parser.add_argument("--regions", type=int, default=10, help="Number of onshore regions of the shapefiles")
+    parser.add_argument("--years", type=int, nargs="+", default=[2013])
+    parser.add_argument("--columns", type=int, default=4, help="Number of columns for which a model is fitted")
+    parser.add_argument("--estimators", type=int, default=200, help="Number of boosting iterations")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", help="Directory of the generated data. A temporary directory by default.")
+    parser.add_argument("--output", help="Path of the report. By default in benchmarks/reports/")
+    args = parser.parse_args(args)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        training_data = create_training_data(Path(args.data_dir or tmp_dir), args.nx, args.ny, args.regions,
+                                             args.years, args.seed)
+        results = run_benchmark(training_data, args.columns, args.estimators, args.seed)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "parameters": dict(n_x=args.nx, n_y=args.ny, n_regions=args.regions, years=args.years,
+                           n_columns=args.columns, n_estimators=args.estimators, max_bins=config.hist_max_bins,
+                           seed=args.seed),
+        "summary": summarize(results),
+        "columns": results,
+    }
+    output = Path(args.output) if args.output else \
+        Path(__file__).parent / "reports" / ("hist_base_" + datetime.now().strftime("%Y%m%d_%H%M%S") + ".json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Saved the benchmark report to: ", output)
+
+
+if __name__ == '__main__':
+    main()
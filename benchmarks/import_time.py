@@ -0,0 +1,87 @@
+"""
+Regression check of the startup time. Every entry point is imported in a fresh interpreter, its import time is measured
+and it is checked that no heavy dependency is imported that the entry point does not need. Exits with status 1 if a
+check fails:
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --max-seconds 1.5
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+"""
+Heavy dependencies that are only imported by the code paths that need them
+"""
+heavy_modules = ["ngboost", "sklearn", "geopandas", "shapely", "ephem", "dask", "netCDF4"]
+
+"""
+Entry points with the statement that is timed and the heavy modules it may import
+"""
+entry_points = {
+    "config": ("import config", []),
+    "main": ("import main", []),
+    "cli help": ("import main\ntry:\n    main.main(['--help'])\nexcept SystemExit:\n    pass", []),
+    "forecast": ("from src.forecast import Forecast", []),
+    "output": ("from src.output_backend import get_output_backend", []),
+    "inference": ("from src.inference import InferenceService", []),
+}
+
+measure = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start
+print(json.dumps(dict(seconds=seconds, modules=sorted(name.split(".")[0] for name in sys.modules))))
+"""
+
+
+def measure_import(statement: str) -> dict:
+    """
+    Runs the statement in a fresh interpreter in the root directory of the repository.
+
+    :param statement: import statement
+    :return: Dictionary with the import time in seconds and the names of the imported top level modules
+    """
+    process = subprocess.run([sys.executable, "-c", measure.format(statement=statement)], capture_output=True,
+                             text=True, cwd=Path(__file__).resolve().parent.parent)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1] if process.stderr.strip() else "failed")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Regression check of the import time of the entry points")
+    parser.add_argument("--max-seconds", type=float, default=None, help="Maximum import time of an entry point")
+    parser.add_argument("--output", help="Optional path of a JSON report")
+    args = parser.parse_args(args)
+
+    failed = False
+    report = {}
+    for name, (statement, allowed) in entry_points.items():
+        try:
+            result = measure_import(statement)
+        except RuntimeError as e:
+            print("ERROR".ljust(6), name.ljust(12), e)
+            failed = True
+            continue
+
+        loaded = [module for module in heavy_modules if module in result["modules"] and module not in allowed]
+        too_slow = args.max_seconds is not None and result["seconds"] > args.max_seconds
+        status = "FAIL" if loaded or too_slow else "OK"
+        failed = failed or status == "FAIL"
+        report[name] = dict(seconds=result["seconds"], heavy_modules=loaded)
+        print(status.ljust(6), name.ljust(12), ("%.3f s" % result["seconds"]).rjust(10),
+              "heavy imports: " + ", ".join(loaded) if loaded else "")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
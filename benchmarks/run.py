@@ -0,0 +1,240 @@
+"""
+Benchmark of the forecast workflow on synthetic data. Every stage is timed on the same generated inputs and the
+timings are written as JSON report, which can be compared with the report of another version:
+
+    python -m benchmarks.run --nx 48 --ny 36 --regions 10 --years 2013
+    python -m benchmarks.run --baseline benchmarks/reports/<previous report>.json
+"""
+
+from benchmarks.synthetic_data import write_shapes, write_era5, write_capfacts
+from src.era5_mapper import Era5Mapper
+from src.forecast import Forecast, distribution_result
+from src.forecast_result import ForecastResult, normal_quantile
+from src.output_backend import get_output_backend
+import config
+
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+import numpy as np
+import xarray as xr
+import geopandas as gpd
+from datetime import datetime
+from pathlib import Path
+from ngboost import NGBRegressor
+from ngboost.distns import Normal
+from ngboost.scores import LogScore
+
+
+class StageTimer:
+    """
+    Measures the wall time of the stages of the benchmark. The first run of a stage is reported as cold run, it
+    includes filling the caches, e.g. of the region index or the feature store. The fastest of the further runs is
+    reported as warm run.
+    """
+
+    def __init__(self, repeat=1):
+        """
+        Initializes the timer.
+
+        :param repeat: Number of runs of every stage. With more than one run, the warm runs are reported separately.
+        """
+        self.repeat = repeat
+        self.stages = {}
+
+    def run(self, name: str, function, *args, **kwargs):
+        """
+        Runs and times a stage.
+
+        :param name: name of the stage
+        :param function: function of the stage
+        :return: the result of the last run of the function
+        """
+        times = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            times.append(time.perf_counter() - start)
+        warm = min(times[1:]) if len(times) > 1 else None
+        self.stages[name] = {"cold_seconds": times[0], "warm_seconds": warm, "runs": times}
+        if warm is None:
+            print("Stage ", name, ": ", round(times[0], 4), " s")
+        else:
+            print("Stage ", name, ": cold ", round(times[0], 4), " s, warm ", round(warm, 4), " s")
+        return result
+
+
+def use_benchmark_paths(directory: Path, onshore_shape: Path, offshore_shape: Path):
+    """
+    Points the paths of the config to the benchmark directory, so no cache or result of the real data is used or
+    overwritten.
+
+    :param directory: directory of the benchmark data
+    :param onshore_shape: path of the onshore shapefile
+    :param offshore_shape: path of the offshore shapefile
+    """
+    config.result_path = str(directory / "results")
+    config.paths.update({
+        "era5_eu_2013": str(directory / "era5.nc"),
+        "onshore_shape": str(onshore_shape),
+        "offshore_shape": str(offshore_shape),
+        "capfacs": str(directory / "capfacs.csv"),
+        "era5_regions": str(directory / "era5-regions.nc"),
+        "cache": str(directory / "cache") + "/",
+        "models": config.result_path + "/models",
+        "forecast_dist": config.result_path + "/capfacts_pred_dist.nc",
+        "scores": config.result_path + "/scores.csv",
+        "iterations": config.result_path + "/iterations.csv",
+    })
+
+
+def run_benchmark(directory: Path, n_x=48, n_y=36, n_regions=10, years=(2013,), n_columns=4, n_estimators=100,
+                  output_formats=("csv",), repeat=1, seed=42) -> dict:
+    """
+    Generates the synthetic data and times the stages of the workflow: region mapping, region aggregation, extraction
+    of the training data, NGBoost fit, pred_dist, quantiles (ppf), scoring and writing of the outputs.
+
+    :param directory: directory of the generated data and results
+    :param n_x: Number of grid cells in longitude
+    :param n_y: Number of grid cells in latitude
+    :param n_regions: Number of onshore regions of the shipped shapefiles
+    :param years: years of hourly time steps
+    :param n_columns: Number of columns for which a model is fitted
+    :param n_estimators: Number of boosting iterations of the fitted models
+    :param output_formats: output formats that are written
+    :param repeat: Number of runs of every stage
+    :param seed: seed of the random numbers
+    :return: the report
+    """
+    print("Generate synthetic data in ", directory)
+    onshore_shape, offshore_shape = write_shapes(directory, n_regions)
+    use_benchmark_paths(directory, onshore_shape, offshore_shape)
+    bounds = gpd.read_file(onshore_shape).total_bounds
+    write_era5(config.paths["era5_eu_2013"], bounds, n_x, n_y, years, seed)
+
+    timer = StageTimer(repeat)
+    mapper = Era5Mapper()
+    n_on, n_off = mapper.gdf_onshore.shape[0], mapper.gdf_offshore.shape[0]
+    region_index = timer.run("region_mapping", mapper.get_region_index, False)
+    timer.run("region_aggregation", mapper._create_era5_region_data_grouped,
+              region_index.membership_matrix(n_on, n_off), 1, config.paths["era5_regions"])
+
+    with xr.open_dataset(config.paths["era5_regions"]) as era5_regions:
+        columns = write_capfacts(config.paths["capfacs"], era5_regions, seed)
+
+    def extract_training_data():
+        forecaster = Forecast()
+        return forecaster, {col_name: forecaster.data.get_feature_matrix(col_name)
+                            for col_name, region_name, energy_type in forecaster._training_columns()}
+
+    forecaster, training_data = timer.run("training_data", extract_training_data)
+    fit_columns = list(training_data)[:n_columns]
+
+    def fit():
+        models = {}
+        for col_name in fit_columns:
+            Y, X = training_data[col_name]
+            models[col_name] = NGBRegressor(Dist=Normal, Score=LogScore, n_estimators=n_estimators, random_state=seed,
+                                            verbose=False).fit(X, Y)
+        return models
+
+    models = timer.run("ngboost_fit", fit)
+    dists = timer.run("pred_dist", lambda: {col_name: model.pred_dist(training_data[col_name][1])
+                                            for col_name, model in models.items()})
+    timer.run("ppf", lambda: [normal_quantile(dist.params["loc"], dist.params["scale"], q)
+                              for dist in dists.values() for q in forecaster.quantiles])
+
+    results = {col_name: distribution_result(dist.params["loc"], dist.params["scale"])
+               for col_name, dist in dists.items()}
+    forecast_result = ForecastResult.from_columns(forecaster.data.capfacts["snapshot"].values,
+                                                  {col_name: (result["loc"], result["scale"])
+                                                   for col_name, result in results.items()})
+    timer.run("scoring", forecaster.score, forecast_result)
+    timer.run("output_netcdf", forecast_result.save)
+    for output_format in output_formats:
+        timer.run("output_" + output_format, get_output_backend(output_format).save, forecast_result,
+                  forecaster.quantiles)
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "parameters": dict(n_x=n_x, n_y=n_y, n_regions=n_regions, years=list(years),
+                           n_time=int(forecaster.data.capfacts.shape[0]), n_columns=len(columns),
+                           n_fitted_columns=len(fit_columns), n_estimators=n_estimators, repeat=repeat, seed=seed),
+        "stages": timer.stages,
+    }
+
+
+def git_commit():
+    """
+    Returns the commit of the benchmarked version, None if it is not available.
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_reports(report: dict, baseline: dict):
+    """
+    Prints the cold and, if both reports have them, the warm timings of every stage relative to a baseline report.
+
+    :param report: report of the current version
+    :param baseline: report of the previous version
+    """
+    if report["parameters"] != baseline["parameters"]:
+        print("Warning: the benchmark parameters differ from the baseline")
+    print("Stage".ljust(22), "Run".ljust(5), "Baseline [s]".rjust(14), "Current [s]".rjust(14), "Ratio".rjust(8))
+    for name, stage in report["stages"].items():
+        if name not in baseline["stages"]:
+            continue
+        for run in ["cold", "warm"]:
+            previous, current = baseline["stages"][name].get(run + "_seconds"), stage[run + "_seconds"]
+            if previous is None or current is None:
+                continue
+            print(name.ljust(22), run.ljust(5), ("%.4f" % previous).rjust(14), ("%.4f" % current).rjust(14),
+                  ("%.2f" % (current / previous if previous > 0 else np.nan)).rjust(8))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark of the forecast workflow on synthetic data")
+    parser.add_argument("--nx", type=int, default=48, help="Number of grid cells in longitude")
+    parser.add_argument("--ny", type=int, default=36, help="Number of grid cells in latitude")
+    parser.add_argument("--regions", type=int, default=10, help="Number of onshore regions of the shapefiles")
+    parser.add_argument("--years", type=int, nargs="+", default=[2013])
+    parser.add_argument("--columns", type=int, default=4, help="Number of columns for which a model is fitted")
+    parser.add_argument("--estimators", type=int, default=100, help="Number of boosting iterations")
+    parser.add_argument("--formats", nargs="+", default=[config.output_format], help="Output formats")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Number of runs of every stage. The first run is reported as cold run, the fastest of "
+                             "the others as warm run.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", help="Directory of the generated data. A temporary directory by default.")
+    parser.add_argument("--output", help="Path of the report. By default in benchmarks/reports/")
+    parser.add_argument("--baseline", help="Report of a previous version to compare with")
+    args = parser.parse_args(args)
+
+    output = Path(args.output) if args.output else \
+        Path(__file__).parent / "reports" / ("benchmark_" + datetime.now().strftime("%Y%m%d_%H%M%S") + ".json")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        report = run_benchmark(Path(args.data_dir or tmp_dir), args.nx, args.ny, args.regions, args.years,
+                               args.columns, args.estimators, args.formats, args.repeat, args.seed)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Saved the benchmark report to: ", output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare_reports(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
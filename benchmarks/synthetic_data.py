@@ -0,0 +1,170 @@
+"""
+This script generates synthetic input data with the schema of the real inputs: a full era5 cube with the dimensions
+(time, y, x) and a capacity factor .csv file with one column per region and energy type. The regions are taken from
+the shipped shapefiles, so the whole workflow can run without the real data.
+"""
+
+from src.daytime_checker import solar_elevation
+from src.era5_mapper import era5_variables
+from src.features import Feature
+import config
+
+import netCDF4
+import numpy as np
+import pandas as pd
+import xarray as xr
+import geopandas as gpd
+from pathlib import Path
+
+"""
+Energy types of the capacity factor columns of the onshore and offshore regions, as named in the .csv file
+"""
+onshore_energy_types = ["onwind", "solar", "ror"]
+offshore_energy_types = ["offwind-ac", "offwind-dc"]
+
+
+def write_shapes(output_dir, n_regions=None) -> (Path, Path):
+    """
+    Writes the first regions of the shipped onshore shapefile and the offshore regions with the same names.
+
+    :param output_dir: directory of the written shapefiles
+    :param n_regions: Number of onshore regions. If not defined, all regions are used.
+    :return: Tuple of the paths of the onshore and offshore shapefiles
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    gdf_onshore = gpd.read_file(config.paths["onshore_shape"])
+    gdf_offshore = gpd.read_file(config.paths["offshore_shape"])
+    if n_regions is not None:
+        gdf_onshore = gdf_onshore.iloc[:n_regions]
+        gdf_offshore = gdf_offshore[gdf_offshore["name"].isin(gdf_onshore["name"])]
+
+    onshore_path = output_dir / "regions_onshore.geojson"
+    offshore_path = output_dir / "regions_offshore.geojson"
+    gdf_onshore.to_file(onshore_path, driver="GeoJSON")
+    gdf_offshore.to_file(offshore_path, driver="GeoJSON")
+    return onshore_path, offshore_path
+
+
+def write_era5(path, bounds, n_x=48, n_y=36, years=(2013,), seed=42, time_chunk=config.era5_time_chunk):
+    """
+    Writes a synthetic era5 cube. The radiation follows the solar position, wind speed and temperature have a
+    seasonal and diurnal cycle, a smooth spatial pattern and noise. The cube is written in chunks over time, so the
+    memory usage stays bounded for large grids and several years.
+
+    :param path: path of the netCDF file
+    :param bounds: Tuple of the minimum longitude, minimum latitude, maximum longitude and maximum latitude
+    :param n_x: Number of grid cells in longitude
+    :param n_y: Number of grid cells in latitude
+    :param years: years of hourly time steps
+    :param seed: seed of the random numbers
+    :param time_chunk: Number of time steps that are generated and written at once
+    """
+    rng = np.random.default_rng(seed)
+    min_x, min_y, max_x, max_y = bounds
+    x = np.linspace(min_x, max_x, n_x)
+    y = np.linspace(max_y, min_y, n_y)
+    times = pd.date_range(str(min(years)) + "-01-01", str(max(years) + 1) + "-01-01", freq="h", inclusive="left")
+    lon, lat = np.meshgrid(x, y)
+
+    # Smooth spatial patterns from a few random waves
+    def spatial_pattern():
+        phase = rng.uniform(0, 2 * np.pi, 4)
+        return (np.sin(lon / 7 + phase[0]) * np.cos(lat / 5 + phase[1])
+                + 0.5 * np.sin(lon / 3 + phase[2]) * np.sin(lat / 2 + phase[3]))
+
+    wind_pattern, temperature_pattern = spatial_pattern(), spatial_pattern()
+    clearness_pattern = 0.5 + 0.1 * spatial_pattern()
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with netCDF4.Dataset(path, "w") as dataset:
+        dataset.createDimension("time", None)
+        dataset.createDimension("y", n_y)
+        dataset.createDimension("x", n_x)
+        dataset.createVariable("x", "f8", ("x",))[:] = x
+        dataset.createVariable("y", "f8", ("y",))[:] = y
+        time = dataset.createVariable("time", "f8", ("time",))
+        time.units = "hours since 1970-01-01 00:00:00"
+        time.calendar = "standard"
+
+        variables = {}
+        for feature in Feature:
+            if feature == Feature.HEIGHT:
+                dataset.createVariable(era5_variables[feature], "f4", ("y", "x"))[:] = \
+                    np.maximum(0, 400 + 600 * spatial_pattern())
+            else:
+                variables[feature] = dataset.createVariable(era5_variables[feature], "f4", ("time", "y", "x"),
+                                                            zlib=False, chunksizes=(min(time_chunk, 744), n_y, n_x))
+
+        for start in range(0, len(times), time_chunk):
+            chunk = times[start:start + time_chunk]
+            n_time = len(chunk)
+            shape = (n_time, n_y, n_x)
+            season = np.cos(2 * np.pi * (chunk.dayofyear.values - 200) / 365)[:, np.newaxis, np.newaxis]
+            diurnal = np.cos(2 * np.pi * (chunk.hour.values - 15) / 24)[:, np.newaxis, np.newaxis]
+
+            elevation = solar_elevation(chunk, lon.reshape(-1), lat.reshape(-1))
+            sin_elevation = np.maximum(0, np.sin(np.deg2rad(elevation))).T.reshape(shape)
+            influx_toa = 1361 * sin_elevation
+            clearness = np.clip(clearness_pattern + 0.25 * rng.standard_normal(shape), 0.05, 0.8)
+            wnd100m = np.maximum(0, 7 + 2 * season + 1.5 * wind_pattern + 3 * rng.standard_normal(shape))
+            temperature = 283 + 10 * (-season) + 4 * diurnal + 5 * temperature_pattern - 0.4 * (lat - 50) \
+                + rng.standard_normal(shape)
+
+            values = {
+                Feature.WND100M: wnd100m,
+                Feature.ROUGHNESS: np.broadcast_to(0.05 + 0.04 * (wind_pattern + 1.5), shape),
+                Feature.INFLUX_TOA: influx_toa,
+                Feature.INFLUX_DIRECT: influx_toa * clearness * 0.8,
+                Feature.INFLUX_DIFFUSE: influx_toa * (0.1 + 0.2 * (1 - clearness)),
+                Feature.ALBEDO: np.broadcast_to(0.15 + 0.05 * temperature_pattern, shape),
+                Feature.TEMPERATURE: temperature,
+                Feature.SOIL_TEMPERATURE: temperature - 2 * diurnal,
+                Feature.RUNOFF: np.maximum(0, 1e-4 * (1 + season + 0.5 * rng.standard_normal(shape))),
+            }
+            time[start:start + n_time] = (chunk - pd.Timestamp("1970-01-01")) / pd.Timedelta(hours=1)
+            for feature, variable in variables.items():
+                variable[start:start + n_time] = values[feature].astype(np.float32)
+
+
+def write_capfacts(path, era5_regions: xr.Dataset, seed=42) -> list:
+    """
+    Writes synthetic capacity factors that depend on the features of the reduced era5 dataset, plus noise. Regions
+    without grid cells (NaN features) are left out.
+
+    :param path: path of the .csv file
+    :param era5_regions: reduced era5 dataset with dimensions (region, time)
+    :param seed: seed of the random numbers
+    :return: column names of the capacity factors
+    """
+    rng = np.random.default_rng(seed)
+    n_time = era5_regions.sizes["time"]
+    capfacts = {}
+
+    def noise():
+        return 0.03 * rng.standard_normal(n_time)
+
+    for region in era5_regions["region"].values:
+        data = era5_regions.sel(region=region)
+        if np.isnan(data[Feature.WND100M.value].values).any():
+            continue
+        name, location = region.rsplit(" ", 1)
+        wind = data[Feature.WND100M.value].values
+        wind_capfac = wind ** 3 / (wind ** 3 + 9.0 ** 3)
+
+        if location == "on":
+            radiation = data[Feature.INFLUX_DIRECT.value].values + data[Feature.INFLUX_DIFFUSE.value].values
+            efficiency = 1 - 0.004 * (data[Feature.TEMPERATURE.value].values - 298)
+            capfacts[name + " onwind"] = wind_capfac + noise()
+            capfacts[name + " solar"] = np.where(radiation > 0, radiation / 1000 * efficiency + noise(), 0)
+            capfacts[name + " ror"] = 0.5 + 2000 * data[Feature.RUNOFF.value].values + noise()
+        else:
+            capfacts[name + " offwind-ac"] = wind_capfac + noise()
+            capfacts[name + " offwind-dc"] = wind_capfac + noise()
+
+    frame = pd.DataFrame({column: np.clip(values, 0, 1) for column, values in capfacts.items()}, dtype=np.float32)
+    frame.insert(0, "snapshot", pd.DatetimeIndex(era5_regions["time"].values))
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    frame.to_csv(path, index=False)
+    return list(capfacts.keys())
@@ -1,8 +1,6 @@
 from src.energy_type import EnergyType
 from src.features import Feature
 
-from sklearn.tree import DecisionTreeRegressor
-
 """
 The configuration file contains all global data, such as file paths.
 """
@@ -15,9 +13,36 @@ paths = {
     "offshore_shape": resource_path + "regions_offshore_elec_s_37.geojson",
     "onshore_shape": resource_path + "regions_onshore_elec_s_37.geojson",
     "capfacs": resource_path + "capfacs_37.csv",
-    "era5_regions": resource_path + "europe-2013-era5-regions.nc"
+    "era5_regions": resource_path + "europe-2013-era5-regions.nc",
+    "cache": resource_path + "cache/",
+    "models": result_path + "/models",
+    "forecast_dist": result_path + "/capfacts_pred_dist.nc",
+    "scores": result_path + "/scores.csv",
+    "iterations": result_path + "/iterations.csv",
+    "telemetry": result_path + "/telemetry",
+    "scenarios": result_path + "/capfacts_scenarios.nc"
 }
 
+"""
+Logging of the workflow. The log level "DEBUG" also shows the progress of every boosting iteration. If a log file is
+defined, the log is written to it in addition to stdout.
+"""
+log_level = "INFO"
+log_file = None
+
+"""
+Telemetry of a run: wall time and CPU time of every stage and column, the peak memory of the process at the end of the
+stage, the used boosting iterations and the scores are saved as JSON and .csv report in paths["telemetry"]. With
+profile, the telemetry is enabled and the outermost stages are additionally profiled with cProfile.
+"""
+telemetry = False
+profile = False
+
+"""
+Number of time steps of the full era5 dataset that are reduced to the regions at once
+"""
+era5_time_chunk = 744
+
 """
 Determines which features are selected to calculate the capacity factor of a certain energy type.
 """
@@ -34,22 +59,97 @@ Default quantiles that are used for the prediction if not defined otherwise
 """
 default_quantiles = [0.4, 0.5, 0.6]
 
+"""
+Bounds of the capacity factors that are used to clip the predictions
+"""
+clip_lower = 0
+clip_upper = 1.02
+
+"""
+Format of the saved quantile predictions: "csv" (two files per quantile), "parquet" or "zarr" (one float32 file with
+all quantiles, clipped when read)
+"""
+output_format = "csv"
+
 """
 Default setting for the NGBoost regression
 """
 test_size = 0.25
 random_state = 42
+n_jobs = 1  # Number of processes that train the models of the columns in parallel
 
 """
-Example of a parameter grid for GridSearchCV hyperparameter optimization
+Split into training and validation data for early stopping. "random" splits single hours, "blocked" holds out random
+contiguous blocks of block_length hours and "rolling" holds out the last hours. Neighbouring hours are almost
+identical, so the random split leaks information into the validation data. If the night hours are pruned, the blocks
+still cover block_length hours of the full series.
 """
-base1 = DecisionTreeRegressor(criterion='friedman_mse', max_depth=2)
-base2 = DecisionTreeRegressor(criterion='friedman_mse', max_depth=3)
-base3 = DecisionTreeRegressor(criterion='friedman_mse', max_depth=4)
-param_grid = {
-    'Base': [base1, base2, base3],
-    'n_estimators': [500, 100, 1000],
-    'learning_rate': [0.01],
-    'minibatch_frac': [1, 0.5],
-    'col_sample': [1, 0.5]
-}
+split_method = "random"
+block_length = 168
+early_stopping_rounds = 2
+early_stopping_tol = 0.0  # Minimum decrease of the validation loss that counts as improvement
+
+"""
+Incremental update with new hours of data. The stored models are boosted for at most update_estimators further
+iterations on the new hours. A column is refitted on the full history instead if the NLL of its stored model on the
+new hours exceeds the validation NLL of the last fit by more than drift_threshold.
+"""
+update_estimators = 100
+drift_threshold = 0.5
+
+"""
+Local inference service over the stored models, see src/inference.py. Requests that arrive within the batch window
+(in seconds) are predicted in one batch per model.
+"""
+inference_host = "127.0.0.1"
+inference_port = 8765
+inference_batch_window = 0.005
+
+"""
+Joint scenarios of the capacity factors, see src/scenarios.py. The scenarios are drawn in batches of scenario_batch
+scenarios and scenario_time_chunk snapshots, which bounds the memory usage. The estimated correlation matrix of the
+columns is shrunk towards the identity by scenario_shrinkage.
+"""
+n_scenarios = 1000
+scenario_batch = 100
+scenario_time_chunk = 744
+scenario_shrinkage = 0.05
+
+"""
+Base learner of the NGBoost models: "tree" for the default decision tree of NGBoost, "hist" for the histogram-based
+tree of src/hist_tree.py, which quantizes the features once per column into at most hist_max_bins bins
+"""
+base_learner = "tree"
+hist_max_bins = 255
+
+"""
+Example of a parameter grid for GridSearchCV hyperparameter optimization. The grid is created on first access of
+config.param_grid, so importing the config does not import sklearn. The histogram-based tree is only a candidate with
+base_learner = "hist", it adds a third to the configurations of the grid.
+"""
+
+
+def _create_param_grid() -> dict:
+    from sklearn.tree import DecisionTreeRegressor
+    from src.hist_tree import HistTreeRegressor
+
+    base1 = DecisionTreeRegressor(criterion='friedman_mse', max_depth=2)
+    base2 = DecisionTreeRegressor(criterion='friedman_mse', max_depth=3)
+    base3 = DecisionTreeRegressor(criterion='friedman_mse', max_depth=4)
+    bases = [base1, base2, base3]
+    if base_learner == "hist":
+        bases.append(HistTreeRegressor(max_depth=3, max_bins=hist_max_bins))
+    return {
+        'Base': bases,
+        'n_estimators': [500, 100, 1000],
+        'learning_rate': [0.01],
+        'minibatch_frac': [1, 0.5],
+        'col_sample': [1, 0.5]
+    }
+
+
+def __getattr__(name):
+    if name == "param_grid":
+        globals()["param_grid"] = _create_param_grid()
+        return globals()["param_grid"]
+    raise AttributeError("module 'config' has no attribute " + repr(name))
@@ -1,28 +1,151 @@
+"""
+Command line interface of the workflow. The heavy dependencies are only imported by the commands that need them:
+
+    python main.py map                       # reduce the full era5 dataset to the regions
+    python main.py train                     # train the models and predict the quantiles
+    python main.py train --mode halving      # tune the hyperparameters with successive halving
+    python main.py predict --quantiles 0.1 0.5 0.9
+    python main.py score
+    python main.py scenarios --n 1000
+
+Without a command, the reduced era5 dataset is created if it is missing and the models are trained.
+"""
+
 import config
-from src.forecast import *
-from src.daytime_checker import *
-from src.era5_mapper import *
+from src.telemetry import get_logger, configure_logging, telemetry
 
-if __name__ == '__main__':
+import argparse
+from pathlib import Path
+
+logger = get_logger(__name__)
+
+
+def map_regions(args):
+    from src.era5_mapper import Era5Mapper
 
     # If the reduced era5 dataset is missing, create it from the full dataset
-    era5_regions_path = Path(config.paths["era5_regions"])
-    if era5_regions_path.is_file():
-        print(f'The file {config.paths["era5_regions"]} exists')
-    else:
-        print(f'The file {config.paths["era5_regions"]} does not exist yet. Start creation process ...')
-        mapper = Era5Mapper()
-        mapper.create_era5_region()
+    era5_regions_path = Path(config.paths["era5_regions"] if args.output is None else args.output)
+    if era5_regions_path.exists() and not args.force:
+        logger.info("The file %s exists", era5_regions_path)
+        return
+
+    logger.info("The file %s does not exist yet. Start creation process ...", era5_regions_path)
+    mapper = Era5Mapper(args.era5_files)
+    mapper.create_era5_region(n_workers=args.workers, output_path=args.output, area_weighted=args.area_weighted)
+
+
+def train(args):
+    from src.forecast import Forecast
+    forecaster = Forecast(args.quantiles)
+    use_model_store = not args.no_model_store
+
+    if args.mode == "regression":
+        forecaster.forecast_regression(test_size=args.test_size, random_state=args.random_state, n_jobs=args.n_jobs,
+                                       use_model_store=use_model_store, prune_night=args.prune_night,
+                                       shared_memory=args.shared_memory, split_method=args.split_method,
+                                       block_length=args.block_length)
+    elif args.mode == "global":
+        forecaster.forecast_regression_global(test_size=args.test_size, random_state=args.random_state,
+                                              use_model_store=use_model_store, prune_night=args.prune_night,
+                                              split_method=args.split_method, block_length=args.block_length)
+    elif args.mode == "grid-search":
+        # Uses a GridSearchCV to find the best parametrization for the regression.
+        forecaster.forecast_regression_grid_search(config.param_grid, test_size=args.test_size,
+                                                   random_state=args.random_state, n_column_jobs=args.n_jobs,
+                                                   use_model_store=use_model_store, split_method=args.split_method,
+                                                   block_length=args.block_length)
+    elif args.mode == "halving":
+        forecaster.forecast_regression_halving_search(config.param_grid, test_size=args.test_size,
+                                                      random_state=args.random_state, n_jobs=args.n_jobs,
+                                                      use_model_store=use_model_store, split_method=args.split_method,
+                                                      block_length=args.block_length)
+    elif args.mode == "update":
+        forecaster.update(n_jobs=args.n_jobs, test_size=args.test_size, random_state=args.random_state,
+                          prune_night=args.prune_night)
+
+
+def predict(args):
+    from src.forecast import Forecast
+    Forecast(args.quantiles).predict()
+
 
-    # Make a forecast
-    forecaster = Forecast()
-    forecaster.forecast_regression(test_size=config.test_size, random_state=config.random_state)
+def score(args):
+    from src.forecast import Forecast
+    scores = Forecast(args.quantiles).score(clipped=args.clipped)
+    logger.info("Mean scores of all columns:\n%s", scores.mean().to_string())
 
-    # Uses a GridSearchCV to find the best parametrization for the regression.
-    # forecaster.forecast_regression_grid_search(config.param_grid)
 
-    # Not integrated in the workflow, but allows to check for daytime
-    # checker = DaytimeChecker()
-    # lon, lat = checker.get_centroid_cea(True, "DE0 0")
-    # checker.is_daytime(lon, lat)
+def scenarios(args):
+    from src.forecast import Forecast
+    Forecast().sample_scenarios(args.n, args.output, args.seed)
 
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Probabilistic forecasts of capacity factors with NGBoost")
+    parser.add_argument("--log-level", default=config.log_level, help="Log level, e.g. INFO or DEBUG")
+    parser.add_argument("--telemetry", action="store_true", help="Save a telemetry report of the run")
+    parser.add_argument("--profile", action="store_true", help="Profile the stages with cProfile, implies --telemetry")
+    subparsers = parser.add_subparsers(dest="command")
+
+    map_parser = subparsers.add_parser("map", help="Reduce the full era5 dataset to the regions of the shapefiles")
+    map_parser.add_argument("--era5-files", nargs="+", help="Full era5 datasets, e.g. one file per year")
+    map_parser.add_argument("--output", help="Path of the reduced dataset (.nc or .zarr)")
+    map_parser.add_argument("--workers", type=int, default=1, help="Number of time chunks reduced in parallel")
+    map_parser.add_argument("--area-weighted", action="store_true", help="Weight the grid cells by their area")
+    map_parser.add_argument("--force", action="store_true", help="Create the dataset even if it exists")
+    map_parser.set_defaults(function=map_regions)
+
+    train_parser = subparsers.add_parser("train", help="Train the models and predict the quantiles")
+    train_parser.add_argument("--mode", default="regression",
+                              choices=["regression", "global", "grid-search", "halving", "update"])
+    train_parser.add_argument("--test-size", type=float, default=config.test_size)
+    train_parser.add_argument("--random-state", type=int, default=config.random_state)
+    train_parser.add_argument("--n-jobs", type=int, default=config.n_jobs,
+                              help="Number of processes that train the columns in parallel")
+    train_parser.add_argument("--split-method", default=config.split_method, choices=["random", "blocked", "rolling"])
+    train_parser.add_argument("--block-length", type=int, default=config.block_length,
+                              help="Number of hours of a block of the blocked split")
+    train_parser.add_argument("--prune-night", action="store_true", help="Train the solar models on daytime only")
+    train_parser.add_argument("--shared-memory", action="store_true",
+                              help="Share memory-mapped data with the worker processes")
+    train_parser.add_argument("--no-model-store", action="store_true", help="Refit all models")
+    train_parser.set_defaults(function=train)
+
+    predict_parser = subparsers.add_parser("predict", help="Predict the quantiles with the stored models")
+    predict_parser.set_defaults(function=predict)
+
+    score_parser = subparsers.add_parser("score", help="Score the saved predicted distributions")
+    score_parser.add_argument("--clipped", action="store_true", help="Score the clipped quantiles")
+    score_parser.set_defaults(function=score)
+
+    scenarios_parser = subparsers.add_parser("scenarios", help="Draw joint scenarios from the saved distributions")
+    scenarios_parser.add_argument("--n", type=int, default=config.n_scenarios, help="Number of scenarios")
+    scenarios_parser.add_argument("--output", help="Path of the netCDF file of the scenarios")
+    scenarios_parser.add_argument("--seed", type=int, default=42)
+    scenarios_parser.set_defaults(function=scenarios)
+
+    for subparser in [train_parser, predict_parser, score_parser]:
+        subparser.add_argument("--quantiles", type=float, nargs="+", help="Quantiles, by default from the config")
+    return parser
+
+
+def main(args=None):
+    parser = create_parser()
+    args = parser.parse_args(args)
+
+    configure_logging("src", args.log_level)
+    configure_logging(__name__, args.log_level)
+    # Profiling records the stages of the telemetry
+    telemetry.enabled = telemetry.enabled or args.telemetry or args.profile
+    telemetry.profile = telemetry.profile or args.profile
+
+    if args.command is None:
+        # Default workflow: create the reduced era5 dataset if it is missing, then make a forecast
+        map_regions(parser.parse_args(["map"]))
+        train(parser.parse_args(["train"]))
+    else:
+        args.function(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,8 @@
 from datetime import datetime
+from pathlib import Path
+import hashlib
+
+import numpy as np
 
 def get_date_time_obj(date_time_str: str):
     """
@@ -7,4 +11,39 @@ def get_date_time_obj(date_time_str: str):
     :return: datetime object
     """
     # 2013-01-01 21:00:00
-    return datetime.strptime(date_time_str, "%Y-%m-%d %H:%M:%S")
\ No newline at end of file
+    return datetime.strptime(date_time_str, "%Y-%m-%d %H:%M:%S")
+
+
+def hash_inputs(files=(), arrays=(), values=()) -> str:
+    """
+    Computes a hash over the content of the given files, arrays and values. The hash is used as key for cached
+    results, so that a cached result is not used anymore if one of its inputs changes.
+    :param files: paths of the files
+    :param arrays: numpy arrays
+    :param values: other values with a deterministic string representation, e.g. names and hyperparameters
+    :return: hex digest of the hash
+    """
+    sha = hashlib.sha256()
+    for value in values:
+        sha.update(repr(value).encode())
+    for file in files:
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        sha.update(str(array.dtype).encode())
+        sha.update(str(array.shape).encode())
+        sha.update(array.tobytes())
+    return sha.hexdigest()[:16]
+
+
+def file_signature(path) -> tuple:
+    """
+    Returns the path, size and modification time of a file. Used as cheap cache key of large inputs, instead of hashing
+    their content.
+    :param path: path of the file
+    :return: Tuple of the absolute path, the size in bytes and the modification time in nanoseconds
+    """
+    stat = Path(path).stat()
+    return str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns
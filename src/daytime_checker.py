@@ -1,9 +1,16 @@
-import geopandas as gpd
-import ephem
+from src._helper import hash_inputs
+from src.telemetry import get_logger
+
+import numpy as np
+import pandas as pd
+import xarray as xr
 from datetime import datetime
+from pathlib import Path
 
 import config
 
+logger = get_logger(__name__)
+
 
 class DaytimeChecker:
     """
@@ -15,6 +22,7 @@ class DaytimeChecker:
         Loads onshore and offshore shapefiles. Calculates the centroid of the region to determine the daytime at this
         location
         """
+        import geopandas as gpd
         self.shape_onshore = gpd.read_file(config.paths["onshore_shape"])
         self.shape_onshore.index = self.shape_onshore["name"]
         self.shape_onshore.drop(columns=["name"], inplace=True)
@@ -60,6 +68,7 @@ class DaytimeChecker:
         :param time: time. If no time is given, then the current utc time is used
         :return: True if it is day, False otherwise
         """
+        import ephem
         obs = ephem.Observer()
 
         if time is None:
@@ -69,17 +78,102 @@ class DaytimeChecker:
         obs.lat = str(lat)
         obs.lon = str(lon)
 
-        print("UTC date: ", obs.date)
+        logger.info("UTC date: %s", obs.date)
 
         next_sunrise = obs.next_rising(ephem.Sun())
-        print("Next sunrise:", next_sunrise)
+        logger.info("Next sunrise: %s", next_sunrise)
 
         next_sunset = obs.next_setting(ephem.Sun())
-        print("Next sunset:", next_sunset)
+        logger.info("Next sunset: %s", next_sunset)
 
         if next_sunset < next_sunrise:
-            print("It is daytime: ", time)
+            logger.info("It is daytime: %s", time)
             return True
         else:
-            print("It is nighttime: ", time)
+            logger.info("It is nighttime: %s", time)
             return False
+
+    def get_centroids(self) -> pd.DataFrame:
+        """
+        Returns the centroids of all onshore and offshore regions. The region names follow the naming of the reduced
+        era5 dataset, e.g. "DE0 0 on" and "DE0 0 off".
+
+        :return: DataFrame with the longitude and latitude of every region
+        """
+        centroids_on = pd.DataFrame({"lon": self.shape_onshore["centroid_cea"].x.values,
+                                     "lat": self.shape_onshore["centroid_cea"].y.values},
+                                    index=self.shape_onshore.index + " on")
+        centroids_off = pd.DataFrame({"lon": self.shape_offshore["centroid_cea"].x.values,
+                                      "lat": self.shape_offshore["centroid_cea"].y.values},
+                                     index=self.shape_offshore.index + " off")
+        centroids = pd.concat([centroids_on, centroids_off])
+        centroids.index.name = "region"
+        return centroids
+
+    def daylight_mask(self, times, regions=None, use_cache=True, min_elevation=-0.833) -> xr.DataArray:
+        """
+        Checks for all regions and times if it is daytime at the centroid of the region. The solar elevation is
+        computed vectorized for all regions and times at once. The mask is cached per set of times and regions.
+
+        :param times: times in UTC
+        :param regions: Names of the regions as in the reduced era5 dataset. If not defined, all regions are used.
+        :param use_cache: True to load the mask from the cache directory and to cache a newly computed mask
+        :param min_elevation: Solar elevation in degrees above which it is daytime. The default is the altitude of
+            the sun's center at sunrise and sunset, including refraction, as used by ephem.
+        :return: boolean mask with dimensions (region, time) that is True if it is daytime
+        """
+        centroids = self.get_centroids()
+        if regions is not None:
+            centroids = centroids.loc[list(regions)]
+        times = pd.DatetimeIndex(times)
+
+        cache_file = None
+        if use_cache:
+            key = hash_inputs(arrays=[times.asi8, centroids[["lon", "lat"]].values],
+                              values=[list(centroids.index), min_elevation])
+            cache_file = Path(config.paths["cache"]) / ("daylight_mask_" + key + ".npy")
+            if cache_file.is_file():
+                return self._mask_dataarray(np.load(cache_file), centroids.index, times)
+
+        mask = solar_elevation(times, centroids["lon"].values, centroids["lat"].values) > min_elevation
+
+        if cache_file is not None:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            np.save(cache_file, mask)
+        return self._mask_dataarray(mask, centroids.index, times)
+
+    @staticmethod
+    def _mask_dataarray(mask: np.ndarray, regions, times) -> xr.DataArray:
+        return xr.DataArray(mask, dims=["region", "time"],
+                            coords={"region": np.asarray(regions, dtype=object), "time": times.values})
+
+
+def solar_elevation(times, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    """
+    Computes the solar elevation angle for all locations and times with the NOAA approximation of the solar position.
+    The accuracy of a few arc minutes is sufficient to distinguish day and night.
+
+    :param times: times in UTC
+    :param lon: longitude of the locations in degrees
+    :param lat: latitude of the locations in degrees
+    :return: solar elevation in degrees with shape (location, time)
+    """
+    times = pd.DatetimeIndex(times)
+    day_of_year = times.dayofyear.values
+    hour = times.hour.values + times.minute.values / 60 + times.second.values / 3600
+    days_in_year = np.where(times.is_leap_year, 366, 365)
+
+    # Fractional year, equation of time (minutes) and declination (radians)
+    gamma = 2 * np.pi / days_in_year * (day_of_year - 1 + (hour - 12) / 24)
+    eq_time = 229.18 * (0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma)
+                        - 0.014615 * np.cos(2 * gamma) - 0.040849 * np.sin(2 * gamma))
+    declination = (0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma) - 0.006758 * np.cos(2 * gamma)
+                   + 0.000907 * np.sin(2 * gamma) - 0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma))
+
+    # Hour angle of every location and time
+    true_solar_time = hour * 60 + eq_time + 4 * np.asarray(lon, dtype=np.float64)[:, np.newaxis]
+    hour_angle = np.deg2rad(true_solar_time / 4 - 180)
+
+    lat = np.deg2rad(np.asarray(lat, dtype=np.float64))[:, np.newaxis]
+    sin_elevation = np.sin(lat) * np.sin(declination) + np.cos(lat) * np.cos(declination) * np.cos(hour_angle)
+    return np.rad2deg(np.arcsin(np.clip(sin_elevation, -1, 1)))
@@ -1,12 +1,23 @@
 from src.energy_type import EnergyType
+from src.features import Feature
+from src.telemetry import get_logger, telemetry
 import config
 
 import pandas as pd
 import numpy as np
 import xarray as xr
-import geopandas as gpd
 from pathlib import Path
-from shapely.geometry import Point
+
+# geopandas, shapely, dask and netCDF4 are only imported in the functions that map and reduce the full era5 dataset,
+# so the forecast can import the helpers of this module without them
+
+logger = get_logger(__name__)
+
+"""
+Names of the variables in the full era5 dataset for each feature
+"""
+era5_variables = {feature: feature.value for feature in Feature}
+era5_variables[Feature.SOIL_TEMPERATURE] = "soil temperature"
 
 
 class Era5Mapper:
@@ -14,48 +25,150 @@ class Era5Mapper:
     This class contains functions to reduce the era5 dataset to regions defined by shapefiles.
     """
 
-    def __init__(self):
+    def __init__(self, era5_files=None, time_chunk=config.era5_time_chunk):
         """
-        Initializes the Era5Mapper. Loads the era5 weather dataset and the shapefiles
+        Initializes the Era5Mapper. Loads the era5 weather dataset and the shapefiles.
+        The era5 dataset is opened lazily in chunks over time, several files (e.g. one per year) are combined along
+        the time dimension.
+
+        :param era5_files: List of paths to the full era5 datasets. If not defined, the path is loaded from the config.
+        :param time_chunk: Number of time steps that are loaded and reduced at once
         """
+        import geopandas as gpd
+
+        if era5_files is None:
+            era5_files = [config.paths["era5_eu_2013"]]
+        self.time_chunk = time_chunk
 
-        era5_eu_2013 = Path(config.paths["era5_eu_2013"])
-        if era5_eu_2013.is_file():
-            print(f'The file {config.paths["era5_eu_2013"]} exists')
+        missing_files = [file for file in era5_files if not Path(file).is_file()]
+        if not missing_files:
+            logger.info("The files %s exist", era5_files)
 
             # Load the input data
-            self.era_data = xr.open_dataset(filename_or_obj=config.paths["era5_eu_2013"], engine="netcdf4")
+            if len(era5_files) == 1:
+                self.era_data = xr.open_dataset(filename_or_obj=era5_files[0], engine="netcdf4",
+                                                chunks={"time": time_chunk})
+            else:
+                self.era_data = xr.open_mfdataset(era5_files, engine="netcdf4", chunks={"time": time_chunk},
+                                                  combine="by_coords", data_vars="minimal", coords="minimal",
+                                                  compat="override")
             self.gdf_onshore = gpd.read_file(config.paths["onshore_shape"])
             self.gdf_offshore = gpd.read_file(config.paths["offshore_shape"])
 
         else:
-            print(f'The file {config.paths["era5_eu_2013"]} does not exist.')
-            print("The file must first be downloaded from the website: https://zenodo.org/record/4709858#.YZUVdCYo8WM")
+            logger.warning("The files %s do not exist.", missing_files)
+            logger.warning("The file must first be downloaded from the website: %s",
+                           "https://zenodo.org/record/4709858#.YZUVdCYo8WM")
 
-    def create_era5_region(self):
+    def create_era5_region(self, bulk=True, use_cache=True, grouped=True, n_workers=1, output_path=None,
+                           area_weighted=False, capacity_layout=None):
         """
         The function creates an era5 data set that has been reduced to the regions of the shapefiles.
         The path to the resource files is defined in the config file.
         Before the function can be executed, the complete era5 dataset must be downloaded.
+
+        :param bulk: True to map all coordinates at once with a spatial join, False to check every point separately
+        :param use_cache: True to reuse the cached region index of the grid if the shapefiles have not changed
+        :param grouped: True to compute all region means in one grouped reduction. Requires the bulk mapping.
+        :param n_workers: Number of time chunks that are reduced in parallel by the grouped reduction
+        :param output_path: Path of the reduced dataset (.nc or .zarr). If not defined, the path is loaded from the
+            config. Only used by the grouped reduction.
+        :param area_weighted: True to weight the grid cells by the fraction of their area that lies within the region
+            instead of taking the mean of the cell centers within the region. Only used by the grouped reduction.
+        :param capacity_layout: Optional capacity of every grid cell with dimensions (y, x) that is multiplied with
+            the area weights
+        """
+
+        if bulk and grouped:
+            if output_path is None:
+                output_path = config.paths["era5_regions"]
+            with telemetry.stage("region_mapping"):
+                if area_weighted:
+                    weights = self.get_area_weights(use_cache, capacity_layout)
+                else:
+                    weights = self.get_region_index(use_cache).membership_matrix(self.gdf_onshore.shape[0],
+                                                                                 self.gdf_offshore.shape[0])
+            with telemetry.stage("region_aggregation"):
+                self._create_era5_region_data_grouped(weights, n_workers, output_path)
+        else:
+            with telemetry.stage("region_mapping"):
+                regions_onshore, regions_offshore = self._map_coordinates_to_regions(bulk, use_cache)
+            with telemetry.stage("region_aggregation"):
+                self._create_era5_region_data(regions_onshore, regions_offshore)
+        telemetry.save()
+
+    def _map_coordinates_to_regions(self, bulk=True, use_cache=True):
+        """
+        Helper function that maps the coordinates from the era_data to the regions described by the shapefiles.
+
+        :param bulk: True to use a single spatial join for all coordinates, False to check every point separately
+        :param use_cache: True to reuse the cached region index in bulk mode
+        :return: A list of all the regions and the coordinates that lies within this region.
+        """
+        if bulk:
+            return self._map_coordinates_to_regions_bulk(use_cache)
+        return self._map_coordinates_to_regions_pointwise()
+
+    def get_region_index(self, use_cache=True) -> "RegionIndex":
+        """
+        Returns the index with the onshore and offshore region of every grid cell of the era5 dataset.
+
+        :param use_cache: True to load the index from the cache directory and to cache a newly created index
+        :return: the region index
+        """
+        from src.region_index import RegionIndex
+        x = self.era_data.coords['x'].values
+        y = self.era_data.coords['y'].values
+        if use_cache:
+            return RegionIndex.load_or_create(x, y, self.gdf_onshore, self.gdf_offshore)
+        return RegionIndex.create(x, y, self.gdf_onshore, self.gdf_offshore)
+
+    def get_area_weights(self, use_cache=True, capacity_layout=None):
         """
+        Returns the sparse matrix with the fraction of each grid cell's area that lies within each region,
+        optionally multiplied by the capacity layout.
 
-        regions_onshore, regions_offshore = self._map_coordinates_to_regions()
-        self._create_era5_region_data(regions_onshore, regions_offshore)
+        :param use_cache: True to load the weights from the cache directory and to cache newly created weights
+        :param capacity_layout: Optional capacity of every grid cell with dimensions (y, x)
+        :return: matrix of shape (n_regions, n_points) with the weight of every grid cell in each region
+        """
+        from src.region_weights import create_area_weights, load_or_create_area_weights
+        x = self.era_data.coords['x'].values
+        y = self.era_data.coords['y'].values
+        if use_cache:
+            return load_or_create_area_weights(x, y, self.gdf_onshore, self.gdf_offshore, capacity_layout)
+        return create_area_weights(x, y, self.gdf_onshore, self.gdf_offshore, capacity_layout)
+
+    def _map_coordinates_to_regions_bulk(self, use_cache=True):
+        """
+        Helper function that maps the coordinates from the era_data to the regions described by the shapefiles.
+        All grid points are created at once and assigned to the regions with an STRtree-backed spatial join.
 
-    def _map_coordinates_to_regions(self):
+        :param use_cache: True to reuse the cached region index
+        :return: A list of all the regions and the coordinates that lies within this region.
+        """
+
+        logger.info("Mapping coordinates to their regions given by the shapefiles (spatial join) ...")
+
+        region_index = self.get_region_index(use_cache)
+        return region_index.coordinates(self.gdf_onshore.shape[0], self.gdf_offshore.shape[0])
+
+    def _map_coordinates_to_regions_pointwise(self):
         """
         Helper function that maps the coordinates from the era_data to the regions described by the shapefiles.
+        Every point is checked separately against every polygon.
 
         :return: A list of all the regions and the coordinates that lies within this region.
         """
 
-        dim_x, dim_y, dim_t = self.era_data.sizes.values()
+        from shapely.geometry import Point
+        dim_x, dim_y = self.era_data.sizes["x"], self.era_data.sizes["y"]
 
         # list of all coordinates that are within the regions given by the shapefiles
         regions_onshore = [[] for _ in range(self.gdf_onshore.shape[0])]
         regions_offshore = [[] for _ in range(self.gdf_offshore.shape[0])]
 
-        print("Mapping coordinates to their regions given by the shapefiles ...")
+        logger.info("Mapping coordinates to their regions given by the shapefiles ...")
         i = 0
 
         for y in range(dim_y):
@@ -64,7 +177,7 @@ class Era5Mapper:
 
                 i += 1
                 if i % 1000 == 0:
-                    print("Checking " + str(point) + " " + str(i) + " of " + str(dim_y * dim_x))
+                    logger.info("Checking %s %s of %s", point, i, dim_y * dim_x)
 
                 for region_idx in range(self.gdf_onshore.shape[0]):
                     polygon = self.gdf_onshore.iloc[region_idx].geometry
@@ -88,28 +201,16 @@ class Era5Mapper:
         :param regions_offshore: A list of all the regions and the coordinates that lies within this region.
         """
 
-        print("Creating era5 data for the regions. This process can take a very long time.")
+        logger.info("Creating era5 data for the regions. This process can take a very long time.")
 
         region_coords = regions_onshore + regions_offshore
-
-        # Coordinates. Adding "on" and "off" to the name to avoid duplicates in the offshore and onshore region names.
-        times = self.era_data["time"].values
-        regions_on = self.gdf_onshore["name"].values
-        for i in range(regions_on.shape[0]):
-            regions_on[i] = regions_on[i] + " on"
-        regions_off = self.gdf_offshore["name"].values
-        for i in range(regions_off.shape[0]):
-            regions_off[i] = regions_off[i] + " off"
-        regions = np.concatenate((regions_on, regions_off))
-
-        # Dimension/Coordinates sizes
-        n_time = times.shape[0]
+        regions = self._region_names()
         n_regions = regions.shape[0]
 
         era_regions = []
         for region_idx in range(n_regions):
-            print("Creating Dataset for region " + str(region_idx + 1) + " (" + str(
-                len(region_coords[region_idx])) + " points) of " + str(n_regions))
+            logger.info("Creating Dataset for region %s (%s points) of %s", region_idx + 1,
+                        len(region_coords[region_idx]), n_regions)
 
             coords = region_coords[region_idx]
             x_coords = [str(x[0]) for x in coords]
@@ -121,31 +222,159 @@ class Era5Mapper:
 
         era_regions_concat = xr.concat(era_regions, pd.Index(regions, name="region")).transpose("region", "time")
 
-        era_regions_ds = xr.Dataset(
-            data_vars=dict(
-                height=(
-                    ["region", "time"],
-                    np.full((n_regions, n_time), np.repeat(era_regions_concat["height"].data, 8760).reshape(65, 8760))),
-                wnd100m=(["region", "time"], era_regions_concat["wnd100m"].data),
-                roughness=(["region", "time"], era_regions_concat["roughness"].data),
-                influx_toa=(["region", "time"], era_regions_concat["influx_toa"].data),
-                influx_direct=(["region", "time"], era_regions_concat["influx_direct"].data),
-                influx_diffuse=(["region", "time"], era_regions_concat["influx_diffuse"].data),
-                albedo=(["region", "time"], era_regions_concat["albedo"].data),
-                temperature=(["region", "time"], era_regions_concat["temperature"].data),
-                soil_temperature=(["region", "time"], era_regions_concat["soil temperature"].data),
-                runoff=(["region", "time"], era_regions_concat["runoff"].data),
-            ),
+        region_data = {}
+        for feature in Feature:
+            region_data[feature] = era_regions_concat[era5_variables[feature]].data
+        era_regions_ds = self._region_dataset(region_data, era_regions_concat["region"].data,
+                                              era_regions_concat["time"].data)
+        era_regions_ds.to_netcdf(config.paths["era5_regions"])
+
+    def _create_era5_region_data_grouped(self, weights, n_workers=1, output_path=config.paths["era5_regions"]):
+        """
+        Helper function that takes the average of all coordinates within a region and creates a new xarray dataset.
+        All region means are computed in one grouped reduction, a sparse weight matrix times the flattened grid.
+        The era5 data is streamed in chunks over time and every reduced chunk is appended to the output file, so the
+        memory usage stays bounded for multi-year datasets.
+
+        :param weights: sparse matrix of shape (n_regions, n_points) with the weight of every grid cell in each region,
+            e.g. the membership matrix of the region index
+        :param n_workers: Number of time chunks that are reduced in parallel with the dask threaded scheduler
+        :param output_path: Path of the reduced dataset. Written as Zarr store if the suffix is .zarr, else netCDF.
+        """
+
+        import dask
+        logger.info("Creating era5 data for the regions (grouped reduction) ...")
+
+        regions = self._region_names()
+        times = self.era_data["time"].values
+        n_time = times.shape[0]
+
+        static_data = {}
+        for feature in Feature:
+            variable = self.era_data[era5_variables[feature]]
+            if "time" not in variable.dims:
+                static_data[feature] = region_mean(weights, variable.transpose("y", "x").values.reshape(-1))
+
+        chunk_starts = list(range(0, n_time, self.time_chunk))
+        for group_idx in range(0, len(chunk_starts), n_workers):
+            group = chunk_starts[group_idx:group_idx + n_workers]
+            tasks = [dask.delayed(self._reduce_time_chunk)(weights, start, min(start + self.time_chunk, n_time))
+                     for start in group]
+            chunks = dask.compute(*tasks, scheduler="threads", num_workers=n_workers)
+
+            for start, region_data in zip(group, chunks):
+                stop = min(start + self.time_chunk, n_time)
+                logger.info("Reduced the time steps %s to %s of %s", start, stop, n_time)
+                region_data.update(static_data)
+                append_region_dataset(self._region_dataset(region_data, regions, times[start:stop]), output_path,
+                                      start == 0)
+
+    def _reduce_time_chunk(self, weights, start: int, stop: int) -> dict:
+        """
+        Helper function that computes the region means of all time dependent variables for the given time steps.
+
+        :param weights: sparse weight matrix of the grid cells
+        :param start: first time step
+        :param stop: time step after the last one
+        :return: Dictionary of the features and their values with shape (region, time)
+        """
+        region_data = {}
+        for feature in Feature:
+            variable = self.era_data[era5_variables[feature]]
+            if "time" in variable.dims:
+                values = variable.isel(time=slice(start, stop)).transpose("y", "x", "time").values
+                region_data[feature] = region_mean(weights, values.reshape(-1, stop - start))
+        return region_data
+
+    def _region_names(self) -> np.ndarray:
+        """
+        Helper function that returns the names of the onshore regions followed by the offshore regions.
+        Adding "on" and "off" to the name to avoid duplicates in the offshore and onshore region names.
+
+        :return: array of the region names
+        """
+        regions_on = [name + " on" for name in self.gdf_onshore["name"].values]
+        regions_off = [name + " off" for name in self.gdf_offshore["name"].values]
+        return np.array(regions_on + regions_off, dtype=object)
+
+    def _region_dataset(self, region_data: dict, regions: np.ndarray, times: np.ndarray) -> xr.Dataset:
+        """
+        Helper function that creates the xarray dataset of the regions. Variables without time dimension, like the
+        height, are repeated for all time steps.
+
+        :param region_data: Dictionary of the features and their values with shape (region, time) or (region)
+        :param regions: names of the regions
+        :param times: time steps
+        :return: dataset of the regions
+        """
+        n_time = times.shape[0]
+
+        data_vars = {}
+        for feature, values in region_data.items():
+            if values.ndim == 1:
+                values = np.repeat(values[:, np.newaxis], n_time, axis=1)
+            data_vars[feature.value] = (["region", "time"], values)
+
+        return xr.Dataset(
+            data_vars=data_vars,
             coords=dict(
-                region=(["region"], era_regions_concat["region"].data),
-                time=(["time"], era_regions_concat["time"].data),
+                region=(["region"], regions),
+                time=(["time"], times),
             ),
             attrs=dict(
                 description="Era5 data with mean value of the coordinates within a region",
             ),
         )
 
-        era_regions_ds.to_netcdf(config.paths["era5_regions"])
+
+def append_region_dataset(dataset: xr.Dataset, path, first: bool):
+    """
+    Appends the reduced time steps to the dataset of the regions on disk.
+
+    :param dataset: reduced dataset of the time steps
+    :param path: path of the dataset. Written as Zarr store if the suffix is .zarr, else as netCDF.
+    :param first: True if this is the first chunk. An existing file is overwritten.
+    """
+    import netCDF4
+
+    path = Path(path)
+    if path.suffix == ".zarr":
+        if first:
+            dataset.to_zarr(path, mode="w")
+        else:
+            dataset.to_zarr(path, append_dim="time")
+        return
+
+    if first:
+        dataset.to_netcdf(path, unlimited_dims=["time"])
+        return
+
+    # xarray can't append along a dimension of a netCDF file, so the time steps are written with netCDF4 directly
+    with netCDF4.Dataset(path, "a") as nc:
+        time = nc.variables["time"]
+        n_written = time.shape[0]
+        n_new = dataset.sizes["time"]
+        time[n_written:n_written + n_new] = netCDF4.date2num(
+            pd.to_datetime(dataset["time"].values).to_pydatetime(), time.units, getattr(time, "calendar", "standard"))
+        for name, variable in dataset.data_vars.items():
+            nc.variables[name][:, n_written:n_written + n_new] = variable.transpose("region", "time").values
+
+
+def region_mean(weights, values: np.ndarray) -> np.ndarray:
+    """
+    Computes the weighted mean of the grid points for all regions at once. Missing values are skipped like in
+    xarray's mean. The sums are accumulated in float64 and the means are rounded to the dtype of the values once.
+
+    :param weights: sparse matrix of shape (n_regions, n_points) with the weight of every grid point in each region
+    :param values: values of the grid points with shape (n_points) or (n_points, n_time)
+    :return: mean values of the regions with shape (n_regions) or (n_regions, n_time)
+    """
+    weights = weights.astype(np.float64)
+    valid = ~np.isnan(values)
+    total = weights @ np.where(valid, values, 0).astype(np.float64)
+    count = weights @ valid.astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (total / count).astype(values.dtype)
 
 
 def get_era5_region_name(region_name: str, energy_type: EnergyType) -> str:
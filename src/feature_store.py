@@ -0,0 +1,110 @@
+from src.features import Feature
+import config
+
+import json
+import numpy as np
+import xarray as xr
+from pathlib import Path
+
+
+class FeatureStore:
+    """
+    Holds all features of all regions in one contiguous float32 array of shape (region, time, feature). The features
+    are ordered so that the feature set of every energy type is a contiguous block, which allows to return the
+    training data of a region as view without copying. The array can be saved and memory-mapped, so that several
+    processes share it without pickling.
+    """
+
+    def __init__(self, values: np.ndarray, regions: list, features: list, path=None):
+        """
+        Initializes the feature store.
+
+        :param values: array of shape (region, time, feature)
+        :param regions: names of the regions as in the reduced era5 dataset
+        :param features: features of the last axis
+        :param path: Path of the .npy file if the store was opened from disk
+        """
+        self.values = values
+        self.path = path
+        self.regions = list(regions)
+        self.features = list(features)
+        self.region_index = {region: i for i, region in enumerate(self.regions)}
+        self.feature_index = {feature: i for i, feature in enumerate(self.features)}
+
+    @staticmethod
+    def feature_order() -> list:
+        """
+        Returns the features of all energy types in the order of their first appearance in the config.
+
+        :return: list of features
+        """
+        features = []
+        for feature_set in config.feature_set.values():
+            for feature in feature_set:
+                if feature not in features:
+                    features.append(feature)
+        return features
+
+    @classmethod
+    def from_dataset(cls, era5: xr.Dataset, features=None):
+        """
+        Loads the features of all regions from the reduced era5 dataset, one variable at a time.
+
+        :param era5: reduced era5 dataset with dimensions (region, time)
+        :param features: Features that are loaded. If not defined, all features of the config are loaded.
+        :return: the feature store
+        """
+        features = cls.feature_order() if features is None else features
+        values = np.empty((era5.sizes["region"], era5.sizes["time"], len(features)), dtype=np.float32)
+        for i, feature in enumerate(features):
+            values[:, :, i] = era5[feature.value].transpose("region", "time").values
+        return cls(values, era5["region"].values, features)
+
+    def save(self, path):
+        """
+        Saves the array as .npy file and the regions and features as .json file next to it.
+
+        :param path: path of the .npy file
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(path, self.values)
+        with open(path.with_suffix(".json"), "w") as f:
+            json.dump({"regions": self.regions, "features": [feature.value for feature in self.features]}, f)
+
+    @classmethod
+    def open(cls, path, mmap_mode="r"):
+        """
+        Opens a saved feature store.
+
+        :param path: path of the .npy file
+        :param mmap_mode: Memory-map mode of numpy.load, None to load the array into memory
+        :return: the feature store
+        """
+        path = Path(path)
+        with open(path.with_suffix(".json")) as f:
+            meta = json.load(f)
+        return cls(np.load(path, mmap_mode=mmap_mode), meta["regions"], [Feature(f) for f in meta["features"]], path)
+
+    def get(self, region: str, features: list) -> np.ndarray:
+        """
+        Returns the features of a region. If the features are a contiguous block of the store, a view is returned.
+
+        :param region: name of the region as in the reduced era5 dataset
+        :param features: list of features
+        :return: array of shape (time, n_features)
+        """
+        idx = [self.feature_index[feature] for feature in features]
+        if idx and idx == list(range(idx[0], idx[0] + len(idx))):
+            return self.values[self.region_index[region], :, idx[0]:idx[0] + len(idx)]
+        return self.values[self.region_index[region]][:, idx]
+
+    def get_feature(self, region: str, feature: Feature) -> np.ndarray:
+        """
+        Returns a single feature of a region as view.
+
+        :param region: name of the region as in the reduced era5 dataset
+        :param feature: the feature
+        :return: array of shape (time)
+        """
+        return self.values[self.region_index[region], :, self.feature_index[feature]]
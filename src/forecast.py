@@ -1,12 +1,21 @@
 from src.forecast_data import *
 from src.metrics import *
+from src.model_store import ModelStore
+from src.forecast_result import ForecastResult, normal_quantile
+from src.output_backend import CsvBackend, get_output_backend
+from src.features import Feature
+from src.validation import split_train_validation, best_iteration
+from src.telemetry import get_logger, telemetry
 import config
 
+import logging
 import pandas as pd
-from ngboost import NGBRegressor
-from sklearn.model_selection import train_test_split, GridSearchCV
-from ngboost.distns import Normal
-from ngboost.scores import LogScore
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# ngboost, sklearn and geopandas are only imported in the code paths that fit models or compute the daytime, so the
+# forecast can be imported and scored without them
+
+logger = get_logger(__name__)
 
 
 class Forecast:
@@ -28,125 +37,471 @@ class Forecast:
         else:
             self.quantiles = _quantiles
 
-    def forecast_regression(self, test_size=0.25, random_state=42):
+    def forecast_regression(self, test_size=0.25, random_state=42, n_jobs=1, use_model_store=True,
+                            prune_night=False, shared_memory=False, split_method=config.split_method,
+                            block_length=config.block_length, early_stopping_rounds=config.early_stopping_rounds,
+                            early_stopping_tol=config.early_stopping_tol):
         """
         The function makes a regression with NGBoost. A separate model is trained for each region and energy source. The data is split into training and test data. The training is terminated prematurely if the score on the test data does not improve anymore.
-        The quantile predictions are saved as .csv files.
+        The quantile predictions are saved in the output format defined in the config.
+
+        :param test_size: Ratio between training and test data
+        :param random_state: Random state to allow comparability of results
+        :param n_jobs: Number of processes that train the models of the columns in parallel
+        :param use_model_store: True to reuse stored models whose inputs have not changed and to store refitted models
+        :param prune_night: True to train the solar models on daytime hours only. At night a capacity factor of zero
+            is predicted.
+        :param shared_memory: True to let the worker processes attach to memory-mapped data instead of receiving
+            copies of their arrays
+        :param split_method: Split into training and validation data: "random", "blocked" or "rolling"
+        :param block_length: Number of hours of a block of the blocked split. With prune_night the blocks still cover
+            block_length hours of the full series.
+        :param early_stopping_rounds: Number of iterations without improvement before the training is terminated
+        :param early_stopping_tol: Minimum decrease of the validation loss that counts as improvement
+        """
+
+        model_store = ModelStore() if use_model_store else None
+        column_kwargs = None
+        if prune_night:
+            column_kwargs = {col_name: {"day_mask": day_mask} for col_name, day_mask in self._day_masks().items()}
+        results = self._forecast_columns(fit_column, n_jobs, column_kwargs, shared_memory, test_size=test_size,
+                                         random_state=random_state, model_store=model_store,
+                                         split_method=split_method, block_length=block_length,
+                                         early_stopping_rounds=early_stopping_rounds,
+                                         early_stopping_tol=early_stopping_tol)
+        self._save_results(results)
+
+    def forecast_regression_global(self, test_size=0.25, random_state=42, use_model_store=True, prune_night=False,
+                                   split_method=config.split_method, block_length=config.block_length,
+                                   early_stopping_rounds=config.early_stopping_rounds,
+                                   early_stopping_tol=config.early_stopping_tol):
+        """
+        The function makes a regression with NGBoost with one global model per energy type instead of one model per
+        region. Each model is trained on the stacked data of all regions of its energy type. The static attributes of
+        the region (centroid longitude and latitude and, if the height is not a feature yet, the mean height) are
+        added as features. The distributions of all regions are predicted in one call. The stored global models are
+        also used by predict() for columns without a model of their own.
+        The quantile predictions are saved in the output format defined in the config.
 
         :param test_size: Ratio between training and test data
         :param random_state: Random state to allow comparability of results
+        :param use_model_store: True to reuse stored models whose inputs have not changed and to store refitted models
+        :param prune_night: True to train the solar model on daytime hours only. At night a capacity factor of zero is
+            predicted.
+        :param split_method: Split into training and validation data: "random", "blocked" or "rolling"
+        :param block_length: Number of hours of a block of the blocked split. The blocks are built on the hours of the
+            series, so the same hours are held out for all regions.
+        :param early_stopping_rounds: Number of iterations without improvement before the training is terminated
+        :param early_stopping_tol: Minimum decrease of the validation loss that counts as improvement
         """
+        from src.daytime_checker import DaytimeChecker
+
+        model_store = ModelStore() if use_model_store else None
+        day_masks = self._day_masks() if prune_night else {}
+        centroids = DaytimeChecker().get_centroids()
+
+        columns_by_type = {}
+        for col_name, region_name, energy_type in self._training_columns():
+            columns_by_type.setdefault(energy_type, []).append((col_name, region_name))
 
         results = {}
-        new_columns = {}  # Helper to avoid fragmentation of the result Dataframe
-        for q in self.quantiles:
-            results[q] = pd.DataFrame()
-            results[q]["snapshot"] = self.data.capfacts["snapshot"]
-            new_columns[q] = {}
+        for energy_type, columns in columns_by_type.items():
+            logger.info("Create stacked trainings data of %s regions with energy type: %s", len(columns), energy_type)
+            X_stack, Y_stack, masks = [], [], []
+            for col_name, region_name in columns:
+                Y, X_pred = self._global_feature_matrix(col_name, region_name, energy_type, centroids)
+                X_stack.append(X_pred)
+                Y_stack.append(Y)
+                masks.append(day_masks.get(col_name, np.ones(Y.shape[0], dtype=bool)))
+
+            features = global_feature_names(energy_type)
+            day_mask = np.concatenate(masks) if energy_type == EnergyType.SOLAR and prune_night else None
+            # The split holds out the same hours of every region
+            result = fit_column(global_column_name(energy_type), np.concatenate(X_stack), np.concatenate(Y_stack),
+                                features, test_size, random_state, model_store, day_mask, split_method=split_method,
+                                block_length=block_length, early_stopping_rounds=early_stopping_rounds,
+                                early_stopping_tol=early_stopping_tol, n_time=self.data.capfacts.shape[0])
+            self._print_feature_importances(result["feature_importances"], features)
+
+            # Split the stacked prediction back into the columns
+            offset = 0
+            for (col_name, region_name), Y in zip(columns, Y_stack):
+                n_samples = Y.shape[0]
+                results[col_name] = distribution_result(result["loc"][offset:offset + n_samples],
+                                                        result["scale"][offset:offset + n_samples])
+                offset += n_samples
+                logger.info("Scores of column: %s", col_name)
+                self._report_column(col_name, results[col_name], Y, energy_type)
+
+        self._save_results(results)
+
+    def _global_feature_matrix(self, col_name: str, region_name: str, energy_type: EnergyType,
+                               centroids: pd.DataFrame) -> (np.ndarray, np.ndarray):
+        """
+        Helper function that returns the training data of a column for the global model of its energy type: the
+        features of the column followed by the static attributes of the region, see global_feature_names.
+
+        :param col_name: column name of the capfacts .csv file
+        :param region_name: name of the region
+        :param energy_type: energy type of the column
+        :param centroids: centroids of the regions, see DaytimeChecker.get_centroids
+        :return: Tuple of capacity factor (Y) and trainings data (X) of shape (n_samples, n_features)
+        """
+        Y, X_pred = self.data.get_feature_matrix(col_name)
+        static = global_static_features(self.data, region_name, energy_type, centroids)
+        return Y, np.column_stack([X_pred, np.tile(static, (X_pred.shape[0], 1))])
 
-        capfacts_cols = self.data.capfacts.columns.values[1:]
+    def predict(self, model_store=None):
+        """
+        Predicts the quantiles of all columns with the stored models, without training. Columns without a stored model
+        of their own are predicted with the stored global model of their energy type, see forecast_regression_global.
+        Columns without a stored model for their feature set are skipped.
+        The quantile predictions are saved in the output format defined in the config.
+
+        :param model_store: Store of the fitted models. If not defined, the store in the configured path is used.
+        """
+        from src.daytime_checker import DaytimeChecker
 
-        i = 1
-        for col_name in capfacts_cols:
-            print("Processing \"", col_name, "\" (", i, "/", len(capfacts_cols), ")")
-            i += 1
+        if model_store is None:
+            model_store = ModelStore()
+
+        results = {}
+        day_masks = None
+        global_entries = {}
+        centroids = None
+        for col_name, region_name, energy_type in self._training_columns():
+            entry = model_store.load(col_name)
+            use_global = entry is None or entry["features"] != feature_names(energy_type)
+            if use_global:
+                if energy_type not in global_entries:
+                    global_entries[energy_type] = model_store.load(global_column_name(energy_type))
+                entry = global_entries[energy_type]
+                if entry is None or entry["features"] != global_feature_names(energy_type):
+                    logger.warning("No stored model for column: %s", col_name)
+                    continue
+
+            day_mask = None
+            if entry.get("prune_night", False):
+                if day_masks is None:
+                    day_masks = self._day_masks()
+                day_mask = day_masks[col_name]
+
+            if use_global:
+                if centroids is None:
+                    centroids = DaytimeChecker().get_centroids()
+                Y, X_pred = self._global_feature_matrix(col_name, region_name, energy_type, centroids)
+            else:
+                Y, X_pred = self.data.get_feature_matrix(col_name)
+            loc, scale = predict_column(entry["model"], X_pred, entry["best_val_loss_itr"], day_mask)
+            results[col_name] = distribution_result(loc, scale)
+            logger.info("Predicted column: %s", col_name)
+            self._report_column(col_name, results[col_name], Y, energy_type)
+
+        self._save_results(results)
+
+    def update(self, n_jobs=1, n_estimators=config.update_estimators, drift_threshold=config.drift_threshold,
+               test_size=0.25, random_state=42, prune_night=False):
+        """
+        Updates the forecast incrementally with the snapshots of the capacity factors that are not part of the saved
+        predicted distributions yet. The stored model of each column is boosted further on the new snapshots. Columns
+        whose stored model has drifted, or that have no stored model, are refitted on the full history. Only the
+        predictions of the new snapshots are appended to the saved distributions and quantiles.
+        The updated models are stored under a key of their own, so a later forecast_regression does not reuse them and
+        refits the columns on the full history.
+
+        :param n_jobs: Number of processes that update the models of the columns in parallel
+        :param n_estimators: Maximum number of additional boosting iterations on the new snapshots
+        :param drift_threshold: Increase of the NLL on the new snapshots compared to the validation NLL of the last fit
+            above which a column is refitted
+        :param test_size: Ratio between training and test data of the new snapshots or of a refit
+        :param random_state: Random state to allow comparability of results
+        :param prune_night: True to train the solar models of columns without a stored model on daytime hours only.
+            Stored models keep the setting of their last fit.
+        """
+        previous = ForecastResult.open(load=True)
+        new_mask = ~pd.Index(self.data.capfacts["snapshot"]).isin(previous.dataset["snapshot"].values)
+        if not new_mask.any():
+            logger.info("No new snapshots since the last forecast")
+            return
+        logger.info("Update the forecast with %s new snapshots", new_mask.sum())
+
+        column_kwargs = {col_name: {"day_mask": day_mask} for col_name, day_mask in self._day_masks().items()}
+        results = self._forecast_columns(update_column, n_jobs, column_kwargs,
+                                         column_names=set(previous.dataset["column"].values), new_mask=new_mask,
+                                         model_store=ModelStore(), n_estimators=n_estimators,
+                                         drift_threshold=drift_threshold, test_size=test_size,
+                                         random_state=random_state, prune_night=prune_night)
+
+        columns = {col_name: (results[col_name]["loc"], results[col_name]["scale"])
+                   for col_name in previous.dataset["column"].values}
+        update = ForecastResult.from_columns(self.data.capfacts["snapshot"].values[new_mask], columns)
+        with telemetry.stage("save_results"):
+            previous.append(update).save()
+            get_output_backend().append(update, self.quantiles)
+        telemetry.save()
+
+    def sample_scenarios(self, n_scenarios=config.n_scenarios, path=None, seed=42):
+        """
+        Draws joint scenarios of all columns from the saved predicted distributions. The correlation between the
+        columns and the autocorrelation over time are estimated from the residuals of the capacity factors.
+
+        :param n_scenarios: Number of scenarios
+        :param path: path of the netCDF file. If not defined, the path is loaded from the config.
+        :param seed: seed of the random numbers
+        :return: path of the netCDF file
+        """
+        from src.scenarios import ScenarioGenerator
+
+        forecast_result = ForecastResult.open(load=True)
+        capfacts = self.data.capfacts.set_index("snapshot").loc[forecast_result.dataset["snapshot"].values]
+        with telemetry.stage("scenarios"):
+            generator = ScenarioGenerator(forecast_result).fit(capfacts)
+            path = generator.sample(n_scenarios, path, seed)
+        telemetry.save()
+        return path
+
+    def _training_columns(self) -> list:
+        """
+        Helper function that returns the columns of the capacity factors for which a model is trained.
+        Columns with an undefined energy type or run of river are skipped.
 
+        :return: list of tuples of the column name, region name and energy type
+        """
+        columns = []
+        for col_name in self.data.capfacts.columns.values[1:]:
             region_name, energy_type = self.data.parse_capfac_col(col_name)
 
             if (energy_type == EnergyType.NOT_DEFINED) or (energy_type == EnergyType.ROR):
-                print("Skipped column: ", col_name)
-                print("------------------------------------------------------------------\n")
+                logger.info("Skipped column: %s", col_name)
             else:
-                print("Create Trainings data for region: ", region_name, " with energy type: ", energy_type)
+                columns.append((col_name, region_name, energy_type))
+        return columns
 
-                Y, X = self.data.get_training_data(col_name)
-                X_pred = self.data.shape_multi_feature_data(X)
-                X_train, X_test, Y_train, Y_test = train_test_split(X_pred, Y, test_size=test_size,
-                                                                    random_state=random_state)
+    def _day_masks(self) -> dict:
+        """
+        Helper function that determines the daytime hours of the solar columns at the centroid of their region.
 
-                print("Fit Regression Model for region ", region_name)
-                ngb = NGBRegressor(Dist=Normal, Score=LogScore, n_estimators=1000, random_state=42, verbose=True)
-                ngb.fit(X=X_train, Y=Y_train, X_val=X_test, Y_val=Y_test, early_stopping_rounds=2)
-                self._print_feature_importances(ngb.feature_importances_, energy_type)
+        :return: Dictionary of the solar column names and boolean arrays that are True for the daytime snapshots
+        """
+        from src.daytime_checker import DaytimeChecker
 
-                print("Predict capacity factors for region ", region_name, "with quantiles: ", self.quantiles)
-                Y_dists = ngb.pred_dist(X_pred, max_iter=ngb.best_val_loss_itr)
+        solar_columns = {col_name: get_era5_region_name(region_name, energy_type)
+                         for col_name, region_name, energy_type in self._training_columns()
+                         if energy_type == EnergyType.SOLAR}
+        if not solar_columns:
+            return {}
 
-                for q in self.quantiles:
-                    Y_pred = Y_dists.ppf(q)
-                    new_columns[q][col_name] = pd.Series(Y_pred)
-                    self._calculate_scores(Y, Y_pred, q, Y_dists, False)
-                print("------------------------------------------------------------------\n")
+        regions = sorted(set(solar_columns.values()))
+        mask = DaytimeChecker().daylight_mask(self.data.capfacts["snapshot"].values, regions)
+        return {col_name: mask.sel(region=region).values for col_name, region in solar_columns.items()}
 
-        for q in self.quantiles:
-            new_columns[q] = pd.DataFrame(new_columns[q], index=results[q].index)
-            results[q] = pd.concat([results[q], new_columns[q]], axis=1)
-            self._clip_and_save(results[q], q)
+    def _forecast_columns(self, fit_function, n_jobs=1, column_kwargs=None, shared_memory=False, column_names=None,
+                          **kwargs) -> dict:
+        """
+        Helper function that trains a model for each column of the capacity factors. With more than one job, the
+        columns are spread over a process pool. Each worker receives only the feature and target arrays of its column,
+        or with shared memory only a handle to the memory-mapped data.
+
+        :param fit_function: Module level function that fits the model of a column, see fit_column
+        :param n_jobs: Number of processes that train the models in parallel
+        :param column_kwargs: Optional dictionary of column names and additional arguments of the fit function that
+            only apply to this column
+        :param shared_memory: True to export the data once to memory-mapped files that the workers attach to
+        :param column_names: Optional names of the columns that are trained. If not defined, all columns are trained.
+        :param kwargs: Additional arguments of the fit function
+        :return: Dictionary of the column names and the results of the fit function
+        """
+        columns = self._training_columns()
+        if column_names is not None:
+            columns = [column for column in columns if column[0] in column_names]
+        column_kwargs = {} if column_kwargs is None else column_kwargs
+        results = {}
 
-    def _print_feature_importances(self, feature_importances_, energy_type: EnergyType):
-        feature_names = config.feature_set[energy_type]
-        print("μ --> {0}: {1}, {2}: {3}, {4}: {5}".format(feature_names[0].value, feature_importances_[0][0],
-                                                          feature_names[1].value, feature_importances_[0][1],
-                                                          feature_names[2].value, feature_importances_[0][2]))
-        print("σ --> {0}: {1}, {2}: {3}, {4}: {5}".format(feature_names[0].value, feature_importances_[1][0],
-                                                          feature_names[1].value, feature_importances_[1][1],
-                                                          feature_names[2].value, feature_importances_[1][2]))
+        if n_jobs == 1:
+            for i, (col_name, region_name, energy_type) in enumerate(columns):
+                logger.info("Processing \"%s\" (%s/%s)", col_name, i + 1, len(columns))
+                logger.info("Create Trainings data for region: %s with energy type: %s", region_name, energy_type)
+                with telemetry.stage("training_data", col_name):
+                    Y, X_pred = self.data.get_feature_matrix(col_name)
+                result = run_fit_function(fit_function, col_name, X_pred, Y, features=feature_names(energy_type),
+                                          **column_kwargs.get(col_name, {}), **kwargs)
+                results[col_name] = result
+                self._report_column(col_name, result, Y, energy_type)
+            return results
+
+        handle = self.data.export_shared() if shared_memory else None
+        try:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                futures = {}
+                for col_name, region_name, energy_type in columns:
+                    Y, X_pred = self.data.get_feature_matrix(col_name)
+                    if handle is None:
+                        future = pool.submit(run_fit_function, fit_function, col_name, X_pred, Y,
+                                             features=feature_names(energy_type), **column_kwargs.get(col_name, {}),
+                                             **kwargs)
+                    else:
+                        future = pool.submit(fit_shared_column, handle, fit_function, col_name,
+                                             features=feature_names(energy_type), **column_kwargs.get(col_name, {}),
+                                             **kwargs)
+                    futures[future] = (col_name, energy_type, Y)
+
+                for i, future in enumerate(as_completed(futures)):
+                    col_name, energy_type, Y = futures[future]
+                    logger.info("Finished \"%s\" (%s/%s)", col_name, i + 1, len(columns))
+                    results[col_name] = future.result()
+                    self._report_column(col_name, results[col_name], Y, energy_type)
+        finally:
+            # The exported files of this run are removed once all workers are finished
+            if handle is not None:
+                handle.cleanup()
+        return results
+
+    def _report_column(self, col_name: str, result: dict, Y_true, energy_type: EnergyType):
+        """
+        Logs the feature importances and scores of a trained column and adds them to the telemetry.
 
-    def _calculate_scores(self, Y_true, Y_pred, q, Y_dists=None, clipped=False):
+        :param col_name: column name of the capfacts .csv file
+        :param result: result of the fit function of the column
+        :param Y_true: Ground truth of the prediction
+        :param energy_type: energy type of the column
         """
-        Calculates and prints the scores of the predictions
+        if result.get("rows") is not None:
+            Y_true = Y_true[result["rows"]]
+        if result.get("feature_importances") is not None:
+            self._print_feature_importances(result["feature_importances"], feature_names(energy_type))
+        if result.get("n_iterations") is not None:
+            logger.info("Boosting iterations used: %s", result["n_iterations"])
+        telemetry.merge(col_name, result.pop("telemetry", None))
+        scores = self._calculate_scores(Y_true, result["loc"], result["scale"], False)
+        telemetry.record(col_name, n_iterations=result.get("n_iterations"), **scores)
+        logger.info("------------------------------------------------------------------")
+
+    def _save_results(self, results: dict) -> ForecastResult:
+        """
+        Merges the predicted distributions of all columns, in the column order of the capacity factors, and saves
+        them. The quantiles are derived from the distributions and saved in the output format defined in the config.
+
+        :param results: Dictionary of the column names and the results of the fit function
+        :return: the merged predicted distributions, None if no column was predicted
+        """
+        if not results:
+            logger.warning("No column was predicted, nothing is saved")
+            return None
+
+        with telemetry.stage("save_results"):
+            columns = {}
+            for col_name in self.data.capfacts.columns.values[1:]:
+                if col_name in results:
+                    columns[col_name] = (results[col_name]["loc"], results[col_name]["scale"])
+            forecast_result = ForecastResult.from_columns(self.data.capfacts["snapshot"].values, columns)
+            forecast_result.save()
+
+            iterations = {col_name: result["n_iterations"] for col_name, result in results.items()
+                          if result.get("n_iterations") is not None}
+            if iterations:
+                iterations = pd.Series(iterations, name="n_iterations").rename_axis("column")
+                iterations.to_csv(config.paths["iterations"])
+                logger.info("Saved the used boosting iterations to: %s", config.paths["iterations"])
+
+            get_output_backend().save(forecast_result, self.quantiles)
+        telemetry.save()
+        return forecast_result
+
+    def _print_feature_importances(self, feature_importances_, features: list):
+        """
+        Logs the feature importances of the location and the scale of a model.
+
+        :param feature_importances_: feature importances of the model with one row per distribution parameter
+        :param features: names of the features of the model
+        """
+        logger.info("μ --> %s", dict(zip(features, feature_importances_[0])))
+        logger.info("σ --> %s", dict(zip(features, feature_importances_[1])))
+
+    def _calculate_scores(self, Y_true, loc, scale, clipped=False):
+        """
+        Calculates and logs the scores of the predictions of a column for all quantiles at once
 
         :param Y_true: Ground truth of the prediction
-        :param Y_pred: Predicted values
-        :param q: quantil
-        :param Y_dists: Predicted distribution. NLL ist calculated if this is not None
-        :param clipped: True if Y_pred is clipped, false otherwise
+        :param loc: Location of the predicted normal distributions
+        :param scale: Scale of the predicted normal distributions
+        :param clipped: True to score the clipped quantiles, false otherwise
+        :return: Dictionary with the scores of all quantiles
         """
-        scores = {}
-        if not clipped:
+        Y_pred = np.stack([normal_quantile(loc, scale, q) for q in self.quantiles], axis=-1)
+        if clipped:
+            Y_pred = Y_pred.clip(config.clip_lower, config.clip_upper)
+        batch = batch_scores(np.reshape(Y_true, (-1, 1)), Y_pred[:, np.newaxis, :], self.quantiles,
+                             np.reshape(loc, (-1, 1)), np.reshape(scale, (-1, 1)))
+
+        suffix = " clipped" if clipped else ""
+        all_scores = {}
+        for i, q in enumerate(self.quantiles):
+            scores = {}
             if q == 0.5:
-                scores["RMSE"] = root_mean_squared_error(Y_true, Y_pred)
-                scores["MAE"] = mean_absolute_error(Y_true, Y_pred)
+                scores["RMSE" + suffix] = batch["rmse"][0, i]
+                scores["MAE" + suffix] = batch["mae"][0, i]
             else:
-                s = "PL " + str(q)
-                scores[s] = pinball_loss(Y_true, Y_pred, q)
-            if Y_dists is not None:
-                scores["NLL"] = negative_log_likelihood(Y_true, Y_dists)
-        else:
+                scores["PL " + str(q) + suffix] = batch["pinball"][0, i]
+            if not clipped:
+                scores["NLL"] = batch["nll"][0]
+                scores["CRPS"] = batch["crps"][0]
+            logger.info("Scores for q = %s %s", q, scores)
+            all_scores.update(scores)
+        return all_scores
+
+    def score(self, forecast_result: ForecastResult = None, clipped=False) -> pd.DataFrame:
+        """
+        Calculates the scores of all columns and quantiles in one pass and saves them as .csv file.
+
+        :param forecast_result: Predicted distributions. If not defined, the saved distributions are loaded.
+        :param clipped: True to score the clipped quantiles, false otherwise
+        :return: DataFrame with one row per column and one column per metric
+        """
+        if forecast_result is None:
+            forecast_result = ForecastResult.open()
+
+        columns = forecast_result.dataset["column"].values
+        Y_true = self.data.capfacts[columns].values
+        Y_pred = forecast_result.quantile(self.quantiles, clipped).transpose("snapshot", "column", "quantile").values
+        loc = forecast_result.dataset["loc"].transpose("snapshot", "column").values
+        scale = forecast_result.dataset["scale"].transpose("snapshot", "column").values
+        batch = batch_scores(Y_true, Y_pred, self.quantiles, loc, scale)
+
+        scores = {}
+        for i, q in enumerate(self.quantiles):
+            scores["PL " + str(q)] = batch["pinball"][:, i]
             if q == 0.5:
-                scores["RMSE clipped"] = root_mean_squared_error(Y_true, Y_pred)
-                scores["MAE clipped"] = mean_absolute_error(Y_true, Y_pred)
-            else:
-                s = "PL " + str(q) + " clipped"
-                scores[s] = pinball_loss(Y_true, Y_pred, q)
-        print("Scores for q =", q, scores)
+                scores["RMSE"] = batch["rmse"][:, i]
+                scores["MAE"] = batch["mae"][:, i]
+        for i, (q_low, q_high) in enumerate(batch["coverage_pairs"]):
+            scores["Coverage " + str(q_low) + "-" + str(q_high)] = batch["coverage"][:, i]
+        scores["NLL"] = batch["nll"]
+        scores["CRPS"] = batch["crps"]
+        scores = pd.DataFrame(scores, index=pd.Index(columns, name="column"))
+
+        output_file = Path(config.paths["scores"])
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        scores.to_csv(output_file)
+        logger.info("Saved the scores to: %s", output_file)
+        return scores
 
     def _clip_and_save(self, result, q):
         """
-        Clips saves the prediction results
+        Saves the raw and the clipped prediction results of a single quantile as .csv files. The given DataFrame is not
+        changed.
 
         :param result: prediction results for a single quantil
-        :param quantil: quantil for the file name
+        :param q: quantil for the file name
         """
-        output_dir = Path(config.result_path)
-        output_dir.mkdir(parents=True, exist_ok=True)
-
-        output_file = "capfacts_pred_q" + str(int(q * 100)) + ".csv"
-        result.to_csv(output_dir / output_file)
-        print("Finished regression for q = ", q, ". Saved results to: ", output_dir / output_file)
+        CsvBackend().save_frame(result, q)
 
-        cols_num = result.select_dtypes(np.number).columns
-        result[cols_num] = result[cols_num].clip(lower=0, upper=1.02)
-
-        output_file = "capfacts_pred_q" + str(int(q * 100)) + "_clipped.csv"
-        result.to_csv(output_dir / output_file)
-        print("Finished regression for q = ", q, ". Saved the clipped results to: ", output_dir / output_file)
-
-    def forecast_regression_grid_search(self, param_grid: dict, test_size=0.25, random_state=42, n_jobs=4, cv=5):
+    def forecast_regression_grid_search(self, param_grid: dict, test_size=0.25, random_state=42, n_jobs=4, cv=5,
+                                        n_column_jobs=1, use_model_store=True, split_method=config.split_method,
+                                        block_length=config.block_length):
         """
         The function makes a regression with NGBoost. A separate model is trained for each region and energy source.
         The data is split into training and test data. The training is terminated prematurely if the score on the test
-        data does not improve anymore.The quantile predictions are saved as .csv files.
+        data does not improve anymore. The quantile predictions are saved in the output format defined in the config.
         The best hyperparameters of the regression are determined from the given parameter grid using a GridSearch
         cross-validation.
 
@@ -155,56 +510,488 @@ class Forecast:
         :param random_state: Random state to allow comparability of results
         :param cv: n-fold cross-validation
         :param n_jobs: number of parallel jobs used for fitting the grid search
+        :param n_column_jobs: Number of processes that train the models of the columns in parallel
+        :param use_model_store: True to reuse stored models whose inputs have not changed and to store refitted models
+        :param split_method: Split into training and validation data: "random", "blocked" or "rolling"
+        :param block_length: Number of hours of a block of the blocked split
         """
 
-        results = {}
-        new_columns = {}  # Helper to avoid fragmentation of the result Dataframe
-        for q in self.quantiles:
-            results[q] = pd.DataFrame()
-            results[q]["snapshot"] = self.data.capfacts["snapshot"]
-            new_columns[q] = {}
+        model_store = ModelStore() if use_model_store else None
+        results = self._forecast_columns(fit_column_grid_search, n_column_jobs, param_grid=param_grid,
+                                         test_size=test_size, random_state=random_state, search_jobs=n_jobs, cv=cv,
+                                         model_store=model_store, split_method=split_method,
+                                         block_length=block_length)
+        self._save_results(results)
 
-        capfacts_cols = self.data.capfacts.columns.values[1:]
+    def forecast_regression_halving_search(self, param_grid: dict, test_size=0.25, random_state=42, eta=3, n_jobs=1,
+                                           use_model_store=True, split_method=config.split_method,
+                                           block_length=config.block_length):
+        """
+        The function makes a regression with NGBoost. A separate model is trained for each region and energy source.
+        The hyperparameters are determined with successive halving over the parameter grid, using n_estimators as
+        budget. They are tuned on the first column of each energy type and shared with the other columns of that
+        energy type. The model of the tuned column is reused instead of refitted.
+        The quantile predictions are saved in the output format defined in the config.
 
-        i = 1
-        for col_name in capfacts_cols:
-            print("Processing \"", col_name, "\" (", i, "/", len(capfacts_cols), ")")
-            i += 1
+        :param param_grid: Dictionary of hyperparameters
+        :param test_size: Ratio between training and test data
+        :param random_state: Random state to allow comparability of results
+        :param eta: Reduction factor of the configurations and growth factor of the budget per round
+        :param n_jobs: Number of processes that train the models of the columns in parallel
+        :param use_model_store: True to reuse stored models whose inputs have not changed and to store refitted models
+        :param split_method: Split into training and validation data: "random", "blocked" or "rolling"
+        :param block_length: Number of hours of a block of the blocked split
+        """
+        model_store = ModelStore() if use_model_store else None
+
+        tuned_columns = {}
+        for col_name, region_name, energy_type in self._training_columns():
+            tuned_columns.setdefault(energy_type, col_name)
+
+        logger.info("Tune hyperparameters on the columns: %s", list(tuned_columns.values()))
+        results = self._forecast_columns(fit_column_halving, n_jobs, column_names=set(tuned_columns.values()),
+                                         param_grid=param_grid, test_size=test_size, random_state=random_state,
+                                         eta=eta, model_store=model_store, split_method=split_method,
+                                         block_length=block_length)
+
+        column_kwargs = {}
+        for col_name, region_name, energy_type in self._training_columns():
+            if col_name not in results:
+                column_kwargs[col_name] = {"params": results[tuned_columns[energy_type]]["params"]}
+        results.update(self._forecast_columns(fit_column_halving, n_jobs, column_kwargs,
+                                              column_names=set(column_kwargs), param_grid=param_grid,
+                                              test_size=test_size, random_state=random_state, eta=eta,
+                                              model_store=model_store, split_method=split_method,
+                                              block_length=block_length))
+        self._save_results(results)
+
+
+def feature_names(energy_type: EnergyType) -> list:
+    """
+    Returns the names of the features that are used for the given energy type.
 
-            region_name, energy_type = self.data.parse_capfac_col(col_name)
+    :param energy_type: energy type of the column
+    :return: list of the feature names
+    """
+    return [feature.value for feature in config.feature_set[energy_type]]
 
-            if (energy_type == EnergyType.NOT_DEFINED) or (energy_type == EnergyType.ROR):
-                print("Skipped column: ", col_name)
-                print("------------------------------------------------------------------\n")
-            else:
-                print("Create Trainings data for region: ", region_name, " with energy type: ", energy_type)
-
-                Y, X = self.data.get_training_data(col_name)
-                X_pred = self.data.shape_multi_feature_data(X)
-                X_train, X_test, Y_train, Y_test = train_test_split(X_pred, Y, test_size=test_size,
-                                                                    random_state=random_state)
-
-                print("Determine best Parameters with GridSearchCV for region ", region_name)
-                ngb = NGBRegressor(Dist=Normal, Score=LogScore, random_state=42, verbose=False)
-                grid_search = GridSearchCV(ngb, param_grid=param_grid, n_jobs=n_jobs, cv=cv)
-                grid_search.fit(X_train, Y_train)
-
-                # cv_result = pd.DataFrame(grid_search.cv_results_)
-                # print(cv_result)
-                ngb_best = NGBRegressor(Dist=Normal, Score=LogScore, random_state=42, verbose=False,
-                                        **grid_search.best_params_)
-                print("Best estimator:", ngb_best)
-                ngb_best.fit(X_train, Y_train)
-
-                print("Predict capacity factors for region ", region_name, "with quantiles: ", self.quantiles)
-                Y_dists = ngb_best.pred_dist(X_pred)
-
-                for q in self.quantiles:
-                    Y_pred = Y_dists.ppf(q)
-                    new_columns[q][col_name] = pd.Series(Y_pred)
-                print("------------------------------------------------------------------\n")
-
-        for q in self.quantiles:
-            new_columns[q] = pd.DataFrame(new_columns[q], index=results[q].index)
-            results[q] = pd.concat([results[q], new_columns[q]], axis=1)
-            self._clip_and_save(results[q], q)
+
+def global_feature_names(energy_type: EnergyType) -> list:
+    """
+    Returns the names of the features of the global model of an energy type. The region enters the model only through
+    its static attributes, not as ordinal code, so the model does not depend on the order of the columns.
+
+    :param energy_type: the energy type
+    :return: list of the feature names
+    """
+    names = feature_names(energy_type) + ["lon", "lat"]
+    if Feature.HEIGHT not in config.feature_set[energy_type]:
+        names.append("mean_height")
+    return names
+
+
+def global_static_features(data: ForecastData, region_name: str, energy_type: EnergyType,
+                           centroids: pd.DataFrame) -> np.ndarray:
+    """
+    Returns the static attributes of a region that the global model of its energy type uses in addition to the
+    features of the column, see global_feature_names.
+
+    :param data: input data of the forecast
+    :param region_name: name of the region
+    :param energy_type: energy type of the column
+    :param centroids: centroids of the regions, see DaytimeChecker.get_centroids
+    :return: array of the static attributes
+    """
+    era5_region_name = get_era5_region_name(region_name, energy_type)
+    static = [centroids.loc[era5_region_name, "lon"], centroids.loc[era5_region_name, "lat"]]
+    if Feature.HEIGHT not in config.feature_set[energy_type]:
+        static.append(data.feature_store.get_feature(era5_region_name, Feature.HEIGHT).mean())
+    return np.asarray(static, dtype=np.float32)
+
+
+def global_column_name(energy_type: EnergyType) -> str:
+    """
+    Returns the name under which the global model of an energy type is stored.
+
+    :param energy_type: the energy type
+    :return: name of the global model
+    """
+    return "global " + energy_type.value
+
+
+def distribution_result(loc: np.ndarray, scale: np.ndarray, feature_importances=None) -> dict:
+    """
+    Returns the result of a column. Only the location and scale of the predicted normal distributions are kept, the
+    quantiles are derived from them when needed.
+
+    :param loc: location of the predicted distributions
+    :param scale: scale of the predicted distributions
+    :param feature_importances: Optional feature importances of the model
+    :return: Dictionary with the feature importances and the loc and scale arrays
+    """
+    return {
+        "feature_importances": feature_importances,
+        "loc": loc,
+        "scale": scale
+    }
+
+
+def predict_column(ngb: "NGBRegressor", X_pred: np.ndarray, max_iter=None, day_mask=None) -> (np.ndarray, np.ndarray):
+    """
+    Predicts the distributions of a column. If a daytime mask is given, the model is only evaluated for the daytime
+    snapshots and a degenerate distribution at zero (loc = scale = 0) is used at night.
+
+    :param ngb: fitted model
+    :param X_pred: features of the column with shape (n_samples, n_features)
+    :param max_iter: Optional number of boosting iterations that are used
+    :param day_mask: Optional boolean array that is True for the daytime snapshots
+    :return: Tuple of the loc and scale arrays
+    """
+    if day_mask is None:
+        Y_dists = ngb.pred_dist(X_pred, max_iter=max_iter)
+        return np.asarray(Y_dists.params["loc"]), np.asarray(Y_dists.params["scale"])
+
+    loc = np.zeros(X_pred.shape[0])
+    scale = np.zeros(X_pred.shape[0])
+    if day_mask.any():
+        Y_dists = ngb.pred_dist(X_pred[day_mask], max_iter=max_iter)
+        loc[day_mask] = Y_dists.params["loc"]
+        scale[day_mask] = Y_dists.params["scale"]
+    return loc, scale
+
+
+def fit_shared_column(handle: SharedDataHandle, fit_function, col_name: str, **kwargs) -> dict:
+    """
+    Attaches to the memory-mapped data of the handle and fits the model of a single column. Defined on module level,
+    so it can run in a process pool.
+
+    :param handle: handle of the exported features and capacity factors
+    :param fit_function: Module level function that fits the model of a column, see fit_column
+    :param col_name: column name of the capfacts .csv file
+    :param kwargs: Additional arguments of the fit function
+    :return: the result of the fit function
+    """
+    Y, X_pred = handle.attach().get_feature_matrix(col_name)
+    return run_fit_function(fit_function, col_name, X_pred, Y, **kwargs)
+
+
+def run_fit_function(fit_function, col_name: str, X_pred: np.ndarray, Y: np.ndarray, **kwargs) -> dict:
+    """
+    Runs the fit function of a column as telemetry stage. The telemetry of the column is returned with the result, so
+    it reaches the main process if the column is fitted in a worker process.
+
+    :param fit_function: Module level function that fits the model of a column, see fit_column
+    :param col_name: column name of the capfacts .csv file
+    :param X_pred: features of the column with shape (n_samples, n_features)
+    :param Y: capacity factors of the column
+    :param kwargs: Additional arguments of the fit function
+    :return: the result of the fit function with the telemetry of the column
+    """
+    with telemetry.stage(fit_function.__name__, col_name):
+        result = fit_function(col_name, X_pred, Y, **kwargs)
+    result["telemetry"] = telemetry.pop_column(col_name)
+    return result
+
+
+def fit_column(col_name: str, X_pred: np.ndarray, Y: np.ndarray, features: list, test_size=0.25, random_state=42,
+               model_store: ModelStore = None, day_mask=None, split_method=config.split_method,
+               block_length=config.block_length, early_stopping_rounds=config.early_stopping_rounds,
+               early_stopping_tol=config.early_stopping_tol, base_learner=config.base_learner, n_time=None) -> dict:
+    """
+    Trains the NGBoost model of a single column and predicts the distributions. The training is terminated prematurely if
+    the score on the test data does not improve anymore. Defined on module level, so it can run in a process pool.
+
+    :param col_name: column name of the capfacts .csv file
+    :param X_pred: features of the column with shape (n_samples, n_features)
+    :param Y: capacity factors of the column
+    :param features: names of the features
+    :param test_size: Ratio between training and test data
+    :param random_state: Random state to allow comparability of results
+    :param model_store: Optional store of the fitted models. A stored model is reused if its inputs have not changed.
+    :param day_mask: Optional boolean array that is True for the daytime snapshots. The model is only trained on these
+        snapshots and predicts a capacity factor of zero at night.
+    :param split_method: Split into training and validation data: "random", "blocked" or "rolling"
+    :param block_length: Number of hours of a block of the blocked split. With a day mask the blocks are built on the
+        hours of the full series, so a block covers block_length hours and not block_length daytime hours.
+    :param early_stopping_rounds: Number of iterations without improvement before the training is terminated
+    :param early_stopping_tol: Minimum decrease of the validation loss that counts as improvement
+    :param base_learner: Base learner of NGBoost: "tree" or "hist"
+    :param n_time: Optional number of hours of the series if X_pred and Y stack the samples of several regions. The
+        split is built on the hour of the series, see split_train_validation.
+    :return: Dictionary with the feature importances, the loc and scale of the predicted distributions and the number
+        of boosting iterations that are used
+    """
+    from ngboost import NGBRegressor
+    from ngboost.distns import Normal
+    from ngboost.scores import LogScore
+    from src.hyperparameter_search import staged_validation_loss
+    from src.hist_tree import create_base_learner, bin_features
+
+    X_fit, Y_fit = (X_pred, Y) if day_mask is None else (X_pred[day_mask], Y[day_mask])
+
+    params = dict(Dist=Normal, Score=LogScore, n_estimators=1000, random_state=42)
+    key = ModelStore.model_key(col_name, features, dict(params, test_size=test_size, split_random_state=random_state,
+                                                        split_method=split_method, block_length=block_length,
+                                                        early_stopping_rounds=early_stopping_rounds,
+                                                        early_stopping_tol=early_stopping_tol,
+                                                        base_learner=base_learner, max_bins=config.hist_max_bins,
+                                                        n_time=n_time),
+                               X_fit, Y_fit)
+    entry = None if model_store is None else model_store.load(col_name, key)
+
+    if entry is not None:
+        logger.info("Loaded stored model for column %s", col_name)
+        ngb, best_val_loss_itr = entry["model"], entry["best_val_loss_itr"]
+    else:
+        positions = None if day_mask is None else np.flatnonzero(day_mask)
+        X_train, X_test, Y_train, Y_test = split_train_validation(X_fit, Y_fit, test_size, split_method, block_length,
+                                                                  random_state, positions, n_time)
+
+        logger.info("Fit Regression Model for column %s", col_name)
+        # The bins of the histogram-based tree are computed once from all features of the column
+        base = create_base_learner(base_learner, X_fit, max_bins=config.hist_max_bins,
+                                   random_state=params["random_state"])
+        # The features are binned once for all trees, the fitted trees predict the raw features as well
+        X_train, X_test = bin_features(base, X_train, X_test)
+        ngb = NGBRegressor(Base=base, verbose=logger.isEnabledFor(logging.DEBUG), **params)
+        with telemetry.stage("fit", col_name):
+            ngb.fit(X=X_train, Y=Y_train, X_val=X_test, Y_val=Y_test, early_stopping_rounds=early_stopping_rounds)
+        best_val_loss_itr = ngb.best_val_loss_itr
+        telemetry.record(col_name, best_val_loss_itr=best_val_loss_itr)
+        if early_stopping_tol > 0:
+            best_val_loss_itr = best_iteration(staged_validation_loss(ngb, X_test, Y_test), early_stopping_rounds,
+                                               early_stopping_tol)
+        if model_store is not None:
+            val_loss = -ngb.pred_dist(X_test, max_iter=best_val_loss_itr).logpdf(Y_test).mean()
+            model_store.save(col_name, key, ngb, best_val_loss_itr, features, prune_night=day_mask is not None,
+                             val_loss=val_loss)
+
+    logger.info("Predict distributions of the capacity factors for column %s", col_name)
+    with telemetry.stage("predict", col_name):
+        loc, scale = predict_column(ngb, X_pred, best_val_loss_itr, day_mask)
+    result = distribution_result(loc, scale, ngb.feature_importances_)
+    result["n_iterations"] = len(ngb.base_models) if best_val_loss_itr is None else best_val_loss_itr
+    return result
+
+
+def update_column(col_name: str, X_pred: np.ndarray, Y: np.ndarray, features: list, new_mask: np.ndarray,
+                  model_store: ModelStore, n_estimators=100, drift_threshold=0.5, test_size=0.25, random_state=42,
+                  day_mask=None, prune_night=False) -> dict:
+    """
+    Updates the NGBoost model of a single column with new snapshots and predicts the distributions of the new
+    snapshots. The stored model is boosted further on the new snapshots, the last ones are used as validation data for
+    early stopping. If the NLL of the stored model on the new snapshots exceeds the validation NLL of its last fit by
+    more than the drift threshold, or if there is no stored model, the model is refitted on the full history instead.
+    The boosted model is stored under a key derived from the key of the stored model. It differs from the key of a
+    fit on the full history, so fit_column refits the column instead of reusing the updated model.
+    Defined on module level, so it can run in a process pool.
+
+    :param col_name: column name of the capfacts .csv file
+    :param X_pred: features of the column with shape (n_samples, n_features)
+    :param Y: capacity factors of the column
+    :param features: names of the features
+    :param new_mask: boolean array that is True for the new snapshots
+    :param model_store: store of the fitted models
+    :param n_estimators: Maximum number of additional boosting iterations
+    :param drift_threshold: Increase of the NLL above which the column is refitted
+    :param test_size: Ratio between training and test data
+    :param random_state: Random state to allow comparability of results
+    :param day_mask: Optional boolean array that is True for the daytime snapshots. It is used if the stored model was
+        trained on daytime hours only, or for the refit of a column without stored model if prune_night is True.
+    :param prune_night: True to refit a column without stored model on daytime hours only
+    :return: Dictionary with the loc and scale of the predicted distributions of the new snapshots
+    """
+    from src.hyperparameter_search import staged_validation_loss
+
+    entry = model_store.load(col_name)
+    if entry is None or entry["features"] != features:
+        logger.info("No stored model for column %s, refit on the full history", col_name)
+        result = fit_column(col_name, X_pred, Y, features, test_size, random_state, model_store,
+                            day_mask if prune_night else None)
+        return _new_rows_result(result, new_mask)
+
+    day_mask = day_mask if entry.get("prune_night", False) else None
+    ngb, best_val_loss_itr = entry["model"], entry["best_val_loss_itr"]
+    fit_mask = new_mask if day_mask is None else new_mask & day_mask
+    X_new, Y_new = X_pred[fit_mask], Y[fit_mask]
+
+    if X_new.shape[0] > 0 and entry.get("val_loss") is not None:
+        drift = -ngb.pred_dist(X_new, max_iter=best_val_loss_itr).logpdf(Y_new).mean() - entry["val_loss"]
+        logger.info("NLL drift of column %s: %s", col_name, drift)
+        if drift > drift_threshold:
+            logger.info("Drift above threshold, refit column %s on the full history", col_name)
+            result = fit_column(col_name, X_pred, Y, features, test_size, random_state, model_store, day_mask)
+            return _new_rows_result(result, new_mask)
+
+    if X_new.shape[0] > 1:
+        # Drop the iterations after the best validation loss, so the boosting continues from the used model
+        if best_val_loss_itr is not None:
+            ngb.base_models = ngb.base_models[:best_val_loss_itr]
+            ngb.scalings = ngb.scalings[:best_val_loss_itr]
+            ngb.col_idxs = ngb.col_idxs[:best_val_loss_itr]
+        n_stored = len(ngb.base_models)
+
+        X_train, X_test, Y_train, Y_test = split_train_validation(X_new, Y_new, test_size, "rolling")
+        logger.info("Continue boosting of column %s on %s new snapshots", col_name, X_new.shape[0])
+        ngb.n_estimators = n_estimators
+        ngb.partial_fit(X=X_train, Y=Y_train, X_val=X_test, Y_val=Y_test,
+                        early_stopping_rounds=config.early_stopping_rounds)
+        # The losses from the stored model on, or from the first iteration if no iteration of it was used
+        first = max(n_stored - 1, 0)
+        losses = staged_validation_loss(ngb, X_test, Y_test)[first:]
+        best_val_loss_itr = first + 1 + int(np.argmin(losses))
+        key = ModelStore.model_key(col_name, features, dict(entry_key=entry["key"], updated=True), X_pred, Y)
+        model_store.save(col_name, key, ngb, best_val_loss_itr, features, prune_night=day_mask is not None,
+                         val_loss=losses.min())
+
+    logger.info("Predict distributions of the capacity factors for the new snapshots of column %s", col_name)
+    loc, scale = predict_column(ngb, X_pred[new_mask], best_val_loss_itr,
+                                None if day_mask is None else day_mask[new_mask])
+    result = distribution_result(loc, scale, ngb.feature_importances_)
+    result["n_iterations"] = best_val_loss_itr
+    result["rows"] = new_mask
+    return result
+
+
+def _new_rows_result(result: dict, new_mask: np.ndarray) -> dict:
+    """
+    Helper function that keeps only the predictions of the new snapshots of a column result.
+
+    :param result: result of the fit function over all snapshots
+    :param new_mask: boolean array that is True for the new snapshots
+    :return: the result of the new snapshots
+    """
+    return dict(result, loc=result["loc"][new_mask], scale=result["scale"][new_mask], rows=new_mask)
+
+
+def fit_column_grid_search(col_name: str, X_pred: np.ndarray, Y: np.ndarray, features: list, param_grid: dict,
+                           test_size=0.25, random_state=42, search_jobs=4, cv=5, model_store: ModelStore = None,
+                           split_method=config.split_method, block_length=config.block_length) -> dict:
+    """
+    Determines the best hyperparameters of a single column with a GridSearch cross-validation, trains the NGBoost
+    model and predicts the distributions. Defined on module level, so it can run in a process pool.
+
+    :param col_name: column name of the capfacts .csv file
+    :param X_pred: features of the column with shape (n_samples, n_features)
+    :param Y: capacity factors of the column
+    :param features: names of the features
+    :param param_grid: Dictionary of hyperparameters
+    :param test_size: Ratio between training and test data
+    :param random_state: Random state to allow comparability of results
+    :param search_jobs: number of parallel jobs used for fitting the grid search. It is not called n_jobs, so it
+        does not clash with the number of processes of the columns in Forecast._forecast_columns.
+    :param cv: n-fold cross-validation
+    :param model_store: Optional store of the fitted models. A stored model is reused if its inputs have not changed.
+    :param split_method: Split into training and validation data: "random", "blocked" or "rolling"
+    :param block_length: Number of hours of a block of the blocked split
+    :return: Dictionary with the loc and scale of the predicted distributions
+    """
+    from ngboost import NGBRegressor
+    from ngboost.distns import Normal
+    from ngboost.scores import LogScore
+    from sklearn.model_selection import GridSearchCV
+    from src.hist_tree import with_bin_mapper
+
+    key = ModelStore.model_key(col_name, features, dict(param_grid=sorted(param_grid.items()), test_size=test_size,
+                                                        split_random_state=random_state, cv=cv,
+                                                        split_method=split_method,
+                                                        block_length=block_length), X_pred, Y)
+    entry = None if model_store is None else model_store.load(col_name, key)
+
+    if entry is not None:
+        logger.info("Loaded stored model for column %s", col_name)
+        ngb_best = entry["model"]
+    else:
+        X_train, X_test, Y_train, Y_test = split_train_validation(X_pred, Y, test_size, split_method, block_length,
+                                                                  random_state)
+
+        logger.info("Determine best Parameters with GridSearchCV for column %s", col_name)
+        if "Base" in param_grid:
+            # The bin edges of the histogram-based trees are computed once per column
+            param_grid = dict(param_grid, Base=[with_bin_mapper(base, X_pred) for base in param_grid["Base"]])
+        ngb = NGBRegressor(Dist=Normal, Score=LogScore, random_state=42, verbose=False)
+        grid_search = GridSearchCV(ngb, param_grid=param_grid, n_jobs=search_jobs, cv=cv)
+        grid_search.fit(X_train, Y_train)
+
+        # cv_result = pd.DataFrame(grid_search.cv_results_)
+        # print(cv_result)
+        ngb_best = NGBRegressor(Dist=Normal, Score=LogScore, random_state=42, verbose=False,
+                                **grid_search.best_params_)
+        logger.info("Best estimator: %s", ngb_best)
+        ngb_best.fit(X_train, Y_train)
+        if model_store is not None:
+            model_store.save(col_name, key, ngb_best, None, features)
+
+    logger.info("Predict distributions of the capacity factors for column %s", col_name)
+    loc, scale = predict_column(ngb_best, X_pred)
+    return distribution_result(loc, scale)
+
+
+def fit_column_halving(col_name: str, X_pred: np.ndarray, Y: np.ndarray, features: list, param_grid: dict,
+                       test_size=0.25, random_state=42, eta=3, params=None, model_store: ModelStore = None,
+                       split_method=config.split_method, block_length=config.block_length) -> dict:
+    """
+    Trains the NGBoost model of a single column and predicts the distributions. If no parameters are given, they are
+    determined with successive halving over the parameter grid and the best model of the search is used. Otherwise
+    the model is trained with the given parameters. Defined on module level, so it can run in a process pool.
+
+    :param col_name: column name of the capfacts .csv file
+    :param X_pred: features of the column with shape (n_samples, n_features)
+    :param Y: capacity factors of the column
+    :param features: names of the features
+    :param param_grid: Dictionary of hyperparameters
+    :param test_size: Ratio between training and test data
+    :param random_state: Random state to allow comparability of results
+    :param eta: Reduction factor of the configurations and growth factor of the budget per round
+    :param params: Optional hyperparameters that were tuned on another column
+    :param model_store: Optional store of the fitted models. A stored model is reused if its inputs have not changed.
+    :param split_method: Split into training and validation data: "random", "blocked" or "rolling"
+    :param block_length: Number of hours of a block of the blocked split
+    :return: Dictionary with the loc and scale of the predicted distributions and the used hyperparameters
+    """
+    from ngboost import NGBRegressor
+    from ngboost.distns import Normal
+    from ngboost.scores import LogScore
+    from src.hyperparameter_search import successive_halving
+    from src.hist_tree import with_bin_mapper, without_bin_mapper
+
+    search = sorted(param_grid.items()) if params is None else sorted(params.items())
+    key = ModelStore.model_key(col_name, features, dict(search=search, eta=eta, test_size=test_size,
+                                                        split_random_state=random_state,
+                                                        split_method=split_method,
+                                                        block_length=block_length), X_pred, Y)
+    entry = None if model_store is None else model_store.load(col_name, key)
+
+    if entry is not None:
+        logger.info("Loaded stored model for column %s", col_name)
+        ngb, best_val_loss_itr, params = entry["model"], entry["best_val_loss_itr"], entry["params"]
+    else:
+        X_train, X_test, Y_train, Y_test = split_train_validation(X_pred, Y, test_size, split_method, block_length,
+                                                                  random_state)
+        if params is None:
+            logger.info("Determine best Parameters with successive halving for column %s", col_name)
+            if "Base" in param_grid:
+                # The bin edges of the histogram-based trees are computed once per column
+                param_grid = dict(param_grid, Base=[with_bin_mapper(base, X_pred) for base in param_grid["Base"]])
+            ngb, params, best_val_loss_itr, val_loss = successive_halving(X_train, Y_train, X_test, Y_test,
+                                                                          param_grid, eta, random_state=random_state)
+            logger.info("Best parameters: %s validation NLL: %s", params, val_loss)
+            if "Base" in params:
+                # The parameters are shared with the other columns, which compute their own bins
+                params["Base"] = without_bin_mapper(params["Base"])
+        else:
+            logger.info("Fit Regression Model with shared parameters for column %s", col_name)
+            fit_params = dict(params, Base=with_bin_mapper(params["Base"], X_pred)) if "Base" in params else params
+            ngb = NGBRegressor(Dist=Normal, Score=LogScore, random_state=random_state, verbose=False, **fit_params)
+            ngb.fit(X=X_train, Y=Y_train, X_val=X_test, Y_val=Y_test,
+                    early_stopping_rounds=config.early_stopping_rounds)
+            best_val_loss_itr = ngb.best_val_loss_itr
+        if model_store is not None:
+            model_store.save(col_name, key, ngb, best_val_loss_itr, features, params=params)
+
+    logger.info("Predict distributions of the capacity factors for column %s", col_name)
+    loc, scale = predict_column(ngb, X_pred, best_val_loss_itr)
+    result = distribution_result(loc, scale)
+    result["params"] = params
+    result["n_iterations"] = best_val_loss_itr
+    return result
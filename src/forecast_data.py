@@ -1,10 +1,17 @@
 from src.era5_mapper import *
+from src.feature_store import FeatureStore
+from src._helper import hash_inputs, file_signature
+from src.telemetry import get_logger, telemetry
 
 import config
+import shutil
+import tempfile
 import pandas as pd
 import xarray as xr
 from pathlib import Path
 
+logger = get_logger(__name__)
+
 
 class ForecastData:
     """
@@ -17,7 +24,18 @@ class ForecastData:
         """
         self.era5 = None
         self.capfacts = None
-        self._open_input_data()
+        self.feature_store = None
+        self.column_info = {}
+        self.column_index = {}
+        self.country_index = {}
+        self.energy_type_index = {}
+        with telemetry.stage("load_input_data"):
+            self._open_input_data()
+        if self.era5 is not None:
+            with telemetry.stage("feature_store"):
+                self.feature_store = self._load_feature_store()
+        if self.capfacts is not None:
+            self._build_column_index()
 
     def _open_input_data(self):
         """
@@ -26,19 +44,104 @@ class ForecastData:
         era5_path = Path(config.paths["era5_regions"])
         capfacts = Path(config.paths["capfacs"])
 
-        if era5_path.is_file():
-            print(f'The file {config.paths["era5_regions"]} exists. Open data ...')
+        if era5_path.suffix == ".zarr" and era5_path.is_dir():
+            logger.info("The file %s exists. Open data ...", config.paths["era5_regions"])
+            self.era5 = xr.open_zarr(config.paths["era5_regions"])
+        elif era5_path.is_file():
+            logger.info("The file %s exists. Open data ...", config.paths["era5_regions"])
             self.era5 = xr.open_dataset(filename_or_obj=config.paths["era5_regions"], engine="netcdf4")
         else:
-            print(f'The file {config.paths["era5_regions"]} does not exist.')
-            print("Please use the create_era5_region() in the era5_mapper to create the file.")
+            logger.warning("The file %s does not exist.", config.paths["era5_regions"])
+            logger.warning("Please use the create_era5_region() in the era5_mapper to create the file.")
 
         if capfacts.is_file():
-            print(f'The file {config.paths["capfacs"]} exists. Open data ...')
-            self.capfacts = pd.read_csv(config.paths["capfacs"])
+            logger.info("The file %s exists. Open data ...", config.paths["capfacs"])
+            self.capfacts = load_capfacts(capfacts)
         else:
-            print(f'The file {config.paths["capfacs"]} does not exist.')
-            print("Please provide the necessary capacity factors.")
+            logger.warning("The file %s does not exist.", config.paths["capfacs"])
+            logger.warning("Please provide the necessary capacity factors.")
+
+    def _load_feature_store(self) -> FeatureStore:
+        """
+        Auxiliary function that loads all features of the config at once. The store is cached as memory-mapped file
+        and keyed by the path, size and modification time of the reduced era5 dataset and the features, so that a
+        changed input is loaded again without reading the whole dataset on every start.
+
+        :return: the feature store
+        """
+        era5_path = Path(config.paths["era5_regions"])
+        features = FeatureStore.feature_order()
+        if era5_path.is_file():
+            key = hash_inputs(values=[file_signature(era5_path), [feature.value for feature in features]])
+            cache_file = Path(config.paths["cache"]) / ("feature_store_" + key + ".npy")
+            if cache_file.is_file():
+                logger.info("Open cached features from %s", cache_file)
+                return FeatureStore.open(cache_file)
+
+            feature_store = FeatureStore.from_dataset(self.era5, features)
+            feature_store.save(cache_file)
+            logger.info("Saved features to %s", cache_file)
+            return FeatureStore.open(cache_file)
+
+        return FeatureStore.from_dataset(self.era5, features)
+
+    def export_shared(self, path=None) -> "SharedDataHandle":
+        """
+        Exports the features and capacity factors once to memory-mapped files. The returned handle is small and can be
+        passed to worker processes, which attach to the files without copying the data.
+        The files are written to a new directory per run, so concurrent runs don't overwrite each other's data. The
+        directory is removed with the cleanup() of the handle.
+
+        :param path: Parent directory of the exported files. If not defined, the cache directory of the config is used.
+        :return: handle of the exported data
+        """
+        path = Path(config.paths["cache"] if path is None else path)
+        path.mkdir(parents=True, exist_ok=True)
+        directory = Path(tempfile.mkdtemp(prefix="shared_", dir=path))
+
+        feature_path = self.feature_store.path
+        if feature_path is None:
+            feature_path = directory / "features.npy"
+            self.feature_store.save(feature_path)
+
+        columns = list(self.capfacts.columns.values[1:])
+        capfacts_path = directory / "capfacts.npy"
+        np.save(capfacts_path, self.capfacts[columns].to_numpy(dtype=np.float32))
+        return SharedDataHandle(feature_path, capfacts_path, columns, directory)
+
+    def _build_column_index(self):
+        """
+        Auxiliary function that parses the column names of the capacity factors once and builds the lookups by
+        column name, (region, energy type), country and energy type.
+        """
+        for position, column in enumerate(self.capfacts.columns):
+            if column == "snapshot":
+                continue
+            region_name, energy_type = parse_capfac_column(column)
+            self.column_info[column] = (region_name, energy_type)
+            if region_name is None:
+                continue
+            self.column_index[(region_name, energy_type)] = position
+            self.country_index.setdefault(region_name[:2], []).append(column)
+            self.energy_type_index.setdefault(energy_type, []).append(column)
+
+    def get_column(self, region_name: str, energy_type: EnergyType) -> str:
+        """
+        Returns the column name of the capacity factors for a given region and energy type
+        :param region_name: name of the region
+        :param energy_type: energy type in that region
+        :return: column name, None if there is no such column
+        """
+        position = self.column_index.get((region_name, energy_type))
+        return None if position is None else self.capfacts.columns[position]
+
+    def find_energy_type_in_capfacts(self, energy_type: EnergyType) -> list:
+        """
+        Returns the column names of all regions with the given energy type
+        :param energy_type: the energy type
+        :return: list of all column names with this energy type
+        """
+        return list(self.energy_type_index.get(energy_type, []))
 
     def find_countries_in_capfacts(self, country_name="") -> list:
         """
@@ -46,6 +149,9 @@ class ForecastData:
         :param country_name: Two character abbreviation of the searched country
         :return: list of all regions and energy types to the given country name
         """
+        if country_name in self.country_index:
+            return list(self.country_index[country_name])
+
         countries = []
         for column in self.capfacts:
             if column.find(country_name) >= 0:
@@ -58,12 +164,9 @@ class ForecastData:
         :param column_name: column name of the capfacts .csv file
         :return: Tuple of a region name and energy type, None if no region is found
         """
-        col_args = column_name.split(" ")
-        if len(col_args) == 3:
-            region_name = col_args[0]
-            energy_type = EnergyType.get_energy_type(col_args[2])
-            return region_name, energy_type
-        return None, None
+        if column_name in self.column_info:
+            return self.column_info[column_name]
+        return parse_capfac_column(column_name)
 
     def get_training_data(self, column_name: str) -> (np.ndarray, dict):
         """
@@ -81,8 +184,22 @@ class ForecastData:
         Y = self.capfacts[column_name].values
         X = {}
         for feature in features:
-            X[feature] = self.era5.sel(region=era5_region_name)[feature.value].values
+            X[feature] = np.asarray(self.feature_store.get_feature(era5_region_name, feature))
+
+        return Y, X
 
+    def get_feature_matrix(self, column_name: str) -> (np.ndarray, np.ndarray):
+        """
+        Returns the training data for a given column name from the capfacts .csv file with the features as one array.
+        The features are a view of the feature store and not copied.
+        :param column_name: column name of the capfacts .csv file
+        :return: Tuple of capacity factor (Y) and trainings data (X) of shape (n_samples, n_features)
+        """
+        region_name, energy_type = self.parse_capfac_col(column_name)
+        era5_region_name = get_era5_region_name(region_name, energy_type)
+
+        Y = self.capfacts[column_name].values
+        X = np.asarray(self.feature_store.get(era5_region_name, config.feature_set.get(energy_type)))
         return Y, X
 
     def shape_multi_feature_data(self, training_data: dict):
@@ -96,3 +213,119 @@ class ForecastData:
         return np.stack(arrays, axis=-1)
 
 
+class SharedDataHandle:
+    """
+    Lightweight handle of the features and capacity factors that were exported to memory-mapped files. Worker
+    processes attach to the files instead of receiving a copy of the ForecastData.
+    """
+
+    def __init__(self, feature_path, capfacts_path, columns: list, directory=None):
+        """
+        Initializes the handle.
+
+        :param feature_path: path of the memory-mappable feature store
+        :param capfacts_path: path of the capacity factors as .npy file of shape (time, column)
+        :param columns: column names of the capacity factors
+        :param directory: Optional directory of the exported files of this run, removed by cleanup()
+        """
+        self.feature_path = str(feature_path)
+        self.capfacts_path = str(capfacts_path)
+        self.columns = columns
+        self.directory = None if directory is None else str(directory)
+
+    def cleanup(self):
+        """
+        Removes the exported files of this run. Must only be called when no worker uses the data anymore.
+        """
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def attach(self) -> "SharedForecastData":
+        """
+        Attaches to the exported data. The memory maps are opened once per process and reused.
+
+        :return: read-only view of the exported data
+        """
+        key = (self.feature_path, self.capfacts_path)
+        if key not in _attached_data:
+            _attached_data[key] = SharedForecastData(FeatureStore.open(self.feature_path),
+                                                     np.load(self.capfacts_path, mmap_mode="r"), self.columns)
+        return _attached_data[key]
+
+
+class SharedForecastData:
+    """
+    Read-only view of the memory-mapped features and capacity factors.
+    """
+
+    def __init__(self, feature_store: FeatureStore, capfacts: np.ndarray, columns: list):
+        """
+        Initializes the view.
+
+        :param feature_store: memory-mapped feature store
+        :param capfacts: memory-mapped capacity factors of shape (time, column)
+        :param columns: column names of the capacity factors
+        """
+        self.feature_store = feature_store
+        self.capfacts = capfacts
+        self.column_index = {column: i for i, column in enumerate(columns)}
+
+    def get_feature_matrix(self, column_name: str) -> (np.ndarray, np.ndarray):
+        """
+        Returns the training data for a given column name from the capfacts .csv file without copying.
+        :param column_name: column name of the capfacts .csv file
+        :return: Tuple of capacity factor (Y) and trainings data (X) of shape (n_samples, n_features)
+        """
+        region_name, energy_type = parse_capfac_column(column_name)
+        era5_region_name = get_era5_region_name(region_name, energy_type)
+
+        Y = np.asarray(self.capfacts[:, self.column_index[column_name]])
+        X = np.asarray(self.feature_store.get(era5_region_name, config.feature_set.get(energy_type)))
+        return Y, X
+
+
+"""
+Shared data that was attached in this process, by the paths of the files
+"""
+_attached_data = {}
+
+
+def load_capfacts(path) -> pd.DataFrame:
+    """
+    Loads the capacity factors. The snapshots are parsed as timestamps and the values are stored as float32.
+    On the first read, the .csv file is converted to a Parquet file next to it, which is used as long as it is newer
+    than the .csv file. Without a Parquet engine (pyarrow or fastparquet) the .csv file is read every time.
+    :param path: path of the capfacts .csv file
+    :return: DataFrame with the snapshots and one column per region and energy type
+    """
+    path = Path(path)
+    sidecar = path.with_suffix(".parquet")
+    if sidecar.is_file() and sidecar.stat().st_mtime >= path.stat().st_mtime:
+        try:
+            return pd.read_parquet(sidecar)
+        except ImportError:
+            logger.debug("No Parquet engine installed, read the capacity factors from %s", path)
+
+    header = pd.read_csv(path, nrows=0).columns
+    dtypes = {column: np.float32 for column in header if column != "snapshot"}
+    capfacts = pd.read_csv(path, dtype=dtypes, parse_dates=["snapshot"])
+    try:
+        capfacts.to_parquet(sidecar)
+        logger.info("Saved the capacity factors to %s", sidecar)
+    except ImportError:
+        logger.info("No Parquet engine installed, the capacity factors are not cached as %s", sidecar)
+    return capfacts
+
+
+def parse_capfac_column(column_name: str) -> (str, EnergyType):
+    """
+    Returns a tuple of the region name and energy type for a given column name of the capfacts .csv file
+    :param column_name: column name of the capfacts .csv file
+    :return: Tuple of a region name and energy type, None if no region is found
+    """
+    col_args = column_name.split(" ")
+    if len(col_args) == 3:
+        region_name = col_args[0]
+        energy_type = EnergyType.get_energy_type(col_args[2])
+        return region_name, energy_type
+    return None, None
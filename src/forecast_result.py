@@ -0,0 +1,133 @@
+from src.telemetry import get_logger
+import config
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+from pathlib import Path
+from scipy.special import ndtri
+
+logger = get_logger(__name__)
+
+
+class ForecastResult:
+    """
+    Predicted normal distributions of the capacity factors of all columns. Only the location and scale of every
+    prediction are stored, any quantile is derived on demand.
+    """
+
+    def __init__(self, dataset: xr.Dataset):
+        """
+        Initializes the result.
+
+        :param dataset: Dataset with the variables loc and scale with dimensions (column, snapshot)
+        """
+        self.dataset = dataset
+
+    @classmethod
+    def from_columns(cls, snapshots, columns: dict):
+        """
+        Creates the result from the predicted distributions of the columns.
+
+        :param snapshots: time steps of the prediction
+        :param columns: Dictionary of the column names and tuples of the loc and scale arrays
+        :return: the result
+        """
+        if not columns:
+            raise ValueError("The result needs the predicted distributions of at least one column")
+        names = list(columns.keys())
+        loc = np.array([columns[name][0] for name in names], dtype=np.float64).reshape(len(names), -1)
+        scale = np.array([columns[name][1] for name in names], dtype=np.float64).reshape(len(names), -1)
+        dataset = xr.Dataset(
+            data_vars=dict(
+                loc=(["column", "snapshot"], loc),
+                scale=(["column", "snapshot"], scale),
+            ),
+            coords=dict(
+                column=(["column"], np.array(names, dtype=object)),
+                snapshot=(["snapshot"], np.asarray(snapshots)),
+            ),
+            attrs=dict(
+                description="Location and scale of the predicted normal distributions of the capacity factors",
+            ),
+        )
+        return cls(dataset)
+
+    @classmethod
+    def open(cls, path=None, load=False):
+        """
+        Opens a saved result.
+
+        :param path: path of the netCDF file. If not defined, the path is loaded from the config.
+        :param load: True to read the result into memory and close the file, so it can be overwritten
+        :return: the result
+        """
+        path = config.paths["forecast_dist"] if path is None else path
+        if load:
+            return cls(xr.load_dataset(path, engine="netcdf4"))
+        return cls(xr.open_dataset(path, engine="netcdf4"))
+
+    def save(self, path=None):
+        """
+        Saves the result as compressed netCDF file. The location and scale are kept as float64 in memory and are
+        only stored as float32.
+
+        :param path: path of the netCDF file. If not defined, the path is loaded from the config.
+        """
+        path = Path(config.paths["forecast_dist"] if path is None else path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        encoding = {name: {"zlib": True, "complevel": 4, "dtype": "float32"} for name in self.dataset.data_vars}
+        self.dataset.to_netcdf(path, encoding=encoding)
+        logger.info("Saved the predicted distributions to: %s", path)
+
+    def append(self, other):
+        """
+        Appends the predictions of new snapshots. Both results must contain the same columns.
+
+        :param other: result with the predictions of the new snapshots
+        :return: the combined result
+        """
+        other_dataset = other.dataset.sel(column=self.dataset["column"].values)
+        return ForecastResult(xr.concat([self.dataset, other_dataset], dim="snapshot"))
+
+    def quantile(self, q, clipped=False) -> xr.DataArray:
+        """
+        Computes the quantiles of all columns and snapshots.
+
+        :param q: a single quantile or a list of quantiles
+        :param clipped: True to clip the quantiles to the bounds defined in the config
+        :return: quantiles with dimensions (column, snapshot) or (quantile, column, snapshot) for a list of quantiles
+        """
+        if np.ndim(q) == 0:
+            result = self.dataset["loc"] + self.dataset["scale"] * ndtri(q)
+        else:
+            z = xr.DataArray(ndtri(np.asarray(q, dtype=np.float64)), dims="quantile", coords={"quantile": q})
+            result = self.dataset["loc"] + self.dataset["scale"] * z
+        if clipped:
+            result = result.clip(config.clip_lower, config.clip_upper)
+        return result
+
+    def to_frame(self, q, clipped=False) -> pd.DataFrame:
+        """
+        Returns a single quantile in the layout of the capacity factors, one column per region and energy type.
+
+        :param q: quantile
+        :param clipped: True to clip the quantile to the bounds defined in the config
+        :return: DataFrame with the snapshots and the quantile of every column
+        """
+        values = self.quantile(q, clipped).transpose("snapshot", "column")
+        frame = pd.DataFrame(values.values, columns=values["column"].values)
+        frame.insert(0, "snapshot", values["snapshot"].values)
+        return frame
+
+
+def normal_quantile(loc: np.ndarray, scale: np.ndarray, q: float) -> np.ndarray:
+    """
+    Computes the quantile of normal distributions.
+
+    :param loc: location of the distributions
+    :param scale: scale of the distributions
+    :param q: quantile
+    :return: quantile of every distribution
+    """
+    return loc + scale * ndtri(q)
@@ -0,0 +1,294 @@
+"""
+This script provides a histogram-based regression tree as base learner of NGBoost. The features are quantized into at
+most 255 bins, so a split is searched over the bins of a histogram of the gradients instead of over the sorted
+feature values. The bin edges are computed once per column and shared by all trees of a model, and the training and
+validation features are binned once per fit with bin_features instead of once per tree.
+"""
+
+import numpy as np
+from sklearn.base import BaseEstimator, RegressorMixin, clone
+from sklearn.tree import DecisionTreeRegressor
+
+
+class BinMapper:
+    """
+    Quantizes the features into uint8 bins. The edges of a feature are the midpoints between its distinct values if it
+    has at most max_bins of them, otherwise its quantiles.
+    A value x is in bin b if edges[b - 1] < x <= edges[b], missing values are in the last bin.
+    """
+
+    def __init__(self, max_bins=255, subsample=200000, random_state=42):
+        """
+        Initializes the mapper.
+
+        :param max_bins: Maximum number of bins of a feature, at most 255
+        :param subsample: Maximum number of samples the quantiles are computed from
+        :param random_state: Random state of the subsample
+        """
+        if not 2 <= max_bins <= 255:
+            raise ValueError("max_bins must be between 2 and 255, got " + str(max_bins))
+        self.max_bins = max_bins
+        self.subsample = subsample
+        self.random_state = random_state
+        self.bin_edges = None
+
+    def fit(self, X: np.ndarray):
+        """
+        Computes the bin edges of all features.
+
+        :param X: features with shape (n_samples, n_features)
+        :return: the mapper
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if self.subsample is not None and X.shape[0] > self.subsample:
+            rows = np.random.default_rng(self.random_state).choice(X.shape[0], self.subsample, replace=False)
+            X = X[rows]
+
+        self.bin_edges = []
+        for values in X.T:
+            distinct = np.unique(values[~np.isnan(values)])
+            if len(distinct) <= self.max_bins:
+                edges = (distinct[:-1] + distinct[1:]) / 2
+            else:
+                edges = np.unique(np.quantile(values[~np.isnan(values)], np.linspace(0, 1, self.max_bins + 1)[1:-1]))
+            self.bin_edges.append(edges)
+        return self
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        """
+        Maps the features to their bins.
+
+        :param X: features with shape (n_samples, n_features)
+        :return: bins with shape (n_samples, n_features) and dtype uint8
+        """
+        X = np.asarray(X)
+        binned = np.empty(X.shape, dtype=np.uint8, order="F")
+        for i, edges in enumerate(self.bin_edges):
+            binned[:, i] = np.searchsorted(edges, X[:, i], side="left")
+        return binned
+
+    def __deepcopy__(self, memo):
+        # The mapper is not changed after fit, so the clones of a base learner share it instead of copying the edges
+        return self
+
+
+class HistTreeRegressor(RegressorMixin, BaseEstimator):
+    """
+    Regression tree with the squared error, grown depth-first on histograms of the binned features. The histogram of
+    the larger child of a node is derived from the histograms of the node and the smaller child.
+    Features with dtype uint8 are taken as the bins of the bin mapper, both in fit and in predict.
+    """
+
+    def __init__(self, max_depth=3, min_samples_leaf=1, max_bins=255, bin_mapper: BinMapper = None):
+        """
+        Initializes the tree.
+
+        :param max_depth: Maximum depth of the tree
+        :param min_samples_leaf: Minimum number of samples of a leaf
+        :param max_bins: Maximum number of bins of a feature if no bin mapper is given
+        :param bin_mapper: Optional fitted bin mapper that is shared by all trees of a model. If not defined, the bins
+            are computed from the training data of the tree.
+        """
+        self.max_depth = max_depth
+        self.min_samples_leaf = min_samples_leaf
+        self.max_bins = max_bins
+        self.bin_mapper = bin_mapper
+
+    def fit(self, X: np.ndarray, y: np.ndarray, sample_weight=None):
+        """
+        Grows the tree.
+
+        :param X: features with shape (n_samples, n_features), or their bins of the bin mapper as uint8
+        :param y: targets, for NGBoost the natural gradients of one distribution parameter
+        :param sample_weight: Optional weights of the samples
+        :return: the tree
+        """
+        X = np.asarray(X)
+        # With col_sample < 1, NGBoost passes a subset of the features, their bins are computed from the tree's data
+        shared = self.bin_mapper is not None and len(self.bin_mapper.bin_edges) == X.shape[1]
+        if X.dtype == np.uint8:
+            if not shared:
+                raise ValueError("Binned features need the bin mapper of all features they were binned with")
+            mapper, binned = self.bin_mapper, X
+        else:
+            mapper = self.bin_mapper if shared else BinMapper(self.max_bins).fit(X)
+            binned = mapper.transform(X)
+        y = np.asarray(y, dtype=np.float64)
+        weight = np.ones(len(y)) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+        self.bin_edges_ = mapper.bin_edges
+        self.n_features_in_ = binned.shape[1]
+        n_bins = max(len(edges) for edges in self.bin_edges_) + 1
+
+        self.feature_, self.bin_, self.threshold_, self.left_, self.right_, self.value_ = [], [], [], [], [], []
+        importances = np.zeros(self.n_features_in_)
+        rows = np.arange(len(y))
+        stack = [(self._add_node(), rows, self._histogram(binned, y, weight, rows, n_bins), 0)]
+        while stack:
+            node, rows, histogram, depth = stack.pop()
+            sum_y, sum_w = histogram[0].sum(axis=0)
+            self.value_[node] = sum_y / sum_w if sum_w > 0 else 0.0
+            if depth >= self.max_depth or len(rows) < 2 * self.min_samples_leaf:
+                continue
+
+            split = self._best_split(histogram, sum_y, sum_w)
+            if split is None:
+                continue
+            feature, bin_index, gain = split
+            go_left = binned[rows, feature] <= bin_index
+            left_rows, right_rows = rows[go_left], rows[~go_left]
+            if min(len(left_rows), len(right_rows)) < self.min_samples_leaf:
+                continue
+
+            importances[feature] += gain
+            if len(left_rows) <= len(right_rows):
+                left_histogram = self._histogram(binned, y, weight, left_rows, n_bins)
+                right_histogram = histogram - left_histogram
+            else:
+                right_histogram = self._histogram(binned, y, weight, right_rows, n_bins)
+                left_histogram = histogram - right_histogram
+
+            left, right = self._add_node(), self._add_node()
+            self.feature_[node], self.threshold_[node] = feature, self.bin_edges_[feature][bin_index]
+            self.bin_[node] = bin_index
+            self.left_[node], self.right_[node] = left, right
+            stack.append((right, right_rows, right_histogram, depth + 1))
+            stack.append((left, left_rows, left_histogram, depth + 1))
+
+        self.feature_ = np.array(self.feature_, dtype=np.intp)
+        self.bin_ = np.array(self.bin_, dtype=np.intp)
+        self.threshold_ = np.array(self.threshold_, dtype=np.float64)
+        self.left_ = np.array(self.left_, dtype=np.intp)
+        self.right_ = np.array(self.right_, dtype=np.intp)
+        self.value_ = np.array(self.value_, dtype=np.float64)
+        total = importances.sum()
+        self.feature_importances_ = importances / total if total > 0 else importances
+        return self
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Predicts the values of the leaves the samples fall into. The thresholds are the bin edges, so the features
+        are compared without binning them. Binned features are compared with the last bin of the left child.
+
+        :param X: features with shape (n_samples, n_features), or their bins of the bin mapper as uint8
+        :return: predicted values
+        """
+        X = np.asarray(X)
+        threshold = self.bin_ if X.dtype == np.uint8 else self.threshold_
+        samples = np.arange(X.shape[0])
+        node = np.zeros(X.shape[0], dtype=np.intp)
+        for _ in range(self.max_depth):
+            feature = self.feature_[node]
+            internal = feature >= 0
+            if not internal.any():
+                break
+            # Missing values are in the last bin and go right, as in fit
+            go_left = X[samples, np.where(internal, feature, 0)] <= threshold[node]
+            node = np.where(internal, np.where(go_left, self.left_[node], self.right_[node]), node)
+        return self.value_[node]
+
+    def _add_node(self) -> int:
+        for values, default in [(self.feature_, -1), (self.bin_, -1), (self.threshold_, np.nan), (self.left_, -1),
+                                (self.right_, -1), (self.value_, 0.0)]:
+            values.append(default)
+        return len(self.value_) - 1
+
+    @staticmethod
+    def _histogram(binned: np.ndarray, y: np.ndarray, weight: np.ndarray, rows: np.ndarray, n_bins: int) -> np.ndarray:
+        """
+        Computes the histogram of the weighted targets and weights of the samples.
+
+        :return: array with shape (n_features, n_bins, 2)
+        """
+        weighted_y, weight = y[rows] * weight[rows], weight[rows]
+        histogram = np.empty((binned.shape[1], n_bins, 2))
+        for feature in range(binned.shape[1]):
+            bins = binned[rows, feature]
+            histogram[feature, :, 0] = np.bincount(bins, weights=weighted_y, minlength=n_bins)
+            histogram[feature, :, 1] = np.bincount(bins, weights=weight, minlength=n_bins)
+        return histogram
+
+    def _best_split(self, histogram: np.ndarray, sum_y: float, sum_w: float):
+        """
+        Finds the split with the largest decrease of the squared error over all features and bins.
+
+        :return: Tuple of the feature, the last bin of the left child and the decrease, None if no split decreases the
+            error
+        """
+        if histogram.shape[1] < 2:
+            return None
+        left_y = np.cumsum(histogram[:, :-1, 0], axis=1)
+        left_w = np.cumsum(histogram[:, :-1, 1], axis=1)
+        right_y, right_w = sum_y - left_y, sum_w - left_w
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gain = left_y ** 2 / left_w + right_y ** 2 / right_w - sum_y ** 2 / sum_w
+        gain[(left_w <= 0) | (right_w <= 0)] = -np.inf
+        for feature, edges in enumerate(self.bin_edges_):
+            gain[feature, len(edges):] = -np.inf
+
+        feature, bin_index = np.unravel_index(np.argmax(gain), gain.shape)
+        if not gain[feature, bin_index] > 1e-12:
+            return None
+        return int(feature), int(bin_index), float(gain[feature, bin_index])
+
+
+def create_base_learner(base_learner: str, X: np.ndarray = None, max_depth=3, max_bins=255, random_state=None):
+    """
+    Creates the base learner of NGBoost.
+
+    :param base_learner: "tree" for the default decision tree of NGBoost, "hist" for the histogram-based tree
+    :param X: Optional features the bins of the histogram-based tree are computed from, so they are computed once for
+        all trees of a model
+    :param max_depth: Maximum depth of the trees
+    :param max_bins: Maximum number of bins of a feature
+    :param random_state: Optional random state of the decision tree, which permutes the features at every split
+    :return: the base learner
+    """
+    if base_learner == "tree":
+        return DecisionTreeRegressor(criterion="friedman_mse", max_depth=max_depth, random_state=random_state)
+    if base_learner == "hist":
+        bin_mapper = None if X is None else BinMapper(max_bins).fit(X)
+        return HistTreeRegressor(max_depth=max_depth, max_bins=max_bins, bin_mapper=bin_mapper)
+    raise ValueError("Unknown base learner: " + str(base_learner))
+
+
+def bin_features(base, *arrays) -> tuple:
+    """
+    Maps the features to the bins of a histogram-based base learner with a bin mapper, so they are binned once for all
+    trees of a model instead of in every fit of a tree. The trees predict the binned and the raw features alike.
+
+    :param base: base learner of NGBoost
+    :param arrays: features with shape (n_samples, n_features)
+    :return: the binned features, or the given features if the base learner has no bin mapper
+    """
+    mapper = getattr(base, "bin_mapper", None)
+    if mapper is None:
+        return arrays
+    return tuple(mapper.transform(X) for X in arrays)
+
+
+def with_bin_mapper(base, X: np.ndarray):
+    """
+    Returns the base learner with a bin mapper fitted on the given features if it is a histogram-based tree without
+    one, so the bin edges are computed once per column instead of in every fit of a tree. Used for the candidates of
+    the hyperparameter searches, whose trees are fitted on the raw features.
+
+    :param base: base learner of NGBoost
+    :param X: features the bins are computed from
+    :return: the base learner
+    """
+    if isinstance(base, HistTreeRegressor) and base.bin_mapper is None:
+        return clone(base).set_params(bin_mapper=BinMapper(base.max_bins).fit(X))
+    return base
+
+
+def without_bin_mapper(base):
+    """
+    Returns the base learner without its bin mapper, e.g. to share tuned hyperparameters with other columns, which
+    compute their own bins.
+
+    :param base: base learner of NGBoost
+    :return: the base learner
+    """
+    if isinstance(base, HistTreeRegressor) and base.bin_mapper is not None:
+        return clone(base).set_params(bin_mapper=None)
+    return base
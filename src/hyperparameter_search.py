@@ -0,0 +1,116 @@
+"""
+This script includes a budget-aware hyperparameter search for the NGBoost regression.
+"""
+
+from src.telemetry import get_logger
+
+import math
+import numpy as np
+from ngboost import NGBRegressor
+from ngboost.distns import Normal
+from ngboost.scores import LogScore
+from sklearn.model_selection import ParameterGrid
+
+logger = get_logger(__name__)
+
+
+def staged_validation_loss(ngb: NGBRegressor, X_val, Y_val) -> np.ndarray:
+    """
+    Computes the validation NLL after every boosting iteration from the staged predictions of a single fit.
+
+    :param ngb: fitted model
+    :param X_val: validation features
+    :param Y_val: validation targets
+    :return: NLL of the validation data after 1, 2, ..., n iterations
+    """
+    return np.array([-dist.logpdf(Y_val).mean() for dist in ngb.staged_pred_dist(X_val)])
+
+
+def continue_validation_loss(ngb: NGBRegressor, X_val, Y_val, params=None, start=0) -> (np.ndarray, np.ndarray):
+    """
+    Computes the validation NLL of the boosting iterations from start on. The predicted parameters of the validation
+    data are carried over between the calls, so the stages of a continued model are not evaluated again from the
+    first iteration.
+
+    :param ngb: fitted model
+    :param X_val: validation features
+    :param Y_val: validation targets
+    :param params: predicted parameters of the validation data after the first start iterations, as returned by the
+        previous call. None to start from the initial parameters.
+    :param start: Number of iterations that are already included in params
+    :return: Tuple of the NLL after the iterations start + 1, ..., n and the predicted parameters after iteration n
+    """
+    X_val = np.asarray(X_val)
+    if params is None:
+        params = np.ones((X_val.shape[0], ngb.Manifold.n_params)) * ngb.init_params
+    else:
+        params = params.copy()
+    losses = []
+    for models, s, col_idx in zip(ngb.base_models[start:], ngb.scalings[start:], ngb.col_idxs[start:]):
+        resids = np.array([model.predict(X_val[:, col_idx]) for model in models]).T
+        params -= ngb.learning_rate * resids * s
+        losses.append(-ngb.Manifold(params.T).logpdf(Y_val).mean())
+    return np.array(losses), params
+
+
+def successive_halving(X_train, Y_train, X_val, Y_val, param_grid: dict, eta=3, min_estimators=None,
+                       random_state=42) -> (NGBRegressor, dict, int, float):
+    """
+    Successive halving over the configurations of the parameter grid with n_estimators as budget. All configurations
+    start with a small number of boosting iterations, only the best 1/eta of them are boosted further, by continuing
+    the already fitted models. Every iteration count of a model is scored from its staged predictions, so the
+    n_estimators values of the grid do not need separate fits. The staged predictions of the validation data are
+    continued across the rounds, every iteration is scored once.
+
+    :param X_train: training features
+    :param Y_train: training targets
+    :param X_val: validation features
+    :param Y_val: validation targets
+    :param param_grid: Dictionary of hyperparameters. The largest n_estimators is used as maximum budget.
+    :param eta: Reduction factor of the configurations and growth factor of the budget per round
+    :param min_estimators: Budget of the first round. If not defined, it is derived from the maximum budget and the
+        number of rounds that are needed to keep a single configuration.
+    :param random_state: Random state to allow comparability of results
+    :return: Tuple of the best model, its parameters (with the best n_estimators), the best iteration and the best
+        validation NLL
+    """
+    grid = dict(param_grid)
+    max_estimators = max(grid.pop("n_estimators", [1000]))
+    candidates = [{"params": params, "model": None, "loss": np.inf, "itr": 0, "itr_evaluated": 0, "val_params": None}
+                  for params in ParameterGrid(grid)]
+
+    n_rounds = max(1, math.ceil(math.log(len(candidates), eta))) if len(candidates) > 1 else 1
+    if min_estimators is None:
+        min_estimators = max(1, int(max_estimators / eta ** (n_rounds - 1)))
+    budget = min(min_estimators, max_estimators)
+
+    while True:
+        logger.info("Successive halving: %s configurations with %s iterations", len(candidates), budget)
+        for candidate in candidates:
+            model = candidate["model"]
+            if model is None:
+                model = NGBRegressor(Dist=Normal, Score=LogScore, random_state=random_state, verbose=False,
+                                     n_estimators=budget, **candidate["params"])
+                model.fit(X_train, Y_train)
+            else:
+                # Continue boosting the fitted model up to the new budget. partial_fit boosts n_estimators further
+                # iterations, afterwards n_estimators is restored to the total number of iterations of the model.
+                model.n_estimators = budget - len(model.base_models)
+                model.partial_fit(X_train, Y_train)
+                model.n_estimators = len(model.base_models)
+            # Only the iterations of this round are scored, the validation predictions of the previous rounds are kept
+            start = candidate["itr_evaluated"]
+            losses, val_params = continue_validation_loss(model, X_val, Y_val, candidate["val_params"], start)
+            candidate.update(model=model, val_params=val_params, itr_evaluated=len(model.base_models))
+            if len(losses) > 0 and losses.min() < candidate["loss"]:
+                candidate.update(loss=losses.min(), itr=start + int(losses.argmin()) + 1)
+
+        candidates.sort(key=lambda c: c["loss"])
+        if len(candidates) == 1 or budget >= max_estimators:
+            break
+        candidates = candidates[:max(1, math.ceil(len(candidates) / eta))]
+        budget = min(budget * eta, max_estimators)
+
+    best = candidates[0]
+    params = dict(best["params"], n_estimators=best["itr"])
+    return best["model"], params, best["itr"], best["loss"]
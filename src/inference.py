@@ -0,0 +1,362 @@
+"""
+This script provides a local inference service over the stored models. All models are loaded once and kept in memory.
+Requests are answered with the vectorized pred_dist of the models, requests that arrive within a short window are
+combined into one batch per model. The service can be used from Python, from the command line or as HTTP server on
+localhost:
+
+    python -m src.inference serve --port 8765
+    python -m src.inference predict "DE0 0 solar" --start 2013-06-01 --end 2013-06-02 --quantiles 0.1 0.5 0.9
+"""
+
+from src.model_store import ModelStore
+from src.forecast import predict_column, global_column_name, global_static_features
+from src.forecast_data import ForecastData, parse_capfac_column
+from src.forecast_result import normal_quantile
+from src.daytime_checker import DaytimeChecker
+from src.era5_mapper import get_era5_region_name
+from src.telemetry import get_logger
+import config
+
+import argparse
+import json
+import queue
+import threading
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = get_logger(__name__)
+
+
+class InferenceService:
+    """
+    Keeps the stored models of all columns in memory and predicts the distributions of batches of feature rows.
+    """
+
+    def __init__(self, model_store: ModelStore = None):
+        """
+        Loads all stored models.
+
+        :param model_store: Store of the fitted models. If not defined, the store in the configured path is used.
+        """
+        self.models = (ModelStore() if model_store is None else model_store).load_all()
+        self._data = None
+        # Daytime masks of the full input series by column. They are kept in memory, so the masks of the requested
+        # time ranges do not fill the cache directory.
+        self._range_day_masks = {}
+        # Static attributes of the regions of the columns that are predicted with a global model
+        self._static_features = {}
+        self._centroids = None
+        # The shapefiles are only read if a model predicts zero at night
+        prune_night = any(entry.get("prune_night", False) for entry in self.models.values())
+        self.daytime_checker = DaytimeChecker() if prune_night else None
+        logger.info("Loaded %s models", len(self.models))
+
+    @property
+    def data(self):
+        """
+        Input data of the forecast, loaded on the first request of a time range.
+        """
+        if self._data is None:
+            self._data = ForecastData()
+        return self._data
+
+    def model_entry(self, col_name: str) -> (dict, np.ndarray):
+        """
+        Returns the stored model of a column. Like Forecast.predict, a column without a stored model of its own is
+        predicted with the stored global model of its energy type. The static attributes of the region are appended
+        to the feature rows of the column then.
+
+        :param col_name: column name of the capfacts .csv file
+        :return: Tuple of the stored model and the static attributes of the region, None if the column has a model
+            of its own
+        """
+        entry = self.models.get(col_name)
+        if entry is not None:
+            return entry, None
+
+        region_name, energy_type = parse_capfac_column(col_name)
+        entry = None if energy_type is None else self.models.get(global_column_name(energy_type))
+        if entry is None:
+            raise KeyError("No stored model for column " + str(col_name))
+        if col_name not in self._static_features:
+            if self._centroids is None:
+                checker = DaytimeChecker() if self.daytime_checker is None else self.daytime_checker
+                self._centroids = checker.get_centroids()
+            self._static_features[col_name] = global_static_features(self.data, region_name, energy_type,
+                                                                     self._centroids)
+        return entry, self._static_features[col_name]
+
+    def predict(self, col_name: str, X: np.ndarray, day_mask=None) -> (np.ndarray, np.ndarray):
+        """
+        Predicts the distributions of a batch of feature rows of a column.
+
+        :param col_name: column name of the capfacts .csv file
+        :param X: features with shape (n_samples, n_features) in the order of the stored feature names. For a column
+            that is predicted with a global model, only the features of the column without the static attributes of
+            the region.
+        :param day_mask: Optional boolean array that is True for the daytime rows. Only used if the model was trained
+            on daytime hours only.
+        :return: Tuple of the loc and scale arrays
+        """
+        entry, static = self.model_entry(col_name)
+        X = np.asarray(X, dtype=np.float32).reshape(-1, self._n_features(entry, static))
+        if static is not None:
+            X = np.column_stack([X, np.tile(static, (X.shape[0], 1))])
+        if not entry.get("prune_night", False):
+            day_mask = None
+        return predict_column(entry["model"], X, entry["best_val_loss_itr"], day_mask)
+
+    @staticmethod
+    def _n_features(entry: dict, static: np.ndarray) -> int:
+        """
+        Helper function that returns the number of features of the requested rows of a model.
+        """
+        return len(entry["features"]) - (0 if static is None else len(static))
+
+    def day_mask(self, col_name: str, snapshots, use_cache=True):
+        """
+        Determines the daytime rows of a column whose model was trained on daytime hours only.
+
+        :param col_name: column name of the capfacts .csv file
+        :param snapshots: times of the rows in UTC
+        :param use_cache: True to cache the mask of the snapshots in the cache directory
+        :return: boolean array that is True for the daytime rows. None if the model predicts every row.
+        """
+        if not self.model_entry(col_name)[0].get("prune_night", False):
+            return None
+        if snapshots is None:
+            raise ValueError("The model of column " + str(col_name) + " was trained on daytime hours only, the "
+                             "snapshots of the feature rows are needed")
+        region = get_era5_region_name(*parse_capfac_column(col_name))
+        return self.daytime_checker.daylight_mask(snapshots, [region], use_cache).sel(region=region).values
+
+    def predict_batch(self, requests: list) -> list:
+        """
+        Predicts the distributions of several requests with one call of pred_dist per model. The rows of all requests
+        of the same column are stacked, predicted at once and split again. The models that were trained on daytime
+        hours only predict zero at night, their requests need the snapshots of the rows.
+
+        :param requests: list of tuples of the column name, the feature rows and optionally the snapshots of the rows
+        :return: list of tuples of the loc and scale arrays in the order of the requests
+        """
+        by_column = {}
+        for i, (col_name, X, *snapshots) in enumerate(requests):
+            X = np.asarray(X, dtype=np.float32).reshape(-1, self._n_features(*self.model_entry(col_name)))
+            snapshots = snapshots[0] if snapshots and snapshots[0] is not None else None
+            if snapshots is not None and len(snapshots) != X.shape[0]:
+                raise ValueError("Got " + str(len(snapshots)) + " snapshots for " + str(X.shape[0]) + " feature rows")
+            by_column.setdefault(col_name, []).append((i, X, snapshots))
+
+        results = [None] * len(requests)
+        for col_name, batch in by_column.items():
+            snapshots = None
+            if all(item_snapshots is not None for i, X, item_snapshots in batch):
+                snapshots = pd.DatetimeIndex(np.concatenate([pd.DatetimeIndex(item_snapshots).values
+                                                             for i, X, item_snapshots in batch]))
+            day_mask = self.day_mask(col_name, snapshots, use_cache=False)
+            loc, scale = self.predict(col_name, np.concatenate([X for i, X, item_snapshots in batch]), day_mask)
+            offset = 0
+            for i, X, item_snapshots in batch:
+                results[i] = (loc[offset:offset + X.shape[0]], scale[offset:offset + X.shape[0]])
+                offset += X.shape[0]
+        return results
+
+    def predict_range(self, col_name: str, start=None, end=None) -> (np.ndarray, np.ndarray, np.ndarray):
+        """
+        Predicts the distributions of a column for a range of snapshots of the input data.
+
+        :param col_name: column name of the capfacts .csv file
+        :param start: Optional first snapshot of the range
+        :param end: Optional last snapshot of the range
+        :return: Tuple of the snapshots and the loc and scale arrays
+        """
+        snapshots = pd.DatetimeIndex(self.data.capfacts["snapshot"])
+        mask = np.ones(len(snapshots), dtype=bool)
+        if start is not None:
+            mask &= snapshots >= pd.Timestamp(start)
+        if end is not None:
+            mask &= snapshots <= pd.Timestamp(end)
+
+        Y, X = self.data.get_feature_matrix(col_name)
+        if col_name not in self._range_day_masks:
+            self._range_day_masks[col_name] = self.day_mask(col_name, snapshots, use_cache=False)
+        day_mask = self._range_day_masks[col_name]
+        loc, scale = self.predict(col_name, X[mask], None if day_mask is None else day_mask[mask])
+        return snapshots[mask].values, loc, scale
+
+
+class MicroBatcher:
+    """
+    Collects the requests of several threads for a short window and predicts them with one batch per model.
+    """
+
+    def __init__(self, service: InferenceService, window=config.inference_batch_window):
+        """
+        Starts the batching thread.
+
+        :param service: service that predicts the batches
+        :param window: Time in seconds that requests are collected after the first request of a batch
+        """
+        self.service = service
+        self.window = window
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, col_name: str, X: np.ndarray, snapshots=None) -> Future:
+        """
+        Adds a request to the next batch.
+
+        :param col_name: column name of the capfacts .csv file
+        :param X: features with shape (n_samples, n_features)
+        :param snapshots: Optional times of the rows, needed by the models that were trained on daytime hours only
+        :return: Future of the tuple of the loc and scale arrays
+        """
+        future = Future()
+        self._queue.put((col_name, X, snapshots, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.window
+            while (remaining := deadline - time.perf_counter()) > 0:
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                results = self.service.predict_batch([(col_name, X, snapshots)
+                                                      for col_name, X, snapshots, future in batch])
+            except Exception:
+                # Predict the requests separately, so an invalid request does not fail the whole batch
+                for col_name, X, snapshots, future in batch:
+                    try:
+                        future.set_result(self.service.predict_batch([(col_name, X, snapshots)])[0])
+                    except Exception as e:
+                        future.set_exception(e)
+                continue
+            for (col_name, X, snapshots, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+def distribution_response(loc: np.ndarray, scale: np.ndarray, quantiles=None, clipped=False) -> dict:
+    """
+    Returns the predicted distributions in a JSON serializable form.
+
+    :param loc: location of the predicted distributions
+    :param scale: scale of the predicted distributions
+    :param quantiles: Optional quantiles that are returned instead of loc and scale
+    :param clipped: True to clip the quantiles to the bounds defined in the config
+    :return: Dictionary with loc and scale or with the quantiles
+    """
+    if not quantiles:
+        return {"loc": np.asarray(loc).tolist(), "scale": np.asarray(scale).tolist()}
+
+    values = {}
+    for q in quantiles:
+        value = normal_quantile(np.asarray(loc), np.asarray(scale), q)
+        if clipped:
+            value = value.clip(config.clip_lower, config.clip_upper)
+        values[str(q)] = value.tolist()
+    return {"quantiles": values}
+
+
+def create_server(service: InferenceService, host=config.inference_host, port=config.inference_port,
+                  window=config.inference_batch_window) -> ThreadingHTTPServer:
+    """
+    Creates the HTTP server of the service. POST /predict accepts a JSON object with either a list of requests of
+    feature rows {"requests": [{"column": ..., "features": [[...], ...], "snapshots": [...]}, ...]} or a time range
+    {"column": ..., "start": ..., "end": ...}, and optionally "quantiles" and "clipped". The snapshots of the feature
+    rows are only needed for the models that were trained on daytime hours only. Columns without a model of their own
+    are predicted with the global model of their energy type. Invalid requests are answered with status 400, other
+    errors with status 500. GET /columns lists the loaded models.
+
+    :param service: service that predicts the requests
+    :param host: host name, localhost by default
+    :param port: port of the server
+    :param window: Time in seconds that requests are collected into one batch
+    :return: the server, started with serve_forever()
+    """
+    batcher = MicroBatcher(service, window)
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _send(self, status: int, body: dict):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path != "/columns":
+                return self._send(404, {"error": "Unknown path " + self.path})
+            self._send(200, {col_name: entry["features"] for col_name, entry in service.models.items()})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                return self._send(404, {"error": "Unknown path " + self.path})
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                quantiles, clipped = request.get("quantiles"), request.get("clipped", False)
+                if "requests" in request:
+                    futures = [batcher.submit(item["column"], item["features"], item.get("snapshots"))
+                               for item in request["requests"]]
+                    body = {"results": [distribution_response(*future.result(), quantiles, clipped)
+                                        for future in futures]}
+                else:
+                    snapshots, loc, scale = service.predict_range(request["column"], request.get("start"),
+                                                                  request.get("end"))
+                    body = dict(snapshot=pd.DatetimeIndex(snapshots).strftime("%Y-%m-%d %H:%M:%S").tolist(),
+                                **distribution_response(loc, scale, quantiles, clipped))
+            except (KeyError, ValueError, TypeError, AttributeError) as e:
+                # Malformed requests, e.g. a JSON list instead of an object or features that are not numeric
+                return self._send(400, {"error": str(e)})
+            except Exception as e:
+                logger.exception("Failed to answer the request")
+                return self._send(500, {"error": str(e)})
+            self._send(200, body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Inference with the stored forecast models")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve", help="Start the HTTP server on localhost")
+    serve.add_argument("--host", default=config.inference_host)
+    serve.add_argument("--port", type=int, default=config.inference_port)
+    serve.add_argument("--window", type=float, default=config.inference_batch_window,
+                       help="Time in seconds that requests are collected into one batch")
+
+    predict = subparsers.add_parser("predict", help="Predict a column for a range of snapshots")
+    predict.add_argument("column", help="column name of the capfacts .csv file, e.g. \"DE0 0 solar\"")
+    predict.add_argument("--start")
+    predict.add_argument("--end")
+    predict.add_argument("--quantiles", type=float, nargs="*")
+    predict.add_argument("--clipped", action="store_true")
+    args = parser.parse_args(args)
+
+    service = InferenceService()
+    if args.command == "serve":
+        server = create_server(service, args.host, args.port, args.window)
+        logger.info("Serving %s models on http://%s:%s", len(service.models), args.host, args.port)
+        server.serve_forever()
+    else:
+        snapshots, loc, scale = service.predict_range(args.column, args.start, args.end)
+        response = distribution_response(loc, scale, args.quantiles, args.clipped)
+        frame = pd.DataFrame(response.get("quantiles", response), index=pd.Index(snapshots, name="snapshot"))
+        print(frame.to_csv())
+
+
+if __name__ == '__main__':
+    main()
@@ -3,10 +3,9 @@ This script includes metrics that allow calculating the quality of predictions.
 """
 
 import numpy as np
-from ngboost.distns import Normal
-from sklearn.metrics import mean_absolute_error as mae
-from sklearn.metrics import mean_pinball_loss
-from sklearn.metrics import mean_squared_error as mse
+from scipy.special import ndtr
+
+# The metrics of sklearn are only imported by the functions that use them, the batch scores only need numpy and scipy
 
 
 def coverage_fraction(y_true, y_low, y_high):
@@ -23,7 +22,7 @@ def coverage_fraction(y_true, y_low, y_high):
     return np.mean(np.logical_and(y_true >= y_low, y_true <= y_high))
 
 
-def negative_log_likelihood(y_true, y_pred_dist: Normal) -> float:
+def negative_log_likelihood(y_true, y_pred_dist: "Normal") -> float:
     """
     Computes the negative log likelihood (NLL) of the probabilistic forecast.
 
@@ -43,6 +42,7 @@ def pinball_loss(y_true, y_pred, quantil=0.5) -> float:
     :param quantil: Quantile or bias assumed in the calculation.
     :return: The pinball loss output is a non-negative floating point. The best value is 0.0.
     """
+    from sklearn.metrics import mean_pinball_loss
     return mean_pinball_loss(y_true, y_pred, alpha=quantil)
 
 
@@ -55,6 +55,7 @@ def root_mean_squared_error(y_true, y_pred) -> float:
     :param y_pred: Estimated target values.
     :return: A non-negative floating point value (the best value is 0.0).
     """
+    from sklearn.metrics import mean_squared_error as mse
     return mse(y_true, y_pred, squared=False)
 
 
@@ -67,4 +68,65 @@ def mean_absolute_error(y_true, y_pred) -> float:
     :param y_pred: Estimated target values.
     :return: A non-negative floating point value (the best value is 0.0).
     """
+    from sklearn.metrics import mean_absolute_error as mae
     return mae(y_true, y_pred)
+
+
+def crps_normal(y_true, loc, scale) -> np.ndarray:
+    """
+    Computes the continuous ranked probability score (CRPS) of normal distributions in closed form.
+
+    :param y_true: Ground truth, correct target values.
+    :param loc: Location of the estimated normal distributions.
+    :param scale: Scale of the estimated normal distributions.
+    :return: CRPS of every observation. Non-negative values, smaller values are better.
+    """
+    z = (y_true - loc) / scale
+    return scale * (z * (2 * ndtr(z) - 1) + 2 * np.exp(-0.5 * z ** 2) / np.sqrt(2 * np.pi) - 1 / np.sqrt(np.pi))
+
+
+def batch_scores(y_true, y_pred, quantiles, loc=None, scale=None) -> dict:
+    """
+    Computes all metrics for every column and quantile in one pass with NumPy broadcasting.
+
+    :param y_true: Ground truth with shape (time, column).
+    :param y_pred: Estimated quantiles with shape (time, column, quantile).
+    :param quantiles: Quantiles of the last axis of y_pred.
+    :param loc: Optional location of the estimated normal distributions with shape (time, column).
+    :param scale: Optional scale of the estimated normal distributions with shape (time, column). A scale of zero
+        describes a degenerate distribution at loc. Its CRPS is the absolute error, its NLL is not included.
+    :return: Dictionary with the pinball loss, RMSE and MAE with shape (column, quantile), the coverage fraction of
+        every pair of quantiles with shape (column, pair) and the quantile pairs. If loc and scale are given, also the
+        NLL and the CRPS with shape (column).
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    quantiles = np.asarray(quantiles, dtype=np.float64)
+
+    diff = y_true[:, :, np.newaxis] - y_pred
+    scores = {
+        "pinball": np.maximum(quantiles * diff, (quantiles - 1) * diff).mean(axis=0),
+        "rmse": np.sqrt((diff ** 2).mean(axis=0)),
+        "mae": np.abs(diff).mean(axis=0),
+    }
+
+    # Coverage of the interval between every pair of quantiles q_low < q_high
+    order = np.argsort(quantiles)
+    low, high = np.triu_indices(quantiles.shape[0], k=1)
+    low, high = order[low], order[high]
+    inside = (y_true[:, :, np.newaxis] >= y_pred[:, :, low]) & (y_true[:, :, np.newaxis] <= y_pred[:, :, high])
+    scores["coverage"] = inside.mean(axis=0)
+    scores["coverage_pairs"] = list(zip(quantiles[low], quantiles[high]))
+
+    if loc is not None and scale is not None:
+        loc = np.asarray(loc, dtype=np.float64)
+        scale = np.asarray(scale, dtype=np.float64)
+        degenerate = scale <= 0
+        safe_scale = np.where(degenerate, 1, scale)
+        z = (y_true - loc) / safe_scale
+        nll = np.where(degenerate, np.nan, 0.5 * np.log(2 * np.pi) + np.log(safe_scale) + 0.5 * z ** 2)
+        crps = np.where(degenerate, np.abs(y_true - loc), crps_normal(y_true, loc, safe_scale))
+        with np.errstate(invalid="ignore"):
+            scores["nll"] = np.nanmean(nll, axis=0)
+        scores["crps"] = crps.mean(axis=0)
+    return scores
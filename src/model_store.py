@@ -0,0 +1,86 @@
+from src._helper import hash_inputs
+import config
+
+import pickle
+import numpy as np
+from pathlib import Path
+
+
+class ModelStore:
+    """
+    Stores the fitted NGBoost models on disk, one file per column of the capacity factors. Each model is saved with a
+    key over the column name, the feature set, the hyperparameters and the training data, so a model is only reused
+    as long as none of its inputs has changed.
+    """
+
+    def __init__(self, path=None):
+        """
+        Initializes the model store.
+
+        :param path: Directory of the stored models. If not defined, the path is loaded from the config.
+        """
+        self.path = Path(config.paths["models"] if path is None else path)
+
+    @staticmethod
+    def model_key(col_name: str, features: list, params: dict, X: np.ndarray, Y: np.ndarray) -> str:
+        """
+        Computes the key of a model.
+
+        :param col_name: column name of the capfacts .csv file
+        :param features: names of the features
+        :param params: hyperparameters of the model and the training
+        :param X: features of the column with shape (n_samples, n_features)
+        :param Y: capacity factors of the column
+        :return: key of the model
+        """
+        return hash_inputs(arrays=[X, Y], values=[col_name, features, sorted(params.items())])
+
+    def _model_file(self, col_name: str) -> Path:
+        return self.path / (col_name.replace(" ", "_") + ".pkl")
+
+    def load(self, col_name: str, key=None):
+        """
+        Loads the stored model of a column.
+
+        :param col_name: column name of the capfacts .csv file
+        :param key: Expected key of the model. If defined, a model with a different key is not returned.
+        :return: Dictionary with the key, the model, best_val_loss_itr and the features. None if there is no valid model.
+        """
+        model_file = self._model_file(col_name)
+        if not model_file.is_file():
+            return None
+        with open(model_file, "rb") as f:
+            entry = pickle.load(f)
+        if key is not None and entry["key"] != key:
+            return None
+        return entry
+
+    def load_all(self) -> dict:
+        """
+        Loads all stored models.
+
+        :return: Dictionary of the column names and the stored entries, see load
+        """
+        entries = {}
+        for model_file in sorted(self.path.glob("*.pkl")):
+            with open(model_file, "rb") as f:
+                entry = pickle.load(f)
+            entries[entry.get("col_name", model_file.stem.replace("_", " "))] = entry
+        return entries
+
+    def save(self, col_name: str, key: str, model, best_val_loss_itr, features: list, **kwargs):
+        """
+        Saves the model of a column and replaces the previous model of this column.
+
+        :param col_name: column name of the capfacts .csv file
+        :param key: key of the model
+        :param model: fitted NGBRegressor
+        :param best_val_loss_itr: iteration with the best validation loss, None if no validation data was used
+        :param features: names of the features
+        :param kwargs: Additional values stored with the model
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        entry = dict(key=key, model=model, best_val_loss_itr=best_val_loss_itr, features=features, col_name=col_name,
+                     **kwargs)
+        with open(self._model_file(col_name), "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
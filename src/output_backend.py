@@ -0,0 +1,203 @@
+from src.forecast_result import ForecastResult
+from src.telemetry import get_logger
+import config
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+logger = get_logger(__name__)
+
+
+class OutputBackend(ABC):
+    """
+    Base class of the formats in which the predicted quantiles are saved.
+    """
+
+    def __init__(self, output_dir=None):
+        """
+        Initializes the backend.
+
+        :param output_dir: Directory of the output files. If not defined, the result path of the config is used.
+        """
+        self.output_dir = Path(config.result_path if output_dir is None else output_dir)
+
+    @abstractmethod
+    def save(self, forecast_result: ForecastResult, quantiles: list):
+        """
+        Saves the given quantiles of the predicted distributions.
+
+        :param forecast_result: predicted distributions of all columns
+        :param quantiles: quantiles that are saved
+        """
+
+    @abstractmethod
+    def append(self, forecast_result: ForecastResult, quantiles: list):
+        """
+        Appends the given quantiles of the predicted distributions of new snapshots to the saved quantiles.
+
+        :param forecast_result: predicted distributions of the new snapshots, with the columns of the saved quantiles
+        :param quantiles: quantiles that are saved
+        """
+
+    @abstractmethod
+    def read(self, clipped=False) -> pd.DataFrame:
+        """
+        Reads the saved quantiles.
+
+        :param clipped: True to clip the quantiles to the bounds defined in the config
+        :return: DataFrame with one row per quantile and snapshot and one column per region and energy type
+        """
+
+
+class CsvBackend(OutputBackend):
+    """
+    Saves every quantile as two .csv files, the raw and the clipped prediction. Kept for compatibility.
+    """
+
+    def save(self, forecast_result: ForecastResult, quantiles: list):
+        for q in quantiles:
+            self.save_frame(forecast_result.to_frame(q), q)
+
+    def save_frame(self, result: pd.DataFrame, q):
+        """
+        Saves the raw and the clipped prediction of a single quantile. The given DataFrame is not changed.
+
+        :param result: prediction results for a single quantile
+        :param q: quantile for the file name
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        output_file = self.output_dir / ("capfacts_pred_q" + str(int(q * 100)) + ".csv")
+        result.to_csv(output_file)
+        logger.info("Finished regression for q = %s. Saved results to: %s", q, output_file)
+
+        cols_num = result.select_dtypes(np.number).columns
+        clipped = result.copy()
+        clipped[cols_num] = clipped[cols_num].clip(lower=config.clip_lower, upper=config.clip_upper)
+
+        output_file = self.output_dir / ("capfacts_pred_q" + str(int(q * 100)) + "_clipped.csv")
+        clipped.to_csv(output_file)
+        logger.info("Finished regression for q = %s. Saved the clipped results to: %s", q, output_file)
+
+    def append(self, forecast_result: ForecastResult, quantiles: list):
+        for q in quantiles:
+            for clipped, suffix in [(False, ".csv"), (True, "_clipped.csv")]:
+                output_file = self.output_dir / ("capfacts_pred_q" + str(int(q * 100)) + suffix)
+                frame = forecast_result.to_frame(q, clipped)
+                # Continue the row index of the saved file
+                frame.index += len(pd.read_csv(output_file, usecols=[0]))
+                frame.to_csv(output_file, mode="a", header=False)
+            logger.info("Appended %s snapshots for q = %s to: %s", forecast_result.dataset.sizes["snapshot"], q,
+                        self.output_dir)
+
+    def read(self, clipped=False) -> pd.DataFrame:
+        suffix = "_clipped.csv" if clipped else ".csv"
+        frames = {}
+        for output_file in sorted(self.output_dir.glob("capfacts_pred_q*" + suffix)):
+            name = output_file.name[len("capfacts_pred_q"):-len(suffix)]
+            if name.isdigit():
+                frames[int(name) / 100] = pd.read_csv(output_file, index_col=0).set_index("snapshot")
+        if not frames:
+            raise FileNotFoundError("No saved quantiles capfacts_pred_q*" + suffix + " in " + str(self.output_dir))
+        return pd.concat(frames, names=["quantile", "snapshot"])
+
+
+class ParquetBackend(OutputBackend):
+    """
+    Saves all quantiles as float32 into a single Parquet file with the quantile as additional index level. The clipped
+    view is computed when the file is read.
+    """
+
+    output_file = "capfacts_pred_quantiles.parquet"
+
+    def save(self, forecast_result: ForecastResult, quantiles: list):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        values = forecast_result.quantile(quantiles).astype(np.float32).transpose("quantile", "snapshot", "column")
+        index = pd.MultiIndex.from_product([values["quantile"].values, values["snapshot"].values],
+                                           names=["quantile", "snapshot"])
+        frame = pd.DataFrame(values.values.reshape(-1, values.sizes["column"]), index=index,
+                             columns=values["column"].values)
+        frame.to_parquet(self.output_dir / self.output_file)
+        logger.info("Finished regression for q = %s. Saved results to: %s", quantiles,
+                    self.output_dir / self.output_file)
+
+    def append(self, forecast_result: ForecastResult, quantiles: list):
+        # A Parquet file cannot be extended in place, the file is rewritten with the new snapshots
+        values = forecast_result.quantile(quantiles).astype(np.float32).transpose("quantile", "snapshot", "column")
+        index = pd.MultiIndex.from_product([values["quantile"].values, values["snapshot"].values],
+                                           names=["quantile", "snapshot"])
+        frame = pd.DataFrame(values.values.reshape(-1, values.sizes["column"]), index=index,
+                             columns=values["column"].values)
+        frame = pd.concat([pd.read_parquet(self.output_dir / self.output_file), frame]).sort_index()
+        frame.to_parquet(self.output_dir / self.output_file)
+        logger.info("Appended %s snapshots to: %s", values.sizes["snapshot"], self.output_dir / self.output_file)
+
+    def read(self, clipped=False) -> pd.DataFrame:
+        frame = pd.read_parquet(self.output_dir / self.output_file)
+        if clipped:
+            frame = frame.clip(lower=config.clip_lower, upper=config.clip_upper)
+        return frame
+
+
+class ZarrBackend(OutputBackend):
+    """
+    Saves all quantiles as float32 into a single Zarr store with the dimensions (quantile, snapshot, column). The
+    clipped view is computed when the store is read.
+    """
+
+    output_file = "capfacts_pred_quantiles.zarr"
+
+    def save(self, forecast_result: ForecastResult, quantiles: list):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        values = forecast_result.quantile(quantiles).astype(np.float32).transpose("quantile", "snapshot", "column")
+        values.to_dataset(name="capfacs").to_zarr(self.output_dir / self.output_file, mode="w")
+        logger.info("Finished regression for q = %s. Saved results to: %s", quantiles,
+                    self.output_dir / self.output_file)
+
+    def append(self, forecast_result: ForecastResult, quantiles: list):
+        values = forecast_result.quantile(quantiles).astype(np.float32).transpose("quantile", "snapshot", "column")
+        values.to_dataset(name="capfacs").to_zarr(self.output_dir / self.output_file, append_dim="snapshot")
+        logger.info("Appended %s snapshots to: %s", values.sizes["snapshot"], self.output_dir / self.output_file)
+
+    def read_dataarray(self, clipped=False) -> xr.DataArray:
+        """
+        Reads the saved quantiles lazily.
+
+        :param clipped: True to clip the quantiles to the bounds defined in the config
+        :return: quantiles with dimensions (quantile, snapshot, column)
+        """
+        values = xr.open_zarr(self.output_dir / self.output_file)["capfacs"]
+        if clipped:
+            values = values.clip(config.clip_lower, config.clip_upper)
+        return values
+
+    def read(self, clipped=False) -> pd.DataFrame:
+        values = self.read_dataarray(clipped)
+        return values.to_series().unstack("column")
+
+
+"""
+Available output formats of the predicted quantiles
+"""
+output_backends = {
+    "csv": CsvBackend,
+    "parquet": ParquetBackend,
+    "zarr": ZarrBackend
+}
+
+
+def get_output_backend(output_format=None, output_dir=None) -> OutputBackend:
+    """
+    Returns the backend of the given output format.
+
+    :param output_format: "csv", "parquet" or "zarr". If not defined, the format is loaded from the config.
+    :param output_dir: Directory of the output files. If not defined, the result path of the config is used.
+    :return: the output backend
+    """
+    output_format = config.output_format if output_format is None else output_format
+    if output_format not in output_backends:
+        raise ValueError("Unknown output format " + str(output_format) + ". Use one of " + str(list(output_backends)))
+    return output_backends[output_format](output_dir)
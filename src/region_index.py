@@ -0,0 +1,175 @@
+from src._helper import hash_inputs
+from src.telemetry import get_logger
+import config
+
+import numpy as np
+import geopandas as gpd
+from pathlib import Path
+from scipy import sparse
+
+logger = get_logger(__name__)
+
+
+class RegionIndex:
+    """
+    Stores the onshore and offshore region of every grid cell of the era5 dataset. The index is cached on disk and
+    keyed by a hash of the shapefiles and the grid coordinates, so a changed input never reuses a stale index.
+    """
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, labels_onshore: np.ndarray, labels_offshore: np.ndarray):
+        """
+        Initializes the index.
+
+        :param x: x coordinates of the grid
+        :param y: y coordinates of the grid
+        :param labels_onshore: positional index of the onshore region for every grid cell (y, x), -1 if none
+        :param labels_offshore: positional index of the offshore region for every grid cell (y, x), -1 if none
+        """
+        self.x = x
+        self.y = y
+        self.labels_onshore = labels_onshore
+        self.labels_offshore = labels_offshore
+
+    @staticmethod
+    def cache_file(x: np.ndarray, y: np.ndarray) -> Path:
+        """
+        Returns the path of the cached index for the given grid and the shapefiles defined in the config file.
+
+        :param x: x coordinates of the grid
+        :param y: y coordinates of the grid
+        :return: path of the cache file
+        """
+        key = hash_inputs(files=[config.paths["onshore_shape"], config.paths["offshore_shape"]], arrays=[x, y])
+        return Path(config.paths["cache"]) / ("region_index_" + key + ".npz")
+
+    @classmethod
+    def create(cls, x: np.ndarray, y: np.ndarray, gdf_onshore: gpd.GeoDataFrame, gdf_offshore: gpd.GeoDataFrame):
+        """
+        Assigns all grid cells to the regions with a spatial join.
+
+        :param x: x coordinates of the grid
+        :param y: y coordinates of the grid
+        :param gdf_onshore: onshore regions
+        :param gdf_offshore: offshore regions
+        :return: the new index
+        """
+        # Row-major order (y outer, x inner) keeps the same point order as the pointwise mapping
+        grid_x, grid_y = np.meshgrid(x, y)
+        points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(grid_x.ravel(), grid_y.ravel()), crs=gdf_onshore.crs)
+
+        labels_onshore = label_points(points, gdf_onshore).reshape(grid_x.shape)
+        labels_offshore = label_points(points, gdf_offshore).reshape(grid_x.shape)
+        return cls(x, y, labels_onshore, labels_offshore)
+
+    @classmethod
+    def load(cls, x: np.ndarray, y: np.ndarray):
+        """
+        Loads the cached index for the given grid.
+
+        :param x: x coordinates of the grid
+        :param y: y coordinates of the grid
+        :return: the cached index, None if there is no valid index for the current inputs
+        """
+        cache_file = cls.cache_file(x, y)
+        if not cache_file.is_file():
+            return None
+        with np.load(cache_file) as cached:
+            return cls(x, y, cached["labels_onshore"], cached["labels_offshore"])
+
+    def save(self):
+        """
+        Saves the index to the cache directory defined in the config file.
+        """
+        cache_file = self.cache_file(self.x, self.y)
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(cache_file, labels_onshore=self.labels_onshore, labels_offshore=self.labels_offshore)
+
+    @classmethod
+    def load_or_create(cls, x: np.ndarray, y: np.ndarray, gdf_onshore: gpd.GeoDataFrame,
+                       gdf_offshore: gpd.GeoDataFrame):
+        """
+        Loads the cached index or creates and caches it if the shapefiles or the grid have changed.
+
+        :param x: x coordinates of the grid
+        :param y: y coordinates of the grid
+        :param gdf_onshore: onshore regions
+        :param gdf_offshore: offshore regions
+        :return: the index
+        """
+        index = cls.load(x, y)
+        if index is not None:
+            logger.info("Loaded cached region index from %s", cls.cache_file(x, y))
+            return index
+
+        index = cls.create(x, y, gdf_onshore, gdf_offshore)
+        index.save()
+        logger.info("Saved region index to %s", cls.cache_file(x, y))
+        return index
+
+    def coordinates(self, n_onshore: int, n_offshore: int) -> (list, list):
+        """
+        Returns the coordinates that lie within the regions.
+
+        :param n_onshore: number of onshore regions
+        :param n_offshore: number of offshore regions
+        :return: Lists of all onshore and offshore regions and the coordinates that lies within the region.
+        """
+        grid_x, grid_y = np.meshgrid(self.x, self.y)
+        regions_onshore = labels_to_coordinates(self.labels_onshore.ravel(), grid_x.ravel(), grid_y.ravel(), n_onshore)
+        regions_offshore = labels_to_coordinates(self.labels_offshore.ravel(), grid_x.ravel(), grid_y.ravel(),
+                                                 n_offshore)
+        return regions_onshore, regions_offshore
+
+    def membership_matrix(self, n_onshore: int, n_offshore: int) -> sparse.csr_matrix:
+        """
+        Returns the sparse membership matrix of the grid cells. The onshore regions are followed by the offshore
+        regions, the grid cells are flattened in row-major order (y, x).
+
+        :param n_onshore: number of onshore regions
+        :param n_offshore: number of offshore regions
+        :return: matrix of shape (n_onshore + n_offshore, n_points) that is 1 if the grid cell lies within the region
+        """
+        labels_onshore = self.labels_onshore.ravel()
+        labels_offshore = self.labels_offshore.ravel()
+        points_onshore = np.flatnonzero(labels_onshore >= 0)
+        points_offshore = np.flatnonzero(labels_offshore >= 0)
+
+        rows = np.concatenate((labels_onshore[points_onshore], n_onshore + labels_offshore[points_offshore]))
+        cols = np.concatenate((points_onshore, points_offshore))
+        data = np.ones(rows.shape[0], dtype=np.float32)
+        return sparse.csr_matrix((data, (rows, cols)), shape=(n_onshore + n_offshore, labels_onshore.shape[0]))
+
+
+def label_points(points: gpd.GeoDataFrame, gdf_regions: gpd.GeoDataFrame) -> np.ndarray:
+    """
+    Assigns each point to the first region of the shapefile that contains it.
+
+    :param points: GeoDataFrame with one point geometry per row
+    :param gdf_regions: GeoDataFrame with the region polygons
+    :return: Array with the positional index of the region for every point, -1 if the point lies in no region
+    """
+    regions = gpd.GeoDataFrame(geometry=gdf_regions.geometry.values, crs=gdf_regions.crs)
+    joined = gpd.sjoin(points.reset_index(drop=True), regions, how="inner", predicate="within")
+
+    # A point within several polygons belongs to the first one, like in the pointwise mapping
+    first_region = joined.groupby(level=0)["index_right"].min()
+
+    labels = np.full(points.shape[0], -1, dtype=np.int16)
+    labels[first_region.index.values] = first_region.values
+    return labels
+
+
+def labels_to_coordinates(labels: np.ndarray, x: np.ndarray, y: np.ndarray, n_regions: int) -> list:
+    """
+    Converts the region labels of the points into a list of coordinates per region.
+
+    :param labels: positional index of the region for every point, -1 if the point lies in no region
+    :param x: x coordinate of every point
+    :param y: y coordinate of every point
+    :param n_regions: number of regions
+    :return: A list of all the regions and the coordinates that lies within this region.
+    """
+    regions = [[] for _ in range(n_regions)]
+    for idx in np.flatnonzero(labels >= 0):
+        regions[labels[idx]].append((float(x[idx]), float(y[idx])))
+    return regions
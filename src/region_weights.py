@@ -0,0 +1,101 @@
+from src._helper import hash_inputs
+from src.telemetry import get_logger
+import config
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+import xarray as xr
+from pathlib import Path
+from scipy import sparse
+
+logger = get_logger(__name__)
+
+"""
+Equal-area projection that is used to compute the overlap of the grid cells and the regions
+"""
+equal_area_crs = "+proj=cea"
+
+
+def create_area_weights(x: np.ndarray, y: np.ndarray, gdf_onshore: gpd.GeoDataFrame, gdf_offshore: gpd.GeoDataFrame,
+                        capacity_layout: xr.DataArray = None) -> sparse.csr_matrix:
+    """
+    Computes the sparse weight matrix of the grid cells. The weight of a grid cell in a region is the fraction of the
+    cell area that lies within the region, optionally multiplied by the capacity layout of the cell.
+    The onshore regions are followed by the offshore regions, the grid cells are flattened in row-major order (y, x).
+
+    :param x: x coordinates of the grid cell centers
+    :param y: y coordinates of the grid cell centers
+    :param gdf_onshore: onshore regions
+    :param gdf_offshore: offshore regions
+    :param capacity_layout: Optional capacity of every grid cell with dimensions (y, x)
+    :return: matrix of shape (n_onshore + n_offshore, n_points) with the weight of every grid cell in each region
+    """
+    # Grid cells as rectangles around the cell centers
+    dx = np.median(np.abs(np.diff(x))) if x.shape[0] > 1 else 0.25
+    dy = np.median(np.abs(np.diff(y))) if y.shape[0] > 1 else 0.25
+    grid_x, grid_y = np.meshgrid(x, y)
+    cells = shapely.box(grid_x.ravel() - dx / 2, grid_y.ravel() - dy / 2, grid_x.ravel() + dx / 2,
+                        grid_y.ravel() + dy / 2)
+    cells = gpd.GeoDataFrame(geometry=cells, crs=gdf_onshore.crs).to_crs(equal_area_crs)
+
+    regions = pd.concat([gdf_onshore.geometry, gdf_offshore.geometry.to_crs(gdf_onshore.crs)], ignore_index=True)
+    regions = gpd.GeoDataFrame(geometry=regions, crs=gdf_onshore.crs).to_crs(equal_area_crs)
+
+    # Candidate pairs from the STRtree, the overlap is only computed for cells that intersect a region
+    pairs = gpd.sjoin(cells, regions, how="inner", predicate="intersects")
+    cell_idx = pairs.index.values
+    region_idx = pairs["index_right"].values
+    overlap = shapely.area(shapely.intersection(cells.geometry.values[cell_idx], regions.geometry.values[region_idx]))
+    weights = overlap / shapely.area(cells.geometry.values[cell_idx])
+
+    if capacity_layout is not None:
+        capacity = capacity_layout.transpose("y", "x").values.reshape(-1)
+        weights = weights * capacity[cell_idx]
+
+    nonzero = weights > 0
+    return sparse.csr_matrix((weights[nonzero], (region_idx[nonzero], cell_idx[nonzero])),
+                             shape=(regions.shape[0], cells.shape[0]))
+
+
+def area_weights_cache_file(x: np.ndarray, y: np.ndarray, capacity_layout: xr.DataArray = None) -> Path:
+    """
+    Returns the path of the cached weight matrix for the given grid, capacity layout and the shapefiles defined in
+    the config file.
+
+    :param x: x coordinates of the grid
+    :param y: y coordinates of the grid
+    :param capacity_layout: Optional capacity of every grid cell with dimensions (y, x)
+    :return: path of the cache file
+    """
+    arrays = [x, y]
+    if capacity_layout is not None:
+        arrays.append(capacity_layout.transpose("y", "x").values)
+    key = hash_inputs(files=[config.paths["onshore_shape"], config.paths["offshore_shape"]], arrays=arrays)
+    return Path(config.paths["cache"]) / ("region_weights_" + key + ".npz")
+
+
+def load_or_create_area_weights(x: np.ndarray, y: np.ndarray, gdf_onshore: gpd.GeoDataFrame,
+                                gdf_offshore: gpd.GeoDataFrame, capacity_layout: xr.DataArray = None):
+    """
+    Loads the cached weight matrix or creates and caches it if the shapefiles, the grid or the capacity layout have
+    changed.
+
+    :param x: x coordinates of the grid cell centers
+    :param y: y coordinates of the grid cell centers
+    :param gdf_onshore: onshore regions
+    :param gdf_offshore: offshore regions
+    :param capacity_layout: Optional capacity of every grid cell with dimensions (y, x)
+    :return: matrix of shape (n_onshore + n_offshore, n_points) with the weight of every grid cell in each region
+    """
+    cache_file = area_weights_cache_file(x, y, capacity_layout)
+    if cache_file.is_file():
+        logger.info("Loaded cached region weights from %s", cache_file)
+        return sparse.load_npz(cache_file).tocsr()
+
+    weights = create_area_weights(x, y, gdf_onshore, gdf_offshore, capacity_layout)
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    sparse.save_npz(cache_file, weights)
+    logger.info("Saved region weights to %s", cache_file)
+    return weights
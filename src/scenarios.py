@@ -0,0 +1,164 @@
+"""
+This script generates joint scenarios of the capacity factors from the predicted distributions. The dependence between
+the columns and over time is described by a Gaussian copula with AR(1) dynamics, estimated from the residuals of the
+fitted models.
+"""
+
+from src.forecast_result import ForecastResult
+from src.telemetry import get_logger
+import config
+
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from scipy.signal import lfilter
+from scipy.special import ndtri
+
+logger = get_logger(__name__)
+
+
+class ScenarioGenerator:
+    """
+    Draws scenarios of all columns and snapshots that keep the spatial correlation between the regions and the
+    temporal autocorrelation of the forecast errors. The marginal distribution of every column and snapshot is the
+    predicted normal distribution.
+    """
+
+    def __init__(self, forecast_result: ForecastResult):
+        """
+        Initializes the generator.
+
+        :param forecast_result: Predicted distributions of all columns
+        """
+        self.forecast_result = forecast_result
+        self.columns = forecast_result.dataset["column"].values
+        self.phi = None
+        self.correlation = None
+        self.innovation_factor = None
+
+    def fit(self, capfacts: pd.DataFrame, shrinkage=config.scenario_shrinkage):
+        """
+        Estimates the copula from the residuals of the predicted distributions. The residuals are transformed to
+        normal scores by their ranks, so a miscalibrated scale does not distort the correlation. Snapshots with a
+        degenerate distribution (scale = 0, e.g. solar at night) are left out.
+
+        :param capfacts: capacity factors with the columns of the forecast result
+        :param shrinkage: Weight of the identity matrix in the estimated correlation matrix, which keeps the estimate
+            positive definite for many columns
+        :return: the generator
+        """
+        loc = self.forecast_result.dataset["loc"].transpose("snapshot", "column").values
+        scale = self.forecast_result.dataset["scale"].transpose("snapshot", "column").values
+        degenerate = scale <= 0
+        residuals = (capfacts[self.columns].values - loc) / np.where(degenerate, 1, scale)
+        residuals = pd.DataFrame(np.where(degenerate, np.nan, residuals), columns=self.columns)
+        scores = pd.DataFrame(ndtri(residuals.rank().values / (residuals.count().values + 1)), columns=self.columns)
+
+        # Lag one autocorrelation of every column
+        phi = np.array([scores[column].autocorr(lag=1) for column in self.columns])
+        self.phi = np.clip(np.nan_to_num(phi), -0.999, 0.999)
+
+        # Pairwise correlation of the columns, made positive definite and shrunk towards the identity
+        correlation = np.nan_to_num(scores.corr(min_periods=2).values)
+        np.fill_diagonal(correlation, 1)
+        eigenvalues, eigenvectors = np.linalg.eigh(correlation)
+        correlation = (eigenvectors * np.maximum(eigenvalues, 1e-6)) @ eigenvectors.T
+        std = np.sqrt(np.diag(correlation))
+        correlation = (1 - shrinkage) * correlation / np.outer(std, std) + shrinkage * np.eye(len(self.columns))
+        self.correlation = correlation
+
+        # With z_t = phi * z_t-1 + sqrt(1 - phi²) * e_t, the innovations e_t have the correlation below, so z_t keeps
+        # the estimated correlation
+        scaling = np.sqrt(1 - self.phi ** 2)
+        innovation_covariance = correlation * (1 - np.outer(self.phi, self.phi)) / np.outer(scaling, scaling)
+        eigenvalues, eigenvectors = np.linalg.eigh(innovation_covariance)
+        self.innovation_factor = eigenvectors * np.sqrt(np.maximum(eigenvalues, 0))
+        logger.info("Estimated the copula of %s columns, mean lag one autocorrelation %s", len(self.columns),
+                    self.phi.mean())
+        return self
+
+    def sample_batch(self, n_scenarios: int, n_snapshots: int, rng: np.random.Generator, state=None) -> (np.ndarray,
+                                                                                                          np.ndarray):
+        """
+        Draws the normal scores of a batch of scenarios for consecutive snapshots.
+
+        :param n_scenarios: Number of scenarios
+        :param n_snapshots: Number of snapshots
+        :param rng: random number generator
+        :param state: Optional normal scores of the previous snapshot with shape (scenario, column). If not defined,
+            the first snapshot is drawn from the stationary distribution.
+        :return: Tuple of the normal scores with shape (scenario, snapshot, column) and the state after the last
+            snapshot
+        """
+        innovations = rng.standard_normal((n_scenarios, n_snapshots, len(self.columns))) @ self.innovation_factor.T
+        scaling = np.sqrt(1 - self.phi ** 2)
+        if state is None:
+            state = rng.standard_normal((n_scenarios, len(self.columns))) @ np.linalg.cholesky(self.correlation).T
+            # The first snapshot is the stationary draw itself
+            innovations[:, 0, :] = (state - self.phi * state) / scaling
+
+        z = np.empty_like(innovations)
+        for i in range(len(self.columns)):
+            z[:, :, i], _ = lfilter([scaling[i]], [1, -self.phi[i]], innovations[:, :, i], axis=1,
+                                    zi=self.phi[i] * state[:, i:i + 1])
+        return z, z[:, -1, :]
+
+    def sample(self, n_scenarios: int, path=None, seed=42, batch_size=config.scenario_batch,
+               time_chunk=config.scenario_time_chunk, clipped=True) -> Path:
+        """
+        Draws the scenarios and writes them to a netCDF file with the dimensions (scenario, snapshot, column). The
+        scenarios are drawn in batches of scenarios and chunks of snapshots, which are written one at a time, so the
+        memory usage is bounded by batch_size * time_chunk * columns.
+
+        :param n_scenarios: Number of scenarios
+        :param path: path of the netCDF file. If not defined, the path is loaded from the config.
+        :param seed: seed of the random numbers
+        :param batch_size: Number of scenarios that are drawn at once
+        :param time_chunk: Number of snapshots that are drawn at once
+        :param clipped: True to clip the scenarios to the bounds defined in the config
+        :return: path of the netCDF file
+        """
+        import netCDF4
+
+        if self.innovation_factor is None:
+            raise ValueError("The copula is not estimated yet. Call fit() first.")
+
+        path = Path(config.paths["scenarios"] if path is None else path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        loc = self.forecast_result.dataset["loc"].transpose("snapshot", "column").values
+        scale = self.forecast_result.dataset["scale"].transpose("snapshot", "column").values
+        snapshots = pd.DatetimeIndex(self.forecast_result.dataset["snapshot"].values)
+        n_snapshots = len(snapshots)
+        rng = np.random.default_rng(seed)
+
+        with netCDF4.Dataset(path, "w") as dataset:
+            dataset.createDimension("scenario", n_scenarios)
+            dataset.createDimension("snapshot", n_snapshots)
+            dataset.createDimension("column", len(self.columns))
+            dataset.createVariable("scenario", "i4", ("scenario",))[:] = np.arange(n_scenarios)
+            snapshot = dataset.createVariable("snapshot", "f8", ("snapshot",))
+            snapshot.units = "hours since 1970-01-01 00:00:00"
+            snapshot[:] = (snapshots - pd.Timestamp("1970-01-01")) / pd.Timedelta(hours=1)
+            column = dataset.createVariable("column", str, ("column",))
+            for i, name in enumerate(self.columns):
+                column[i] = name
+            capfacs = dataset.createVariable("capfacs", "f4", ("scenario", "snapshot", "column"), zlib=True,
+                                             chunksizes=(min(batch_size, n_scenarios), min(time_chunk, n_snapshots),
+                                                         len(self.columns)))
+            capfacs.description = "Scenarios of the capacity factors from a Gaussian copula with AR(1) dynamics"
+
+            for first_scenario in range(0, n_scenarios, batch_size):
+                n_batch = min(batch_size, n_scenarios - first_scenario)
+                state = None
+                for start in range(0, n_snapshots, time_chunk):
+                    stop = min(start + time_chunk, n_snapshots)
+                    z, state = self.sample_batch(n_batch, stop - start, rng, state)
+                    values = loc[start:stop] + scale[start:stop] * z
+                    if clipped:
+                        values = values.clip(config.clip_lower, config.clip_upper)
+                    capfacs[first_scenario:first_scenario + n_batch, start:stop, :] = values.astype(np.float32)
+                logger.info("Sampled scenarios %s to %s of %s", first_scenario + 1, first_scenario + n_batch,
+                            n_scenarios)
+
+        logger.info("Saved the scenarios to: %s", path)
+        return path
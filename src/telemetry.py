@@ -0,0 +1,233 @@
+"""
+This script provides the logging and the run telemetry of the workflow. The telemetry records the wall time and CPU
+time of every stage, per column where the stage belongs to a column, and the peak memory of the process at the end of
+the stage, together with values like the used boosting iterations and the scores. It is enabled in the config and
+saved as JSON and .csv report.
+"""
+
+import config
+
+import cProfile
+import csv
+import json
+import logging
+import marshal
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Returns the logger of a module. The first call configures the parent logger of the package with the level and
+    optional log file of the config.
+
+    :param name: name of the module, e.g. __name__
+    :return: the logger
+    """
+    root = logging.getLogger(name.split(".")[0])
+    if not root.handlers:
+        configure_logging(root.name)
+    return logging.getLogger(name)
+
+
+def configure_logging(name="src", level=None, log_file=None):
+    """
+    Configures the handlers and the level of the package logger.
+
+    :param name: name of the package logger
+    :param level: Log level, e.g. "INFO" or "DEBUG". If not defined, the level is loaded from the config.
+    :param log_file: Optional file the log is written to in addition to stdout. If not defined, the file is loaded
+        from the config.
+    """
+    root = logging.getLogger(name)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s", "%H:%M:%S")
+    handlers = [logging.StreamHandler(sys.stdout)]
+    log_file = config.log_file if log_file is None else log_file
+    if log_file:
+        Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        root.addHandler(handler)
+    root.setLevel(config.log_level if level is None else level)
+    root.propagate = False
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident memory of the process in MB since its start, None if it is not available. It is not the
+    peak of a single stage.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def profiler_active() -> bool:
+    """
+    Returns True if a profiler of the thread is active. Only one profiler can be active at a time: the Python 3.12+
+    cProfile raises an error if another one is enabled, older versions replace the active profiler.
+    """
+    monitoring = getattr(sys, "monitoring", None)
+    if monitoring is not None:
+        return monitoring.get_tool(monitoring.PROFILER_ID) is not None
+    return sys.getprofile() is not None
+
+
+def merge_stats(target: dict, source: dict):
+    """
+    Adds the profile statistics of source to target.
+
+    :param target: statistics of a profiler, see cProfile.Profile.create_stats
+    :param source: statistics that are added
+    """
+    for func, stats in source.items():
+        target[func] = pstats.add_func_stats(target[func], stats) if func in target else stats
+
+
+class Telemetry:
+    """
+    Records the stages and column values of a run. If disabled, the stages are not measured.
+    """
+
+    def __init__(self, enabled=config.telemetry, profile=config.profile):
+        """
+        Initializes the telemetry.
+
+        :param enabled: True to record the stages and values
+        :param profile: True to profile the stages with cProfile, this also enables the telemetry. Only the outermost
+            stages are profiled, their profiles include the nested stages. The profiles are saved as .prof files next
+            to the report and can be read with pstats or snakeviz.
+        """
+        self.enabled = enabled or profile
+        self.profile = profile
+        self.stages = []
+        self.columns = {}
+        # Statistics of the profiled stages by stage name and column
+        self.profiles = {}
+
+    @contextmanager
+    def stage(self, name: str, column=None):
+        """
+        Measures a stage of the workflow.
+
+        :param name: name of the stage
+        :param column: Optional column the stage belongs to
+        """
+        if not self.enabled:
+            yield
+            return
+
+        # A nested stage is part of the profile of the outer stage
+        profiler = cProfile.Profile() if self.profile and not profiler_active() else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.create_stats()
+                merge_stats(self.profiles.setdefault((name, column), {}), profiler.stats)
+            self.stages.append(dict(stage=name, column=column, wall_time=time.perf_counter() - wall,
+                                    cpu_time=time.process_time() - cpu, process_peak_rss_mb=peak_rss_mb()))
+
+    def record(self, column: str, **values):
+        """
+        Records values of a column, e.g. the used boosting iterations or the scores.
+
+        :param column: column name of the capfacts .csv file
+        :param values: recorded values
+        """
+        if self.enabled:
+            self.columns.setdefault(column, {}).update(values)
+
+    def pop_column(self, column: str) -> dict:
+        """
+        Removes the records of a column, so they can be returned from a worker process and merged into the telemetry
+        of the main process.
+
+        :param column: column name of the capfacts .csv file
+        :return: Dictionary with the stages, values and profile statistics of the column, None if the telemetry is
+            disabled
+        """
+        if not self.enabled:
+            return None
+        stages = [stage for stage in self.stages if stage["column"] == column]
+        self.stages = [stage for stage in self.stages if stage["column"] != column]
+        profiles = {key: self.profiles.pop(key) for key in list(self.profiles) if key[1] == column}
+        return dict(stages=stages, values=self.columns.pop(column, {}), profiles=profiles)
+
+    def merge(self, column: str, records: dict):
+        """
+        Adds the records of a column that were returned by pop_column.
+
+        :param column: column name of the capfacts .csv file
+        :param records: records of the column
+        """
+        if self.enabled and records is not None:
+            self.stages.extend(records["stages"])
+            self.record(column, **records["values"])
+            for key, stats in records.get("profiles", {}).items():
+                merge_stats(self.profiles.setdefault(key, {}), stats)
+
+    def save(self, path=None) -> Path:
+        """
+        Saves the report of the run as JSON file and the stages and column values as .csv files, and clears the
+        records.
+
+        :param path: Directory of the report. If not defined, the path is loaded from the config.
+        :return: path of the JSON report, None if the telemetry is disabled
+        """
+        if not self.enabled:
+            return None
+
+        path = Path(config.paths["telemetry"] if path is None else path)
+        path.mkdir(parents=True, exist_ok=True)
+        run = "run_" + datetime.now().strftime("%Y%m%d_%H%M%S")
+        report = dict(run=run, process_peak_rss_mb=peak_rss_mb(), stages=self.stages, columns=self.columns)
+        with open(path / (run + ".json"), "w") as f:
+            json.dump(report, f, indent=2, default=float)
+
+        with open(path / (run + "_stages.csv"), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["stage", "column", "wall_time", "cpu_time",
+                                                   "process_peak_rss_mb"])
+            writer.writeheader()
+            writer.writerows(self.stages)
+
+        fieldnames = sorted({key for values in self.columns.values() for key in values})
+        with open(path / (run + "_columns.csv"), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["column"] + fieldnames)
+            writer.writeheader()
+            writer.writerows([dict(column=column, **values) for column, values in self.columns.items()])
+
+        for (name, column), stats in self.profiles.items():
+            name = name if column is None else name + "_" + column
+            # The format of cProfile.Profile.dump_stats
+            with open(path / (run + "_" + name.replace(" ", "_") + ".prof"), "wb") as f:
+                marshal.dump(stats, f)
+
+        self.stages, self.columns, self.profiles = [], {}, {}
+        get_logger(__name__).info("Saved the telemetry report to: %s", path / (run + ".json"))
+        return path / (run + ".json")
+
+
+"""
+Telemetry of the process, enabled in the config
+"""
+telemetry = Telemetry()
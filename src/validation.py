@@ -0,0 +1,75 @@
+"""
+This script includes the splits of the hourly data into training and validation data and the early stopping rule.
+"""
+
+import numpy as np
+
+
+def split_train_validation(X, Y, test_size=0.25, method="random", block_length=168, random_state=42,
+                           positions=None, n_time=None):
+    """
+    Splits the data into training and validation data. Neighbouring hours are almost identical, so a random split
+    leaks information into the validation data. The blocked split holds out randomly chosen contiguous blocks of
+    hours, the rolling split holds out the last hours (rolling origin).
+
+    :param X: features with shape (n_samples, n_features) in chronological order
+    :param Y: targets in chronological order
+    :param test_size: Ratio between training and validation data
+    :param method: "random", "blocked" or "rolling"
+    :param block_length: Number of hours of a block of the blocked split, e.g. 24 for days or 168 for weeks
+    :param random_state: Random state to allow comparability of results
+    :param positions: Optional positions of the samples in the hourly series, if some hours are left out, e.g. the
+        night hours of the solar models. The blocks are built on these positions, so a block still covers block_length
+        hours and not block_length samples.
+    :param n_time: Optional length of the hourly series if the samples of several regions are stacked, see
+        Forecast.forecast_regression_global. The blocked and rolling splits are built on the hour of the series
+        (position % n_time), so the same hours are held out for every region and the validation data of one region
+        is not in the training data of a correlated region.
+    :return: X_train, X_val, Y_train, Y_val
+    """
+    from sklearn.model_selection import train_test_split
+
+    if method == "random":
+        return train_test_split(X, Y, test_size=test_size, random_state=random_state)
+
+    n_samples = Y.shape[0]
+    hours = np.arange(n_samples) if positions is None else np.asarray(positions)
+    if n_time is not None:
+        hours = hours % n_time
+    if method == "rolling":
+        if n_time is None:
+            val_mask = np.arange(n_samples) >= n_samples - int(np.ceil(n_samples * test_size))
+        else:
+            val_mask = hours >= n_time - int(np.ceil(n_time * test_size))
+    elif method == "blocked":
+        blocks = hours // block_length
+        block_ids = np.unique(blocks)
+        rng = np.random.default_rng(random_state)
+        val_blocks = rng.choice(block_ids, size=max(1, int(round(len(block_ids) * test_size))), replace=False)
+        val_mask = np.isin(blocks, val_blocks)
+    else:
+        raise ValueError("Unknown split method " + str(method) + ". Use random, blocked or rolling.")
+
+    return X[~val_mask], X[val_mask], Y[~val_mask], Y[val_mask]
+
+
+def best_iteration(val_losses: np.ndarray, patience=2, tol=0.0) -> int:
+    """
+    Determines the number of boosting iterations with early stopping. An iteration only counts as improvement if it
+    lowers the best validation loss by more than the tolerance. Boosting stops after patience iterations without
+    improvement.
+
+    :param val_losses: validation loss after 1, 2, ..., n iterations
+    :param patience: Number of iterations without improvement before stopping
+    :param tol: Minimum decrease of the validation loss that counts as improvement
+    :return: number of iterations with the best validation loss
+    """
+    best_loss, best_itr, since_best = np.inf, 0, 0
+    for itr, loss in enumerate(val_losses):
+        if loss < best_loss - tol:
+            best_loss, best_itr, since_best = loss, itr + 1, 0
+        else:
+            since_best += 1
+            if since_best >= patience:
+                break
+    return best_itr
@@ -0,0 +1,93 @@
+"""
+Shared fixtures of the tests: a tiny synthetic era5 grid with a few square regions, so the tests run without the real
+input data.
+"""
+
+from src.era5_mapper import Era5Mapper, era5_variables
+from src.features import Feature
+from src.forecast_result import ForecastResult
+import config
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+
+@pytest.fixture
+def tmp_paths(tmp_path, monkeypatch):
+    """
+    Points the cache and result paths of the config to a temporary directory.
+    """
+    monkeypatch.setitem(config.paths, "cache", str(tmp_path / "cache") + "/")
+    monkeypatch.setitem(config.paths, "era5_regions", str(tmp_path / "era5-regions.nc"))
+    monkeypatch.setitem(config.paths, "capfacs", str(tmp_path / "capfacs.csv"))
+    for name, file in [("models", "models"), ("forecast_dist", "capfacts_pred_dist.nc"), ("scores", "scores.csv"),
+                       ("iterations", "iterations.csv"), ("telemetry", "telemetry"),
+                       ("scenarios", "capfacts_scenarios.nc")]:
+        monkeypatch.setitem(config.paths, name, str(tmp_path / "results" / file))
+    monkeypatch.setattr(config, "result_path", str(tmp_path / "results"))
+    return tmp_path
+
+
+@pytest.fixture
+def synthetic_mapper(tmp_paths, monkeypatch):
+    """
+    Era5Mapper over a 9 x 5 grid and 240 hours with three onshore and one offshore square region. Many grid points lie
+    on the region boundaries, one onshore region overlaps the first two and some values are missing.
+    """
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 4, 9)
+    y = np.linspace(2, 0, 5)
+    times = pd.date_range("2013-06-01", periods=240, freq="h")
+
+    data_vars = {}
+    for feature in Feature:
+        if feature == Feature.HEIGHT:
+            data_vars[era5_variables[feature]] = (["y", "x"], rng.uniform(0, 500, (5, 9)).astype(np.float32))
+        else:
+            values = rng.standard_normal((240, 5, 9)).astype(np.float32)
+            values[rng.random(values.shape) < 0.05] = np.nan
+            data_vars[era5_variables[feature]] = (["time", "y", "x"], values)
+
+    mapper = Era5Mapper.__new__(Era5Mapper)
+    mapper.time_chunk = 100
+    mapper.era_data = xr.Dataset(data_vars, coords=dict(time=times, y=y, x=x))
+    mapper.gdf_onshore = gpd.GeoDataFrame({"name": ["AT0 0", "AT0 1", "AT0 2"]},
+                                          geometry=[box(0, 0, 1, 2), box(1, 0, 2, 2), box(0.25, 0.25, 1.75, 1.75)],
+                                          crs="EPSG:4326")
+    mapper.gdf_offshore = gpd.GeoDataFrame({"name": ["AT0 0"]}, geometry=[box(2, 0, 4, 1)], crs="EPSG:4326")
+    for name, gdf in [("onshore_shape", mapper.gdf_onshore), ("offshore_shape", mapper.gdf_offshore)]:
+        mapper_path = tmp_paths / (name + ".geojson")
+        gdf.to_file(mapper_path, driver="GeoJSON")
+        monkeypatch.setitem(config.paths, name, str(mapper_path))
+    return mapper
+
+
+@pytest.fixture
+def forecast_result():
+    """
+    Predicted distributions of two columns over one day, together with the loc and scale arrays of the columns.
+    """
+    rng = np.random.default_rng(0)
+    snapshots = pd.date_range("2013-01-01", periods=24, freq="h")
+    columns = {name: (rng.uniform(0, 1, 24), rng.uniform(0, 0.1, 24)) for name in ["AT0 0 onwind", "AT0 0 solar"]}
+    return ForecastResult.from_columns(snapshots, columns), columns
+
+
+@pytest.fixture
+def forecast_inputs(synthetic_mapper, tmp_paths):
+    """
+    Reduced era5 dataset of the synthetic grid and capacity factors that depend on its features, written to the paths
+    of the config.
+    """
+    from benchmarks.synthetic_data import write_capfacts
+
+    weights = synthetic_mapper.get_region_index(use_cache=False).membership_matrix(3, 1)
+    synthetic_mapper._create_era5_region_data_grouped(weights, 1, config.paths["era5_regions"])
+    with xr.open_dataset(config.paths["era5_regions"]) as era5_regions:
+        columns = write_capfacts(config.paths["capfacs"], era5_regions.fillna(0))
+    return columns
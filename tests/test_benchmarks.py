@@ -0,0 +1,35 @@
+from benchmarks.run import StageTimer, compare_reports
+
+import time
+
+
+def test_stage_timer_reports_cold_and_warm_runs():
+    cache = {}
+
+    def cached_stage():
+        if "value" not in cache:
+            time.sleep(0.05)
+            cache["value"] = 1
+        return cache["value"]
+
+    timer = StageTimer(repeat=3)
+    assert timer.run("cached", cached_stage) == 1
+    stage = timer.stages["cached"]
+    assert len(stage["runs"]) == 3
+    assert stage["cold_seconds"] == stage["runs"][0] >= 0.05
+    assert stage["warm_seconds"] == min(stage["runs"][1:]) < 0.05
+
+
+def test_stage_timer_without_repeat_has_no_warm_run():
+    timer = StageTimer()
+    timer.run("single", lambda: None)
+    assert timer.stages["single"]["warm_seconds"] is None
+
+
+def test_compare_reports_skips_missing_warm_runs(capsys):
+    baseline = {"parameters": {}, "stages": {"fit": {"cold_seconds": 2.0, "warm_seconds": None}}}
+    report = {"parameters": {}, "stages": {"fit": {"cold_seconds": 1.0, "warm_seconds": 0.5}}}
+    compare_reports(report, baseline)
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2
+    assert lines[1].split()[:2] == ["fit", "cold"]
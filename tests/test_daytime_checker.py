@@ -0,0 +1,35 @@
+from src.daytime_checker import DaytimeChecker, solar_elevation
+
+import numpy as np
+import pandas as pd
+
+
+def test_solar_elevation_agrees_with_ephem():
+    # is_daytime does not use the shapefiles
+    checker = DaytimeChecker.__new__(DaytimeChecker)
+    lon = np.array([10.0, -3.5, 24.9, 2.0])
+    lat = np.array([50.0, 40.4, 60.2, 1.0])
+    times = pd.date_range("2013-01-01", "2013-12-31", freq="29h")
+    elevation = solar_elevation(times, lon, lat)
+    mask = elevation > -0.833
+
+    expected = np.array([[checker.is_daytime(x, y, time.to_pydatetime()) for time in times] for x, y in zip(lon, lat)])
+    mismatch = mask != expected
+    # The NOAA approximation differs from ephem by a few arc minutes, so only samples right at sunrise or sunset
+    # may disagree
+    assert mismatch.sum() <= 0.005 * mask.size
+    assert (np.abs(elevation[mismatch] + 0.833) < 0.5).all()
+
+
+def test_daylight_mask_of_the_regions(synthetic_mapper):
+    checker = DaytimeChecker()
+    times = pd.date_range("2013-06-01", periods=48, freq="h")
+    mask = checker.daylight_mask(times, use_cache=False)
+    centroids = checker.get_centroids()
+
+    assert list(mask["region"].values) == list(centroids.index)
+    expected = solar_elevation(times, centroids["lon"].values, centroids["lat"].values) > -0.833
+    np.testing.assert_array_equal(mask.values, expected)
+    # Close to the equator and the prime meridian the day lasts about 12 hours around noon UTC
+    assert mask.values[:, 12].all() and not mask.values[:, 0].any()
+    assert (mask.values[:, :24].sum(axis=1) >= 11).all() and (mask.values[:, :24].sum(axis=1) <= 13).all()
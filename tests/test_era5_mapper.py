@@ -0,0 +1,54 @@
+from src.era5_mapper import region_mean
+from src.features import Feature
+from src.region_index import RegionIndex
+import config
+
+import numpy as np
+import xarray as xr
+from scipy import sparse
+
+
+def test_bulk_mapping_matches_pointwise(synthetic_mapper):
+    bulk = synthetic_mapper._map_coordinates_to_regions_bulk(use_cache=False)
+    pointwise = synthetic_mapper._map_coordinates_to_regions_pointwise()
+
+    assert bulk == pointwise
+    # Points on the shared edge of A and B are in neither, the overlapping region C only gets these points
+    assert (1.0, 1.0) not in bulk[0][0] + bulk[0][1]
+    assert sorted(bulk[0][2]) == [(1.0, 0.5), (1.0, 1.0), (1.0, 1.5)]
+
+
+def test_cached_region_index_matches_created(synthetic_mapper):
+    created = synthetic_mapper.get_region_index(use_cache=True)
+    cached = RegionIndex.load(created.x, created.y)
+
+    assert cached is not None
+    assert (cached.labels_onshore == created.labels_onshore).all()
+    assert (cached.labels_offshore == created.labels_offshore).all()
+
+
+def test_grouped_reduction_matches_pointwise_mean(synthetic_mapper, tmp_paths):
+    regions_onshore, regions_offshore = synthetic_mapper._map_coordinates_to_regions_pointwise()
+    synthetic_mapper._create_era5_region_data(regions_onshore, regions_offshore)
+    weights = synthetic_mapper.get_region_index(use_cache=False).membership_matrix(3, 1)
+    synthetic_mapper._create_era5_region_data_grouped(weights, 2, tmp_paths / "era5-regions-grouped.nc")
+
+    with xr.open_dataset(config.paths["era5_regions"]) as pointwise, \
+            xr.open_dataset(tmp_paths / "era5-regions-grouped.nc") as grouped:
+        assert list(grouped["region"].values) == list(pointwise["region"].values)
+        assert (grouped["time"].values == pointwise["time"].values).all()
+        for feature in Feature:
+            assert grouped[feature.value].dtype == pointwise[feature.value].dtype
+            # xarray accumulates the float32 mean in float32, the grouped reduction in float64
+            np.testing.assert_allclose(grouped[feature.value].values, pointwise[feature.value].values, rtol=1e-6,
+                                       atol=1e-6)
+
+
+def test_region_mean_is_rounded_float64_mean():
+    rng = np.random.default_rng(1)
+    values = (280 + 100 * rng.standard_normal((100000, 3))).astype(np.float32)
+    values[rng.random(values.shape) < 0.05] = np.nan
+    weights = sparse.csr_matrix(np.ones((1, values.shape[0]), dtype=np.float32))
+
+    expected = np.nanmean(values.astype(np.float64), axis=0).astype(np.float32)
+    assert np.array_equal(region_mean(weights, values)[0], expected)
@@ -0,0 +1,171 @@
+from src.energy_type import EnergyType
+from src.forecast import Forecast, global_feature_names, global_column_name
+from src.forecast_result import ForecastResult
+from src.model_store import ModelStore
+from src.output_backend import get_output_backend
+import config
+
+import numpy as np
+
+
+def test_global_features_without_region_code():
+    assert "region" not in global_feature_names(EnergyType.ONWIND)
+    # The height is a wind feature already
+    assert "mean_height" not in global_feature_names(EnergyType.ONWIND)
+    assert "mean_height" in global_feature_names(EnergyType.SOLAR)
+
+
+def test_predict_uses_global_models(forecast_inputs):
+    forecaster = Forecast([0.5])
+    forecaster.forecast_regression_global(split_method="blocked", block_length=24)
+    trained = ForecastResult.open(load=True)
+
+    store = ModelStore()
+    assert store.load(global_column_name(EnergyType.ONWIND)) is not None
+    assert store.load(forecast_inputs[0]) is None
+
+    forecaster.predict()
+    predicted = ForecastResult.open(load=True)
+    assert list(predicted.dataset["column"].values) == list(trained.dataset["column"].values)
+    np.testing.assert_allclose(predicted.dataset["loc"].values, trained.dataset["loc"].values, rtol=1e-6)
+
+
+def test_global_split_holds_out_the_same_hours_of_every_region(forecast_inputs, monkeypatch):
+    import src.forecast
+
+    n_time = Forecast([0.5]).data.capfacts.shape[0]
+    held_out = []
+    split_train_validation = src.forecast.split_train_validation
+
+    def split(X, Y, test_size, method, block_length, random_state, positions=None, n_time=None):
+        X_train, X_val, Y_train, Y_val = split_train_validation(X, Y, test_size, method, block_length, random_state,
+                                                                positions, n_time)
+        # The stacked rows of each region are in chronological order, so the row index identifies the hour
+        index = np.arange(X.shape[0], dtype=float)
+        held_out.append((X.shape[0], split_train_validation(index, index, test_size, method, block_length,
+                                                            random_state, positions, n_time)[1]))
+        return X_train, X_val, Y_train, Y_val
+
+    monkeypatch.setattr(src.forecast, "split_train_validation", split)
+    Forecast([0.5]).forecast_regression_global(split_method="blocked", block_length=100, use_model_store=False)
+
+    # The offshore model has a single region
+    assert max(n_rows for n_rows, val_rows in held_out) > n_time
+    for n_rows, val_rows in held_out:
+        hours = val_rows.astype(int) % n_time
+        regions = val_rows.astype(int) // n_time
+        # Every region holds out the same hours
+        for region in range(n_rows // n_time):
+            np.testing.assert_array_equal(np.sort(hours[regions == region]), np.sort(hours[regions == 0]))
+
+
+def test_halving_search_uses_the_split_method(forecast_inputs, monkeypatch):
+    import src.forecast
+
+    methods = []
+    split_train_validation = src.forecast.split_train_validation
+
+    def split(X, Y, test_size, method, block_length, random_state, positions=None, n_time=None):
+        methods.append((method, block_length))
+        return split_train_validation(X, Y, test_size, method, block_length, random_state, positions, n_time)
+
+    monkeypatch.setattr(src.forecast, "split_train_validation", split)
+    Forecast([0.5]).forecast_regression_halving_search({"n_estimators": [4], "learning_rate": [0.01, 0.1]},
+                                                       split_method="blocked", block_length=24)
+    assert methods and set(methods) == {("blocked", 24)}
+
+
+def test_update_refits_missing_models_with_the_day_mask(forecast_inputs):
+    forecaster = Forecast([0.5])
+    snapshots = forecaster.data.capfacts["snapshot"].values
+    solar_columns = [col_name for col_name in forecast_inputs if col_name.endswith("solar")]
+    previous = {col_name: (np.zeros(200), np.ones(200)) for col_name in solar_columns}
+    previous = ForecastResult.from_columns(snapshots[:200], previous)
+    previous.save()
+    get_output_backend().save(previous, forecaster.quantiles)
+
+    forecaster.update(prune_night=True)
+
+    entry = ModelStore().load(solar_columns[0])
+    assert entry is not None and entry["prune_night"]
+    updated = ForecastResult.open(load=True)
+    assert updated.dataset.sizes["snapshot"] == len(snapshots)
+    night = ~forecaster._day_masks()[solar_columns[0]][200:]
+    assert night.any()
+    np.testing.assert_array_equal(updated.dataset["loc"].sel(column=solar_columns[0]).values[200:][night], 0)
+
+
+def test_feature_importances_are_logged_for_any_number_of_features(forecast_inputs, caplog):
+    features = ["a", "b", "c", "d"]
+    importances = np.arange(8).reshape(2, 4) / 10
+    with caplog.at_level("INFO", logger="src.forecast"):
+        Forecast([0.5])._print_feature_importances(importances, features)
+
+    records = [record for record in caplog.records if record.msg in ("μ --> %s", "σ --> %s")]
+    # A single dict argument is kept as the args of the record and only formatted when the record is emitted
+    assert [record.args for record in records] == [dict(zip(features, importances[0])),
+                                                   dict(zip(features, importances[1]))]
+
+
+def test_model_key_includes_the_number_of_bins(tmp_paths, monkeypatch):
+    from src.forecast import fit_column
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 3)).astype(np.float32)
+    Y = X[:, 0] + rng.normal(scale=0.3, size=200)
+    store = ModelStore()
+    fit_column("AT0 0 onwind", X, Y, ["a", "b", "c"], model_store=store, base_learner="hist")
+    key = store.load("AT0 0 onwind")["key"]
+
+    monkeypatch.setattr(config, "hist_max_bins", 16)
+    fit_column("AT0 0 onwind", X, Y, ["a", "b", "c"], model_store=store, base_learner="hist")
+    entry = store.load("AT0 0 onwind")
+    assert entry["key"] != key
+    assert entry["model"].Base.bin_mapper.max_bins == 16
+
+
+def test_grid_search_runs_with_separate_column_and_search_jobs(forecast_inputs):
+    from sklearn.tree import DecisionTreeRegressor
+
+    param_grid = {"Base": [DecisionTreeRegressor(max_depth=2)], "n_estimators": [4, 8]}
+    Forecast([0.5]).forecast_regression_grid_search(param_grid, n_jobs=1, cv=2, n_column_jobs=1)
+    predicted = ForecastResult.open(load=True)
+    # Run of river is not forecasted
+    assert set(predicted.dataset["column"].values) == {col_name for col_name in forecast_inputs
+                                                      if not col_name.endswith("ror")}
+    assert np.isfinite(predicted.dataset["loc"].values).all()
+
+
+def test_update_of_a_model_without_used_iterations(tmp_paths):
+    from ngboost import NGBRegressor
+    from src.forecast import update_column
+    from src.hyperparameter_search import staged_validation_loss
+    from src.validation import split_train_validation
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 3)).astype(np.float32)
+    Y = X[:, 0] + rng.normal(scale=0.3, size=300)
+    new_mask = np.arange(300) >= 200
+    store = ModelStore()
+    ngb = NGBRegressor(n_estimators=20, random_state=42, verbose=False).fit(X[~new_mask], Y[~new_mask])
+    store.save("AT0 0 onwind", "stored", ngb, 0, ["a", "b", "c"], val_loss=np.inf)
+
+    update_column("AT0 0 onwind", X, Y, ["a", "b", "c"], new_mask, store, n_estimators=30)
+    entry = store.load("AT0 0 onwind")
+    X_train, X_test, Y_train, Y_test = split_train_validation(X[new_mask], Y[new_mask], 0.25, "rolling")
+    losses = staged_validation_loss(entry["model"], X_test, Y_test)
+    # The boosting restarts from the first iteration, all new iterations are compared
+    assert entry["best_val_loss_itr"] == int(np.argmin(losses)) + 1
+
+
+def test_parallel_columns_match_the_serial_run(forecast_inputs):
+    forecaster = Forecast([0.5])
+    results = []
+    for n_jobs, shared_memory in [(1, False), (2, False), (2, True)]:
+        forecaster.forecast_regression(n_jobs=n_jobs, shared_memory=shared_memory, use_model_store=False)
+        results.append(ForecastResult.open(load=True).dataset)
+
+    for dataset in results[1:]:
+        assert list(dataset["column"].values) == list(results[0]["column"].values)
+        np.testing.assert_array_equal(dataset["loc"].values, results[0]["loc"].values)
+        np.testing.assert_array_equal(dataset["scale"].values, results[0]["scale"].values)
@@ -0,0 +1,55 @@
+from src.forecast_data import ForecastData, load_capfacts
+import config
+
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+
+def test_feature_store_cache_keyed_by_file_signature(forecast_inputs):
+    first = ForecastData()
+    second = ForecastData()
+    assert second.feature_store.path == first.feature_store.path
+    assert len(list(Path(config.paths["cache"]).glob("feature_store_*.npy"))) == 1
+
+    # A changed modification time invalidates the cached store, without hashing the content
+    stat = os.stat(config.paths["era5_regions"])
+    os.utime(config.paths["era5_regions"], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    third = ForecastData()
+    assert third.feature_store.path != first.feature_store.path
+
+
+def test_export_shared_per_run(forecast_inputs):
+    data = ForecastData()
+    first, second = data.export_shared(), data.export_shared()
+    assert first.capfacts_path != second.capfacts_path
+
+    column = forecast_inputs[0]
+    Y, X = data.get_feature_matrix(column)
+    Y_shared, X_shared = first.attach().get_feature_matrix(column)
+    assert (Y_shared == Y).all() and (X_shared == X).all()
+
+    first.cleanup()
+    assert not Path(first.directory).exists()
+    assert Path(second.capfacts_path).is_file()
+    second.cleanup()
+
+
+def test_load_capfacts_sidecar(forecast_inputs):
+    capfacts = load_capfacts(config.paths["capfacs"])
+    sidecar = Path(config.paths["capfacs"]).with_suffix(".parquet")
+    assert sidecar.is_file()
+    assert capfacts[forecast_inputs[0]].dtype == np.float32
+    pd.testing.assert_frame_equal(load_capfacts(config.paths["capfacs"]), capfacts)
+
+
+def test_load_capfacts_without_parquet_engine(forecast_inputs, monkeypatch):
+    def missing_engine(*args, **kwargs):
+        raise ImportError("Unable to find a usable engine")
+
+    monkeypatch.setattr(pd.DataFrame, "to_parquet", missing_engine)
+    monkeypatch.setattr(pd, "read_parquet", missing_engine)
+    capfacts = load_capfacts(config.paths["capfacs"])
+    assert list(capfacts.columns) == ["snapshot"] + forecast_inputs
+    assert not Path(config.paths["capfacs"]).with_suffix(".parquet").exists()
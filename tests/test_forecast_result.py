@@ -0,0 +1,30 @@
+from src.forecast_result import ForecastResult
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import norm
+
+
+def test_quantiles_match_ppf_in_float64(forecast_result):
+    result, columns = forecast_result
+    frame = result.to_frame(0.9)
+
+    assert result.dataset["loc"].dtype == np.float64
+    for name, (loc, scale) in columns.items():
+        assert np.array_equal(frame[name].values, loc + scale * norm.ppf(0.9))
+
+
+def test_saved_as_float32(forecast_result, tmp_path):
+    result, columns = forecast_result
+    result.save(tmp_path / "dist.nc")
+    saved = ForecastResult.open(tmp_path / "dist.nc", load=True)
+
+    assert saved.dataset["loc"].dtype == np.float32
+    np.testing.assert_allclose(saved.dataset["scale"].sel(column="AT0 0 solar").values, columns["AT0 0 solar"][1],
+                               rtol=1e-6)
+
+
+def test_empty_result_raises():
+    with pytest.raises(ValueError):
+        ForecastResult.from_columns(pd.date_range("2013-01-01", periods=3, freq="h"), {})
@@ -0,0 +1,70 @@
+from src.hist_tree import BinMapper, HistTreeRegressor, bin_features, create_base_learner, with_bin_mapper, \
+    without_bin_mapper
+
+import numpy as np
+import pytest
+from ngboost import NGBRegressor
+
+
+@pytest.fixture
+def regression_data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 3)).astype(np.float32)
+    X[::17, 1] = np.nan
+    Y = X[:, 0] + 0.5 * np.nan_to_num(X[:, 1]) + rng.normal(scale=0.3, size=500)
+    return X, Y
+
+
+def test_binned_and_raw_features_give_the_same_tree(regression_data):
+    X, Y = regression_data
+    mapper = BinMapper(32).fit(X)
+    raw = HistTreeRegressor(max_depth=4, bin_mapper=mapper).fit(X, Y)
+    binned = HistTreeRegressor(max_depth=4, bin_mapper=mapper).fit(mapper.transform(X), Y)
+
+    np.testing.assert_array_equal(raw.feature_, binned.feature_)
+    np.testing.assert_array_equal(raw.bin_, binned.bin_)
+    np.testing.assert_array_equal(raw.predict(X), binned.predict(mapper.transform(X)))
+
+
+def test_binned_features_need_the_bin_mapper(regression_data):
+    X, Y = regression_data
+    binned = BinMapper(32).fit(X).transform(X)
+    with pytest.raises(ValueError):
+        HistTreeRegressor().fit(binned, Y)
+
+
+def test_ngboost_fitted_on_binned_features_predicts_raw_features(regression_data):
+    X, Y = regression_data
+    base = create_base_learner("hist", X, max_bins=64)
+    X_binned, = bin_features(base, X)
+    assert X_binned.dtype == np.uint8
+    ngb = NGBRegressor(Base=base, n_estimators=20, verbose=False, random_state=0).fit(X_binned, Y)
+
+    np.testing.assert_allclose(ngb.pred_dist(X).params["loc"], ngb.pred_dist(X_binned).params["loc"])
+    # The default tree does not bin the features
+    assert bin_features(create_base_learner("tree"), X)[0] is X
+
+
+def test_column_subsample_computes_own_bins(regression_data):
+    X, Y = regression_data
+    base = create_base_learner("hist", X, max_bins=64)
+    ngb = NGBRegressor(Base=base, n_estimators=10, col_sample=0.5, verbose=False, random_state=0).fit(X, Y)
+    assert np.isfinite(ngb.pred_dist(X).params["loc"]).all()
+
+
+def test_bin_mapper_of_search_candidates(regression_data):
+    X, Y = regression_data
+    base = HistTreeRegressor(max_bins=16)
+    with_mapper = with_bin_mapper(base, X)
+    assert base.bin_mapper is None
+    assert with_mapper.bin_mapper is not None and with_mapper.max_bins == 16
+    assert with_bin_mapper(with_mapper, X) is with_mapper
+    assert without_bin_mapper(with_mapper).bin_mapper is None
+
+
+def test_param_grid_contains_the_hist_tree_only_as_base_learner(monkeypatch):
+    import config
+
+    assert not any(isinstance(base, HistTreeRegressor) for base in config._create_param_grid()["Base"])
+    monkeypatch.setattr(config, "base_learner", "hist")
+    assert any(isinstance(base, HistTreeRegressor) for base in config._create_param_grid()["Base"])
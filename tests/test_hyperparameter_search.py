@@ -0,0 +1,37 @@
+from src.hyperparameter_search import continue_validation_loss, staged_validation_loss, successive_halving
+
+import numpy as np
+import pytest
+from ngboost import NGBRegressor
+
+
+@pytest.fixture
+def regression_data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 3))
+    Y = X[:, 0] + 0.5 * X[:, 1] + rng.normal(scale=0.3, size=300)
+    return X[:200], Y[:200], X[200:], Y[200:]
+
+
+def test_continued_validation_loss_equals_staged_loss(regression_data):
+    X_train, Y_train, X_val, Y_val = regression_data
+    ngb = NGBRegressor(n_estimators=10, verbose=False, random_state=0).fit(X_train, Y_train)
+    first, val_params = continue_validation_loss(ngb, X_val, Y_val)
+
+    ngb.n_estimators = 5
+    ngb.partial_fit(X_train, Y_train)
+    second, _ = continue_validation_loss(ngb, X_val, Y_val, val_params, start=10)
+
+    np.testing.assert_allclose(np.concatenate([first, second]), staged_validation_loss(ngb, X_val, Y_val))
+
+
+def test_successive_halving_keeps_cumulative_estimators(regression_data):
+    X_train, Y_train, X_val, Y_val = regression_data
+    param_grid = {"n_estimators": [27], "learning_rate": [0.01, 0.05, 0.1], "minibatch_frac": [1.0]}
+    model, params, itr, loss = successive_halving(X_train, Y_train, X_val, Y_val, param_grid, eta=3)
+
+    assert model.n_estimators == len(model.base_models) == 27
+    losses = staged_validation_loss(model, X_val, Y_val)
+    assert itr == int(losses.argmin()) + 1
+    assert params["n_estimators"] == itr
+    assert loss == pytest.approx(losses.min())
@@ -0,0 +1,10 @@
+from benchmarks.import_time import heavy_modules, measure_import
+
+import pytest
+
+
+@pytest.mark.parametrize("statement", ["import main", "from src.forecast import Forecast",
+                                       "from src.inference import InferenceService"])
+def test_entry_points_import_no_heavy_modules(statement):
+    modules = measure_import(statement)["modules"]
+    assert [module for module in heavy_modules if module in modules] == []
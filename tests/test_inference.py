@@ -0,0 +1,100 @@
+from src.forecast import Forecast
+from src.inference import InferenceService, create_server
+
+import json
+import threading
+import urllib.error
+import urllib.request
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def service(forecast_inputs):
+    Forecast([0.5]).forecast_regression(prune_night=True)
+    return InferenceService()
+
+
+@pytest.fixture
+def solar_column(forecast_inputs):
+    return [col_name for col_name in forecast_inputs if col_name.endswith("solar")][0]
+
+
+def test_predict_batch_applies_the_day_mask(service, solar_column):
+    snapshots, loc, scale = service.predict_range(solar_column)
+    Y, X = service.data.get_feature_matrix(solar_column)
+    night = loc == 0
+    assert night.any() and not night.all()
+
+    results = service.predict_batch([(solar_column, X[:100], snapshots[:100]),
+                                     (solar_column, X[100:], snapshots[100:])])
+    np.testing.assert_allclose(np.concatenate([results[0][0], results[1][0]]), loc)
+    np.testing.assert_allclose(np.concatenate([results[0][1], results[1][1]]), scale)
+
+    with pytest.raises(ValueError):
+        service.predict_batch([(solar_column, X[:10])])
+
+
+def test_malformed_requests_return_bad_request(service, solar_column):
+    server = create_server(service, "127.0.0.1", 0, window=0.001)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:%s/predict" % server.server_address[1]
+    try:
+        for body in [[1, 2], {"requests": [{"column": solar_column, "features": None}]},
+                     {"requests": [{"column": solar_column, "features": [[1.0]]}]}]:
+            request = urllib.request.Request(url, data=json.dumps(body).encode(), method="POST")
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(request, timeout=10)
+            assert error.value.code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_predict_range_does_not_cache_masks_per_range(service, solar_column):
+    import config
+    from pathlib import Path
+
+    cache = Path(config.paths["cache"])
+    cached = set(cache.glob("daylight_mask_*"))
+    full_snapshots, full_loc, full_scale = service.predict_range(solar_column)
+    for start, end in [("2013-06-02", "2013-06-03"), ("2013-06-04 06:00", "2013-06-05")]:
+        snapshots, loc, scale = service.predict_range(solar_column, start, end)
+        rows = np.isin(full_snapshots, snapshots)
+        np.testing.assert_allclose(loc, full_loc[rows])
+    assert set(cache.glob("daylight_mask_*")) == cached
+
+
+def test_columns_without_model_use_the_global_model(forecast_inputs):
+    from src.forecast_result import ForecastResult
+
+    Forecast([0.5]).forecast_regression_global()
+    trained = ForecastResult.open(load=True)
+    service = InferenceService()
+    col_name = forecast_inputs[0]
+    assert col_name not in service.models
+
+    snapshots, loc, scale = service.predict_range(col_name)
+    np.testing.assert_allclose(loc, trained.dataset["loc"].sel(column=col_name).values, rtol=1e-6)
+    # The requests contain only the features of the column, the static attributes of the region are appended
+    Y, X = service.data.get_feature_matrix(col_name)
+    batch_loc, batch_scale = service.predict_batch([(col_name, X[:10])])[0]
+    np.testing.assert_allclose(batch_loc, loc[:10], rtol=1e-6)
+
+
+def test_unexpected_errors_return_internal_server_error(service, solar_column, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("failed")
+
+    monkeypatch.setattr(service, "predict_range", fail)
+    server = create_server(service, "127.0.0.1", 0, window=0.001)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:%s/predict" % server.server_address[1]
+    try:
+        request = urllib.request.Request(url, data=json.dumps({"column": solar_column}).encode(), method="POST")
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(request, timeout=10)
+        assert error.value.code == 500
+    finally:
+        server.shutdown()
+        server.server_close()
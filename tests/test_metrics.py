@@ -0,0 +1,51 @@
+from src.metrics import batch_scores, crps_normal, pinball_loss, coverage_fraction, mean_absolute_error
+
+import numpy as np
+from scipy.integrate import quad
+from scipy.stats import norm
+
+
+def _inputs():
+    rng = np.random.default_rng(0)
+    loc = rng.uniform(0, 1, (200, 3))
+    scale = rng.uniform(0.05, 0.3, (200, 3))
+    y_true = loc + scale * rng.standard_normal((200, 3))
+    quantiles = [0.1, 0.5, 0.9]
+    y_pred = np.stack([norm.ppf(q, loc, scale) for q in quantiles], axis=-1)
+    return y_true, y_pred, quantiles, loc, scale
+
+
+def test_batch_scores_match_the_scalar_metrics():
+    y_true, y_pred, quantiles, loc, scale = _inputs()
+    scores = batch_scores(y_true, y_pred, quantiles, loc, scale)
+
+    for column in range(3):
+        for i, q in enumerate(quantiles):
+            np.testing.assert_allclose(scores["pinball"][column, i],
+                                       pinball_loss(y_true[:, column], y_pred[:, column, i], q))
+            np.testing.assert_allclose(scores["mae"][column, i],
+                                       mean_absolute_error(y_true[:, column], y_pred[:, column, i]))
+        assert scores["coverage_pairs"][1] == (0.1, 0.9)
+        np.testing.assert_allclose(scores["coverage"][column, 1],
+                                   coverage_fraction(y_true[:, column], y_pred[:, column, 0], y_pred[:, column, 2]))
+    np.testing.assert_allclose(scores["nll"], -norm.logpdf(y_true, loc, scale).mean(axis=0))
+
+
+def test_crps_matches_the_numerical_integral():
+    y_true, y_pred, quantiles, loc, scale = _inputs()
+    for y, mu, sigma in zip(y_true[:5, 0], loc[:5, 0], scale[:5, 0]):
+        # CRPS = integral of (F(x) - 1{x >= y})^2, split at the observation
+        below = quad(lambda x: norm.cdf(x, mu, sigma) ** 2, -np.inf, y)[0]
+        above = quad(lambda x: norm.sf(x, mu, sigma) ** 2, y, np.inf)[0]
+        np.testing.assert_allclose(crps_normal(y, mu, sigma), below + above, rtol=1e-6)
+
+
+def test_degenerate_distributions_score_the_absolute_error():
+    y_true = np.array([[0.0], [0.2], [0.5]])
+    loc = np.array([[0.0], [0.0], [0.4]])
+    scale = np.array([[0.0], [0.0], [0.1]])
+    scores = batch_scores(y_true, loc[:, :, np.newaxis], [0.5], loc, scale)
+
+    # The NLL only includes the non-degenerate distribution
+    np.testing.assert_allclose(scores["nll"], -norm.logpdf(0.5, 0.4, 0.1))
+    np.testing.assert_allclose(scores["crps"], (0 + 0.2 + crps_normal(0.5, 0.4, 0.1)) / 3)
@@ -0,0 +1,32 @@
+from src.forecast_result import ForecastResult
+from src.output_backend import OutputBackend, CsvBackend, get_output_backend, output_backends
+import config
+
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize("output_format", list(output_backends))
+def test_save_append_read(forecast_result, tmp_path, output_format):
+    result, columns = forecast_result
+    first = ForecastResult(result.dataset.isel(snapshot=slice(0, 12)))
+    second = ForecastResult(result.dataset.isel(snapshot=slice(12, None)))
+    backend = get_output_backend(output_format, tmp_path)
+    backend.save(first, [0.1, 0.5])
+    backend.append(second, [0.1, 0.5])
+
+    frame = backend.read(clipped=True)
+    assert frame.shape == (48, 2)
+    expected = result.quantile(0.5, clipped=True).sel(column="AT0 0 solar").values
+    np.testing.assert_allclose(frame.loc[0.5]["AT0 0 solar"].values, expected, rtol=1e-6)
+    assert frame.values.max() <= config.clip_upper
+
+
+def test_csv_read_without_files(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        CsvBackend(tmp_path).read()
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        OutputBackend()
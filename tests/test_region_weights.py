@@ -0,0 +1,48 @@
+from src.region_weights import create_area_weights, load_or_create_area_weights, area_weights_cache_file
+
+import numpy as np
+import xarray as xr
+
+
+def _grid(synthetic_mapper):
+    return synthetic_mapper.era_data["x"].values, synthetic_mapper.era_data["y"].values
+
+
+def test_weights_are_the_overlap_of_cells_and_regions(synthetic_mapper):
+    x, y = _grid(synthetic_mapper)
+    weights = create_area_weights(x, y, synthetic_mapper.gdf_onshore, synthetic_mapper.gdf_offshore)
+    assert weights.shape == (4, len(y) * len(x))
+
+    # The cells of 0.5 x 0.5 degrees are centered on the grid, the region box(0, 0, 1, 2) covers the cells at its
+    # edges by half and at its corners by a quarter
+    fraction_x = np.where(x == 0.5, 1.0, np.where((x == 0) | (x == 1), 0.5, 0.0))
+    fraction_y = np.where((y == 0) | (y == 2), 0.5, 1.0)
+    np.testing.assert_allclose(weights[0].toarray().reshape(len(y), len(x)), np.outer(fraction_y, fraction_x),
+                               atol=1e-3)
+    # The offshore region box(2, 0, 4, 1) follows the onshore regions
+    assert weights[3].toarray().reshape(len(y), len(x))[-1, -1] > 0.2
+
+
+def test_capacity_layout_multiplies_the_weights(synthetic_mapper):
+    x, y = _grid(synthetic_mapper)
+    layout = xr.DataArray(np.random.default_rng(0).uniform(0, 2, (len(x), len(y))), dims=["x", "y"],
+                          coords=dict(x=x, y=y))
+    weights = create_area_weights(x, y, synthetic_mapper.gdf_onshore, synthetic_mapper.gdf_offshore)
+    weighted = create_area_weights(x, y, synthetic_mapper.gdf_onshore, synthetic_mapper.gdf_offshore, layout)
+
+    # The layout is transposed to the (y, x) order of the flattened grid cells
+    np.testing.assert_allclose(weighted.toarray(), weights.toarray() * layout.transpose("y", "x").values.ravel())
+
+
+def test_cache_key_changes_with_the_grid(synthetic_mapper):
+    x, y = _grid(synthetic_mapper)
+    cache_file = area_weights_cache_file(x, y)
+    assert area_weights_cache_file(x + 0.5, y) != cache_file
+    assert area_weights_cache_file(x, y[:-1]) != cache_file
+    layout = xr.DataArray(np.ones((len(y), len(x))), dims=["y", "x"])
+    assert area_weights_cache_file(x, y, layout) != cache_file
+
+    weights = load_or_create_area_weights(x, y, synthetic_mapper.gdf_onshore, synthetic_mapper.gdf_offshore)
+    assert cache_file.is_file()
+    cached = load_or_create_area_weights(x, y, synthetic_mapper.gdf_onshore, synthetic_mapper.gdf_offshore)
+    np.testing.assert_array_equal(cached.toarray(), weights.toarray())
@@ -0,0 +1,83 @@
+from src.forecast_result import ForecastResult
+from src.scenarios import ScenarioGenerator
+import config
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+
+@pytest.fixture
+def copula_inputs():
+    """
+    Predicted distributions of three columns, whose capacity factors have AR(1) errors with a known autocorrelation and
+    correlation between the columns. The third column is degenerate at every fourth snapshot, like solar at night.
+    """
+    rng = np.random.default_rng(1)
+    n, phi, rho = 4000, np.array([0.8, 0.5, 0.0]), 0.6
+    correlation = np.array([[1, rho, 0], [rho, 1, 0], [0, 0, 1]])
+    scaling = np.sqrt(1 - phi ** 2)
+    covariance = correlation * (1 - np.outer(phi, phi)) / np.outer(scaling, scaling)
+    innovations = rng.multivariate_normal(np.zeros(3), covariance, n)
+    z = np.empty((n, 3))
+    z[0] = rng.multivariate_normal(np.zeros(3), correlation)
+    for t in range(1, n):
+        z[t] = phi * z[t - 1] + scaling * innovations[t]
+
+    snapshots = pd.date_range("2013-01-01", periods=n, freq="h")
+    loc = np.full((n, 3), 0.4)
+    scale = np.full((n, 3), 0.05)
+    scale[::4, 2] = 0
+    loc[::4, 2] = 0
+    columns = ["AT0 0 onwind", "AT0 1 onwind", "AT0 0 solar"]
+    result = ForecastResult.from_columns(snapshots, {name: (loc[:, i], scale[:, i]) for i, name in enumerate(columns)})
+    capfacts = pd.DataFrame(loc + scale * z, columns=columns, index=snapshots)
+    return result, capfacts, phi, rho
+
+
+def test_fit_recovers_autocorrelation_and_correlation(copula_inputs):
+    result, capfacts, phi, rho = copula_inputs
+    generator = ScenarioGenerator(result).fit(capfacts, shrinkage=0)
+
+    np.testing.assert_allclose(generator.phi[:2], phi[:2], atol=0.05)
+    assert generator.correlation[0, 1] == pytest.approx(rho, abs=0.05)
+    np.testing.assert_allclose(np.diag(generator.correlation), 1)
+
+
+def test_sample_keeps_marginals_and_dependence_across_chunks(copula_inputs, tmp_paths):
+    result, capfacts, phi, rho = copula_inputs
+    generator = ScenarioGenerator(result).fit(capfacts, shrinkage=0)
+    # Sample the first snapshots only, with the copula estimated from all snapshots
+    result = ForecastResult(result.dataset.isel(snapshot=slice(0, 40)))
+    generator.forecast_result = result
+
+    path = generator.sample(4000, tmp_paths / "scenarios.nc", batch_size=1500, time_chunk=7, clipped=False)
+    with xr.open_dataset(path) as dataset:
+        values = dataset["capfacs"].values.astype(np.float64)
+        assert list(dataset["column"].values) == list(result.dataset["column"].values)
+
+    loc = result.dataset["loc"].transpose("snapshot", "column").values
+    scale = result.dataset["scale"].transpose("snapshot", "column").values
+    z = (values[:, :, :2] - loc[:, :2]) / scale[:, :2]
+    np.testing.assert_allclose(z.mean(axis=0), 0, atol=0.1)
+    np.testing.assert_allclose(z.std(axis=0), 1, atol=0.1)
+    # Correlation between the columns and autocorrelation at the border of two time chunks
+    assert np.corrcoef(z[:, 10, 0], z[:, 10, 1])[0, 1] == pytest.approx(generator.correlation[0, 1], abs=0.05)
+    assert np.corrcoef(z[:, 6, 0], z[:, 7, 0])[0, 1] == pytest.approx(generator.phi[0], abs=0.05)
+    # Degenerate distributions are sampled as their location
+    assert (values[:, ::4, 2] == loc[::4, 2]).all()
+
+
+def test_sample_clips_and_requires_fit(copula_inputs, tmp_paths):
+    result, capfacts, phi, rho = copula_inputs
+    result = ForecastResult(result.dataset.isel(snapshot=slice(0, 24)))
+    generator = ScenarioGenerator(result)
+    with pytest.raises(ValueError):
+        generator.sample(10, tmp_paths / "scenarios.nc")
+
+    result.dataset["scale"][:] = 1
+    path = generator.fit(capfacts.iloc[:24]).sample(50, tmp_paths / "scenarios.nc")
+    with xr.open_dataset(path) as dataset:
+        values = dataset["capfacs"].values
+    assert values.min() >= config.clip_lower and values.max() <= config.clip_upper
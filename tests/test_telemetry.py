@@ -0,0 +1,43 @@
+from src.telemetry import Telemetry
+
+import pickle
+import pstats
+
+
+def _work():
+    return sum(i * i for i in range(10000))
+
+
+def test_profile_enables_the_telemetry():
+    assert Telemetry(enabled=False, profile=True).enabled
+
+
+def test_only_the_outermost_stage_is_profiled():
+    telemetry = Telemetry(enabled=True, profile=True)
+    with telemetry.stage("fit_column", "AT0 0 onwind"):
+        with telemetry.stage("fit", "AT0 0 onwind"):
+            _work()
+
+    assert list(telemetry.profiles) == [("fit_column", "AT0 0 onwind")]
+    # The nested stage is part of the profile of the outer stage
+    assert any(func[2] == "_work" for func in telemetry.profiles[("fit_column", "AT0 0 onwind")])
+    assert [stage["stage"] for stage in telemetry.stages] == ["fit", "fit_column"]
+    assert all("process_peak_rss_mb" in stage for stage in telemetry.stages)
+
+
+def test_profiles_of_worker_columns_are_merged(tmp_path):
+    worker = Telemetry(enabled=True, profile=True)
+    with worker.stage("fit_column", "AT0 0 onwind"):
+        _work()
+    # The records are pickled on the way back from a worker process
+    records = pickle.loads(pickle.dumps(worker.pop_column("AT0 0 onwind")))
+    assert not worker.profiles
+
+    telemetry = Telemetry(enabled=True, profile=True)
+    telemetry.merge("AT0 0 onwind", records)
+    telemetry.merge("AT0 0 onwind", records)
+    report = telemetry.save(tmp_path)
+
+    stats = pstats.Stats(str(report.parent / (report.stem + "_fit_column_AT0_0_onwind.prof")))
+    calls = [stat[1] for func, stat in stats.stats.items() if func[2] == "_work"]
+    assert calls == [2]
@@ -0,0 +1,44 @@
+from src.validation import split_train_validation
+
+import numpy as np
+
+
+def test_blocked_split_without_positions_holds_out_whole_blocks():
+    X = np.arange(240, dtype=float).reshape(-1, 1)
+    X_train, X_val, Y_train, Y_val = split_train_validation(X, X[:, 0], 0.25, "blocked", 24, random_state=0)
+
+    blocks = np.unique(Y_val // 24)
+    assert len(blocks) == 2
+    np.testing.assert_array_equal(np.sort(Y_val), np.concatenate([np.arange(b * 24, (b + 1) * 24) for b in blocks]))
+    assert len(Y_train) + len(Y_val) == 240
+
+
+def test_blocked_split_builds_the_blocks_on_the_positions():
+    hours = np.arange(240)
+    day_mask = (hours % 24 >= 6) & (hours % 24 < 18)
+    positions = np.flatnonzero(day_mask)
+    X = positions.astype(float).reshape(-1, 1)
+    X_train, X_val, Y_train, Y_val = split_train_validation(X, X[:, 0], 0.25, "blocked", 24, random_state=0,
+                                                            positions=positions)
+
+    # Every held out block is a full day of 12 daytime hours, not 24 daytime hours of two days
+    days = np.unique(Y_val // 24)
+    assert len(days) == 2
+    assert len(Y_val) == 24
+    assert not np.isin(Y_train // 24, days).any()
+
+
+def test_blocked_split_of_stacked_regions_holds_out_the_same_hours():
+    n_time = 250
+    rows = np.arange(3 * n_time)
+    X = rows.astype(float).reshape(-1, 1)
+    X_train, X_val, Y_train, Y_val = split_train_validation(X, X[:, 0], 0.25, "blocked", 24, random_state=0,
+                                                            n_time=n_time)
+
+    hours = Y_val.astype(int) % n_time
+    regions = Y_val.astype(int) // n_time
+    assert set(regions) == {0, 1, 2}
+    for region in (1, 2):
+        np.testing.assert_array_equal(hours[regions == region], hours[regions == 0])
+    # A block does not straddle the boundary of two regions
+    assert not np.isin(Y_train.astype(int) % n_time, hours).any()